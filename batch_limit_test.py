@@ -0,0 +1,272 @@
+"""Headless batch limit testing of CSV captures (no Qt required)
+
+Example:
+    python batch_limit_test.py --limits mask.json --time-column Time \
+        --amplitude-column Voltage --output-dir results "captures/**/*.csv"
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from limit_engine import run_limit_test, run_streaming_limit_test
+from mask_library import MaskLibrary
+from time_alignment import ALIGN_METHODS, TimeAligner
+from waveform_io import DEFAULT_CHUNK_ROWS, PARSE_BACKENDS, CsvWaveformSource, load_limit_mask, resolve_backend
+
+
+SUMMARY_FIELDS = ['file', 'status', 'total_points', 'crossing_count', 'high_violations',
+                  'low_violations', 'total_violations', 'violation_rate', 'excursion_count',
+                  'max_overshoot', 'passed', 'time_shift', 'elapsed', 'error']
+CROSSING_FIELDS = ['index', 'time', 'value', 'crossing_time', 'crossing_value', 'type', 'direction']
+
+
+def expand_patterns(patterns):
+    """Expand glob patterns into a sorted list of unique file paths"""
+    files = set()
+    for pattern in patterns:
+        matches = glob.glob(pattern, recursive=True)
+        if not matches and os.path.isfile(pattern):
+            matches = [pattern]
+        files.update(path for path in matches if os.path.isfile(path))
+    return sorted(files)
+
+
+def output_names(files):
+    """Return a unique output base name for every input file"""
+    names = []
+    seen = {}
+    for path in files:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        count = seen.get(stem, 0) + 1
+        seen[stem] = count
+        names.append(stem if count == 1 else f"{stem}_{count}")
+    return names
+
+
+def write_file_results(base_path, output_format, summary, crossing_points, events):
+    """Write one file's summary, crossing points and excursions"""
+    if output_format == 'json':
+        with open(base_path + '.json', 'w', encoding='utf-8') as f:
+            json.dump(dict(summary, crossing_points=crossing_points, excursions=events.to_records()), f, indent=2)
+    else:
+        with open(base_path + '.csv', 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=CROSSING_FIELDS)
+            writer.writeheader()
+            writer.writerows(crossing_points)
+        events.write_csv(base_path + '_excursions.csv')
+
+
+def test_file(job):
+    """Run the limit test on one capture; executed in a worker process"""
+    path, base_path, options = job
+    start = time.perf_counter()
+    summary = {'file': path}
+
+    try:
+        source = CsvWaveformSource(path, use_cache=options['use_cache'], backend=options['parser'])
+        aligner = options['aligner']
+        if options['chunk_rows']:
+            # Bounded memory: the capture is never loaded as a whole
+            def chunks():
+                return source.iter_column_chunks(options['amplitude_column'], options['time_column'],
+                                                 options['chunk_rows'])
+
+            limit_mask = options['limit_mask']
+            time_shift = None
+            if aligner is not None:
+                # The offset comes from a first pass that stops past the
+                # alignment window
+                time_shift = aligner.estimate_chunks(chunks())
+                limit_mask = limit_mask.shifted(time_shift)
+            result = run_streaming_limit_test(chunks(), limit_mask)
+            result.time_shift = time_shift
+        else:
+            time_data, waveform_data = source.read_columns(options['amplitude_column'], options['time_column'])
+            result = run_limit_test(time_data, waveform_data, options['limit_mask'], aligner=aligner)
+
+        if result.total_points < 2:
+            raise ValueError("Fewer than two valid samples")
+
+        summary.update(result.summary())
+        summary['status'] = 'pass' if result.passed else 'fail'
+        summary['elapsed'] = time.perf_counter() - start
+
+        if base_path is not None:
+            write_file_results(base_path, options['output_format'], summary, result.crossing_points,
+                               result.events)
+    except Exception as e:
+        summary['status'] = 'error'
+        summary['error'] = str(e)
+        summary['elapsed'] = time.perf_counter() - start
+
+    return summary
+
+
+def write_aggregate(output_dir, output_format, summaries, totals):
+    """Write the per-file summary table plus overall totals"""
+    if output_format == 'json':
+        with open(os.path.join(output_dir, 'summary.json'), 'w', encoding='utf-8') as f:
+            json.dump({'totals': totals, 'files': summaries}, f, indent=2)
+    else:
+        with open(os.path.join(output_dir, 'summary.csv'), 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(summaries)
+
+
+def run_batch(files, options, output_dir=None, workers=None, progress=None):
+    """Test every file and return (summaries, totals)"""
+    names = output_names(files)
+    jobs = [(path, os.path.join(output_dir, name) if output_dir else None, options)
+            for path, name in zip(files, names)]
+
+    summaries = []
+    start = time.perf_counter()
+
+    if workers == 1 or len(jobs) <= 1:
+        results = map(test_file, jobs)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = pool.map(test_file, jobs, chunksize=max(1, len(jobs) // (8 * (workers or os.cpu_count() or 1))))
+
+    try:
+        for summary in results:
+            summaries.append(summary)
+            if progress:
+                progress(summary)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    elapsed = time.perf_counter() - start
+    samples = sum(s.get('total_points', 0) for s in summaries)
+    totals = {
+        'files': len(summaries),
+        'passed': sum(1 for s in summaries if s['status'] == 'pass'),
+        'failed': sum(1 for s in summaries if s['status'] == 'fail'),
+        'errors': sum(1 for s in summaries if s['status'] == 'error'),
+        'samples': samples,
+        'elapsed': elapsed,
+        'files_per_second': len(summaries) / elapsed if elapsed > 0 else 0.0,
+        'samples_per_second': samples / elapsed if elapsed > 0 else 0.0,
+    }
+    return summaries, totals
+
+
+def make_aligner(args, limit_mask, parser):
+    """Return the TimeAligner the options ask for, or None"""
+    if args.align is None:
+        return None
+    if args.align_reference is None:
+        return TimeAligner.from_mask(limit_mask, args.align, args.max_shift, args.align_level)
+    source = CsvWaveformSource(args.align_reference, use_cache=args.cache, backend=parser)
+    time_data, waveform_data = source.read_columns(args.amplitude_column, None if args.auto_time else args.time_column)
+    return TimeAligner(time_data, waveform_data, args.align, args.max_shift, args.align_level)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run waveform limit tests on CSV captures without the GUI")
+    parser.add_argument('patterns', nargs='+', help="CSV files or glob patterns (quote them; ** is recursive)")
+    parser.add_argument('--limits', required=True,
+                        help="Limit mask file (.json, .wfmask or .csv), or PRODUCT/NAME with --library")
+    parser.add_argument('--library', help="Mask library directory to look --limits up in")
+    parser.add_argument('--amplitude-column', required=True, help="Name of the amplitude column")
+    time_group = parser.add_mutually_exclusive_group(required=True)
+    time_group.add_argument('--time-column', help="Name of the time column")
+    time_group.add_argument('--auto-time', action='store_true', help="Use the sample index as time")
+    parser.add_argument('--output-dir', help="Directory for per-file results and the aggregate summary")
+    parser.add_argument('--format', choices=('json', 'csv'), default='json', dest='output_format')
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--cache', action='store_true',
+                        help="Read and write .wfcache sidecars next to the captures (off by default, as they "
+                             "take as much space as the parsed columns)")
+    parser.add_argument('--parser', choices=('auto',) + PARSE_BACKENDS, default='auto',
+                        help="CSV parser (default: the fastest one installed)")
+    parser.add_argument('--stream', action='store_true',
+                        help="Test captures chunk by chunk so files larger than RAM can be tested")
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS,
+                        help=f"Rows per chunk with --stream (default {DEFAULT_CHUNK_ROWS})")
+    parser.add_argument('--align', choices=ALIGN_METHODS,
+                        help="Shift the mask by each capture's trigger offset, found from its first edge "
+                             "or by cross-correlation")
+    parser.add_argument('--align-reference',
+                        help="Golden capture (same columns) to align to (default: the line between the limits)")
+    parser.add_argument('--max-shift', type=float, help="Largest offset searched, in time units")
+    parser.add_argument('--align-level', type=float,
+                        help="Level of the edge with --align edge (default: halfway through the reference)")
+    parser.add_argument('--quiet', action='store_true', help="Only print the final totals")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    files = expand_patterns(args.patterns)
+    if not files:
+        print("No files matched", file=sys.stderr)
+        return 2
+
+    if args.library:
+        try:
+            limit_mask = MaskLibrary(args.library).find(args.limits)
+        except KeyError:
+            print(f"No single mask named {args.limits} in {args.library}", file=sys.stderr)
+            return 2
+    else:
+        limit_mask = load_limit_mask(args.limits)
+
+    try:
+        parser = resolve_backend(args.parser)
+        aligner = make_aligner(args, limit_mask, parser)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    options = {
+        'limit_mask': limit_mask,
+        'amplitude_column': args.amplitude_column,
+        'time_column': None if args.auto_time else args.time_column,
+        'output_format': args.output_format,
+        'use_cache': args.cache,
+        'parser': parser,
+        'chunk_rows': args.chunk_rows if args.stream else None,
+        'aligner': aligner,
+    }
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    def progress(summary):
+        if args.quiet:
+            return
+        if summary['status'] == 'error':
+            print(f"ERROR {summary['file']}: {summary['error']}")
+        else:
+            shift = f", shifted {summary['time_shift']:+.6g}" if summary['time_shift'] is not None else ""
+            print(f"{summary['status'].upper():<5} {summary['file']} "
+                  f"({summary['total_points']} points, {summary['crossing_count']} crossings, "
+                  f"{summary['violation_rate']:.2f}% violations{shift})")
+
+    summaries, totals = run_batch(files, options, args.output_dir, args.workers, progress)
+
+    if args.output_dir:
+        write_aggregate(args.output_dir, args.output_format, summaries, totals)
+
+    print(f"{totals['files']} files: {totals['passed']} passed, {totals['failed']} failed, "
+          f"{totals['errors']} errors")
+    print(f"{totals['samples']} samples in {totals['elapsed']:.2f} s "
+          f"({totals['files_per_second']:.1f} files/s, {totals['samples_per_second']:.3g} samples/s)")
+
+    if totals['errors']:
+        return 2
+    return 1 if totals['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
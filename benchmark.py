@@ -0,0 +1,512 @@
+"""Benchmarks for the load, test and render hot paths
+
+Every stage runs in a fresh process so its wall time and peak RSS are
+measured in isolation. Results can be saved as a baseline and later runs
+compared against it to spot regressions in a single stage.
+
+Example:
+    python benchmark.py --sizes 1e3,1e4,1e5,1e6 --save-baseline bench_baseline.json
+    python benchmark.py --baseline bench_baseline.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue as queue_module
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+DEFAULT_SIZES = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]
+DEFAULT_MASK_SIZES = [2, 10, 100]
+DEFAULT_STAGES = ['parse_csv', 'parse_csv_python', 'cache_load', 'limit_test', 'limit_test_parallel',
+                  'limit_test_uniform', 'align_edge', 'align_correlation', 'retest', 'stream_test', 'pyramid',
+                  'render', 'designer_edit']
+# Stages that read the synthetic capture from a CSV file
+CSV_STAGES = ('parse_csv', 'parse_csv_python', 'cache_load', 'stream_test')
+# Time span of the synthetic captures, matching the built-in sample data
+TIME_SPAN = 10.0
+# Memory growth below this is noise, whatever its ratio to the baseline
+MEMORY_SLACK = 1 << 20
+
+
+def generate_waveform(n, seed=0, start=0, stop=None):
+    """Return (time, voltage) arrays shaped like load_sample_data's Voltage column
+
+    start/stop select a block of an n-sample capture so large files can be
+    generated piecewise.
+    """
+    stop = n if stop is None else stop
+    rng = np.random.default_rng((seed, start))
+    time_data = np.arange(start, stop, dtype=np.float64) * (TIME_SPAN / n)
+    waveform_data = (3.3 + np.sin(time_data * 2) * 1.2 + np.sin(time_data * 5) * 0.3
+                     + rng.uniform(-0.1, 0.1, stop - start))
+    return time_data, waveform_data
+
+
+def generate_limit_mask(num_points):
+    """Return a mask with num_points points that the synthetic waveform crosses"""
+    from limit_mask import LimitMask
+    time_points = np.linspace(0.0, TIME_SPAN, num_points)
+    return LimitMask(time_points, 4.6 + 0.2 * np.cos(time_points), 2.0 - 0.2 * np.sin(time_points))
+
+
+def write_csv(path, n, seed=0, block=1 << 20):
+    """Write a synthetic capture as CSV in blocks"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("Time,Voltage\n")
+        for start in range(0, n, block):
+            time_data, waveform_data = generate_waveform(n, seed, start, min(start + block, n))
+            np.savetxt(f, np.column_stack((time_data, waveform_data)), fmt='%.9g', delimiter=',')
+
+
+def current_rss():
+    """Resident set size in bytes, or None where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def reset_peak_rss():
+    """Restart the peak RSS count from the current RSS; False where unsupported
+
+    Linux resets the VmHWM high-water mark on writing 5 to clear_refs.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes
+
+    Since the last reset_peak_rss() where /proc is available, else since
+    the process started.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+# Stage implementations. Each takes the prepared context and returns a
+# callable doing the timed work, so setup cost is excluded from the timing.
+
+def stage_parse_csv(ctx):
+    from waveform_io import CsvWaveformSource
+
+    def run():
+        CsvWaveformSource(ctx['csv_path'], use_cache=False).read_columns('Voltage', 'Time')
+    return run
+
+
+def stage_parse_csv_python(ctx):
+    """parse_csv with the pure-Python fallback parser, for comparison"""
+    from waveform_io import CsvWaveformSource
+
+    def run():
+        CsvWaveformSource(ctx['csv_path'], use_cache=False, backend='python').read_columns('Voltage', 'Time')
+    return run
+
+
+def stage_cache_load(ctx):
+    from waveform_io import CsvWaveformSource
+
+    def run():
+        time_data, waveform_data = CsvWaveformSource(ctx['csv_path']).read_columns('Voltage', 'Time')
+        # Touch the data so the memory-mapped pages are actually read
+        float(np.sum(time_data) + waveform_data.sum())
+    return run
+
+
+def stage_limit_test(ctx):
+    from limit_engine import run_limit_test
+    time_data, waveform_data = generate_waveform(ctx['size'])
+    limit_mask = generate_limit_mask(ctx['mask_size'])
+
+    def run():
+        run_limit_test(time_data, waveform_data, limit_mask)
+    return run
+
+
+def stage_limit_test_parallel(ctx):
+    from limit_engine import run_limit_test
+    time_data, waveform_data = generate_waveform(ctx['size'])
+    limit_mask = generate_limit_mask(ctx['mask_size'])
+
+    def run():
+        run_limit_test(time_data, waveform_data, limit_mask, workers=ctx['workers'], chunk_size=ctx['chunk_size'])
+    return run
+
+
+def stage_limit_test_uniform(ctx):
+    from limit_engine import run_limit_test
+    from time_axis import UniformTime
+    _, waveform_data = generate_waveform(ctx['size'])
+    # The same times as generate_waveform, without storing them
+    time_data = UniformTime(0.0, TIME_SPAN / ctx['size'], ctx['size'])
+    limit_mask = generate_limit_mask(ctx['mask_size'])
+
+    def run():
+        run_limit_test(time_data, waveform_data, limit_mask)
+    return run
+
+
+def _stage_align(ctx, method):
+    from time_alignment import TimeAligner
+    from time_axis import UniformTime
+    # Reference and capture differ in noise; the capture keeps time implicit
+    reference_time, reference_data = generate_waveform(min(ctx['size'], 1 << 16), seed=1)
+    _, waveform_data = generate_waveform(ctx['size'])
+    time_data = UniformTime(0.0, TIME_SPAN / ctx['size'], ctx['size'])
+    aligner = TimeAligner(reference_time, reference_data, method, max_shift=TIME_SPAN / 20)
+
+    def run():
+        aligner.estimate(time_data, waveform_data)
+    return run
+
+
+def stage_align_edge(ctx):
+    """Trigger offset of one capture from its first edge"""
+    return _stage_align(ctx, 'edge')
+
+
+def stage_align_correlation(ctx):
+    """Trigger offset of one capture by cross-correlation"""
+    return _stage_align(ctx, 'correlation')
+
+
+def stage_retest(ctx):
+    from limit_engine import retest_limits, run_limit_test
+    from limit_mask import LimitMask
+    time_data, waveform_data = generate_waveform(ctx['size'])
+    limit_mask = generate_limit_mask(ctx['mask_size'])
+    result = run_limit_test(time_data, waveform_data, limit_mask)
+    # Drag one point in the middle of the mask
+    high_limits = limit_mask.high_limits.copy()
+    high_limits[len(high_limits) // 2] -= 1.0
+    edited = LimitMask(limit_mask.time_points, high_limits, limit_mask.low_limits)
+
+    def run():
+        retest_limits(result, time_data, waveform_data, limit_mask, edited)
+    return run
+
+
+def stage_stream_test(ctx):
+    from limit_engine import run_streaming_limit_test
+    from waveform_io import CsvWaveformSource
+    limit_mask = generate_limit_mask(ctx['mask_size'])
+
+    def run():
+        chunks = CsvWaveformSource(ctx['csv_path']).iter_column_chunks('Voltage', 'Time')
+        run_streaming_limit_test(chunks, limit_mask)
+    return run
+
+
+def stage_pyramid(ctx):
+    from waveform_decimation import MinMaxPyramid
+    time_data, waveform_data = generate_waveform(ctx['size'])
+
+    def run():
+        MinMaxPyramid(time_data, waveform_data).decimate(1000, 2.0, 8.0)
+    return run
+
+
+def _qt_app():
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    try:
+        from PySide6.QtWidgets import QApplication
+    except ImportError:
+        return None
+    return QApplication.instance() or QApplication([])
+
+
+def stage_render(ctx):
+    app = _qt_app()
+    if app is None:
+        return None
+    from limit_engine import run_limit_test
+    from waveform import Waveform
+    from waveform_limit_tool import WaveformPlotWidget
+
+    waveform = Waveform(*generate_waveform(ctx['size']))
+    waveform.pyramid  # Built at load time in the tool
+    limit_mask = generate_limit_mask(ctx['mask_size'])
+    result = run_limit_test(waveform.time_data, waveform.waveform_data, limit_mask)
+    violation_mask = result.high_mask | result.low_mask
+
+    def run():
+        # A fresh widget, as the plot keeps whatever has not changed
+        widget = WaveformPlotWidget()
+        widget.resize(1200, 800)
+        widget.set_data(waveform, limit_mask, result.crossing_points, violation_mask=violation_mask)
+        widget.grab()  # Paint the scene offscreen
+        app.processEvents()
+    return run
+
+
+def stage_designer_edit(ctx):
+    app = _qt_app()
+    if app is None:
+        return None
+    from limit_mask import LimitMask
+    from waveform import Waveform
+    from waveform_limit_tool import LimitPlotWidget
+
+    widget = LimitPlotWidget()
+    widget.resize(900, 500)
+    waveform = Waveform(*generate_waveform(ctx['size']))
+    limit_mask = generate_limit_mask(ctx['mask_size'])
+    high_limits = limit_mask.high_limits.copy()
+    high_limits[len(high_limits) // 2] -= 0.5
+    edited = LimitMask(limit_mask.time_points, high_limits, limit_mask.low_limits)
+    widget.set_data(waveform, limit_mask)
+    masks = [edited, limit_mask]
+
+    def run():
+        # Move one limit point back and forth, as a click in the designer does
+        masks.reverse()
+        widget.set_data(waveform, masks[0])
+        widget.grab()
+        app.processEvents()
+    return run
+
+
+STAGES = {
+    'parse_csv': (stage_parse_csv, False),
+    'parse_csv_python': (stage_parse_csv_python, False),
+    'cache_load': (stage_cache_load, False),
+    'limit_test': (stage_limit_test, True),
+    'limit_test_parallel': (stage_limit_test_parallel, True),
+    'limit_test_uniform': (stage_limit_test_uniform, True),
+    'align_edge': (stage_align_edge, False),
+    'align_correlation': (stage_align_correlation, False),
+    'retest': (stage_retest, True),
+    'stream_test': (stage_stream_test, True),
+    'pyramid': (stage_pyramid, False),
+    'render': (stage_render, True),
+    'designer_edit': (stage_designer_edit, True),
+}
+
+
+def _run_stage(stage, ctx, repeat, queue):
+    """Child process body: set up, time the stage and report back
+
+    The peak RSS is taken over the timed runs only, so setup such as
+    generating the waveform is excluded; run_rss is how far the peak rose
+    above the RSS before the run, the memory the stage itself needed.
+    """
+    try:
+        run = STAGES[stage][0](ctx)
+        if run is None:
+            queue.put({'skipped': True})
+            return
+        rss_before = current_rss()
+        times = []
+        peak = 0
+        run_rss = None
+        for _ in range(repeat):
+            before = current_rss()
+            reset = reset_peak_rss()
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+            peak = max(peak, peak_rss())
+            if reset and before is not None:
+                run_rss = max(run_rss or 0, peak_rss() - before)
+        queue.put({'seconds': min(times), 'peak_rss': peak, 'run_rss': run_rss, 'rss_before': rss_before})
+    except Exception as e:
+        queue.put({'error': f"{type(e).__name__}: {e}"})
+
+
+def run_stage(stage, ctx, repeat):
+    """Run one stage in a fresh process and return its measurements"""
+    mp = multiprocessing.get_context('spawn')
+    queue = mp.Queue()
+    process = mp.Process(target=_run_stage, args=(stage, ctx, repeat, queue))
+    process.start()
+    while True:
+        try:
+            result = queue.get(timeout=1.0)
+            break
+        except queue_module.Empty:
+            if not process.is_alive():
+                result = {'error': f"stage process exited with code {process.exitcode}"}
+                break
+    process.join()
+    return result
+
+
+def result_key(stage, size, mask_size):
+    return f"{stage}/n={size}" + (f"/m={mask_size}" if mask_size is not None else "")
+
+
+def run_benchmarks(sizes, mask_sizes, stages, repeat, work_dir, report=print, workers=None, chunk_size=None):
+    workers = workers or os.cpu_count() or 1
+    results = {}
+    for size in sizes:
+        csv_path = os.path.join(work_dir, f"capture_{size}.csv")
+        if any(stage in CSV_STAGES for stage in stages):
+            write_csv(csv_path, size)
+            if 'cache_load' in stages or 'stream_test' in stages:
+                # Build the sidecar cache outside the timed stages
+                from waveform_io import CsvWaveformSource
+                CsvWaveformSource(csv_path).read_columns('Voltage', 'Time')
+
+        for stage in stages:
+            uses_mask = STAGES[stage][1]
+            for mask_size in (mask_sizes if uses_mask else [None]):
+                ctx = {'size': size, 'mask_size': mask_size, 'csv_path': csv_path, 'workers': workers,
+                       'chunk_size': chunk_size}
+                key = result_key(stage, size, mask_size)
+                result = run_stage(stage, ctx, repeat)
+                if 'seconds' in result:
+                    result['samples_per_second'] = size / result['seconds'] if result['seconds'] > 0 else None
+                if stage == 'limit_test_parallel' and 'seconds' in result:
+                    result['workers'] = workers
+                    serial = results.get(result_key('limit_test', size, mask_size), {})
+                    if serial.get('seconds') and result['seconds'] > 0:
+                        result['speedup'] = serial['seconds'] / result['seconds']
+                results[key] = result
+                report(key, result)
+    return results
+
+
+def format_result(key, result, baseline=None, threshold=0.25, memory_threshold=0.25):
+    """One report line, with the ratio to the baseline when there is one"""
+    if result.get('skipped'):
+        return f"{key:<32} skipped"
+    if 'error' in result:
+        return f"{key:<32} error: {result['error']}"
+
+    line = (f"{key:<32} {result['seconds'] * 1000:>11.2f} ms  "
+            f"{result['peak_rss'] / 2 ** 20:>9.1f} MiB peak")
+    if result.get('run_rss') is not None:
+        line += f" (+{result['run_rss'] / 2 ** 20:.1f} MiB in run)"
+    if 'speedup' in result:
+        line += f"  x{result['speedup']:.2f} vs serial on {result['workers']} workers"
+    if baseline and key in baseline and 'seconds' in baseline[key]:
+        ratio = result['seconds'] / baseline[key]['seconds'] if baseline[key]['seconds'] > 0 else float('inf')
+        flag = "  REGRESSION" if ratio > 1 + threshold else ""
+        line += f"  x{ratio:.2f} vs baseline{flag}"
+        if 'memory' in regression_kinds(result, baseline[key], threshold, memory_threshold):
+            line += "  MEMORY REGRESSION"
+    return line
+
+
+def regression_kinds(result, base, threshold, memory_threshold):
+    """Return which of 'time' and 'memory' grew too much over a baseline result
+
+    Memory compares the RSS a run added, where both results have it, and
+    ignores growth below MEMORY_SLACK.
+    """
+    kinds = []
+    if 'seconds' in base and 'seconds' in result and result['seconds'] > base['seconds'] * (1 + threshold):
+        kinds.append('time')
+    if result.get('run_rss') is not None and base.get('run_rss') is not None:
+        grown = result['run_rss'] - base['run_rss']
+        if grown > MEMORY_SLACK and result['run_rss'] > base['run_rss'] * (1 + memory_threshold):
+            kinds.append('memory')
+    return kinds
+
+
+def find_regressions(results, baseline, threshold, memory_threshold=0.25):
+    """Return {key: ['time', 'memory']} for the stages that regressed over baseline"""
+    regressions = {}
+    for key, result in results.items():
+        base = baseline.get(key)
+        kinds = regression_kinds(result, base, threshold, memory_threshold) if base else []
+        if kinds:
+            regressions[key] = kinds
+    return regressions
+
+
+def parse_size(text):
+    return int(float(text))
+
+
+def parse_sizes(text):
+    return [parse_size(value) for value in text.split(',') if value]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the load, test and render stages")
+    parser.add_argument('--sizes', type=parse_sizes, default=DEFAULT_SIZES,
+                        help="Comma separated sample counts, e.g. 1e3,1e5,1e8")
+    parser.add_argument('--mask-sizes', type=parse_sizes, default=DEFAULT_MASK_SIZES,
+                        help="Comma separated limit point counts (2 to 100)")
+    parser.add_argument('--stages', default=','.join(DEFAULT_STAGES),
+                        help=f"Comma separated stages from: {', '.join(STAGES)}")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Threads for the limit_test_parallel stage (default: CPU count)")
+    parser.add_argument('--chunk-size', type=parse_size, default=None,
+                        help="Samples per chunk for limit_test_parallel (default: split evenly over the workers)")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per stage; the fastest is kept")
+    parser.add_argument('--baseline', help="Compare against a baseline JSON file")
+    parser.add_argument('--save-baseline', help="Write the results as a baseline JSON file")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="Relative slowdown reported as a regression (default 0.25)")
+    parser.add_argument('--memory-threshold', type=float, default=0.25,
+                        help="Relative growth of the memory a run adds reported as a regression (default 0.25)")
+    parser.add_argument('--output', help="Write the full results as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    stages = [stage for stage in args.stages.split(',') if stage]
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        print(f"Unknown stages: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+
+    def report(key, result):
+        print(format_result(key, result, baseline, args.threshold, args.memory_threshold), flush=True)
+
+    with tempfile.TemporaryDirectory(prefix='waveform_bench_') as work_dir:
+        results = run_benchmarks(args.sizes, args.mask_sizes, stages, args.repeat, work_dir, report, args.workers,
+                                 args.chunk_size)
+
+    document = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'results': results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(document, f, indent=2)
+
+    if baseline:
+        regressions = find_regressions(results, baseline, args.threshold, args.memory_threshold)
+        if regressions:
+            print(f"\n{len(regressions)} stage(s) regressed by more than {args.threshold:.0%} in time "
+                  f"or {args.memory_threshold:.0%} in memory:")
+            for key, kinds in regressions.items():
+                print(f"  {key} ({', '.join(kinds)})")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
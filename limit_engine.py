@@ -0,0 +1,763 @@
+"""GUI-independent limit test engine working on NumPy arrays"""
+import bisect
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from limit_mask import as_limit_mask
+from time_axis import as_time_array
+from violation_events import ViolationEvents
+from waveform_decimation import is_sorted
+
+
+# Samples evaluated per block; bounds the temporaries created while
+# interpolating the envelopes of very long captures
+DEFAULT_BLOCK_SIZE = 1 << 20
+# Smallest chunk a parallel limit test splits a capture into; below this
+# the per-chunk overhead outweighs the work
+MIN_CHUNK_SIZE = 1 << 16
+
+
+class LimitTestResult:
+    """Crossing points, excursions and violation counts from one limit test
+
+    The violation counts come from the excursion table when there is one.
+    The per-sample violation masks are only kept when the whole waveform was
+    tested in memory; streamed tests leave them as None. time_shift is how
+    far the mask was moved to align it with the capture, or None when the
+    capture was not aligned.
+    """
+
+    def __init__(self, crossing_points, total_points, high_violations, low_violations,
+                 high_mask=None, low_mask=None, events=None, time_shift=None):
+        self.crossing_points = crossing_points
+        self.total_points = total_points
+        self.high_violations = high_violations
+        self.low_violations = low_violations
+        self.high_mask = high_mask
+        self.low_mask = low_mask
+        self.events = events
+        self.time_shift = time_shift
+
+    @classmethod
+    def from_events(cls, events, total_points, crossing_points, high_mask=None, low_mask=None):
+        return cls(crossing_points, total_points, events.sample_count('high'), events.sample_count('low'),
+                   high_mask, low_mask, events)
+
+    @property
+    def total_violations(self):
+        return self.high_violations + self.low_violations
+
+    @property
+    def violation_rate(self):
+        """Violations as a percentage of the tested samples"""
+        if self.total_points == 0:
+            return 0.0
+        return self.total_violations / self.total_points * 100
+
+    @property
+    def passed(self):
+        return self.total_violations == 0
+
+    def summary(self):
+        """Return the violation summary as a JSON-friendly dict"""
+        return {
+            'total_points': self.total_points,
+            'crossing_count': len(self.crossing_points),
+            'high_violations': self.high_violations,
+            'low_violations': self.low_violations,
+            'total_violations': self.total_violations,
+            'violation_rate': self.violation_rate,
+            'excursion_count': len(self.events) if self.events is not None else None,
+            'max_overshoot': float(self.events.peak.max()) if self.events is not None and len(self.events) else 0.0,
+            'passed': self.passed,
+            'time_shift': self.time_shift,
+        }
+
+    def format_report(self, limit_point_count):
+        """Return the human-readable results report shown in the GUI"""
+        results = []
+        results.append("=== LIMIT ARRAY TEST RESULTS ===\n")
+        results.append(f"Limit Points: {limit_point_count}")
+        results.append(f"Total Data Points: {self.total_points}")
+        if self.time_shift is not None:
+            results.append(f"Time Shift Applied: {self.time_shift:+.6g}")
+        results.append(f"Crossing Points Found: {len(self.crossing_points)}\n")
+
+        if self.crossing_points:
+            results.append("CROSSING POINTS:")
+            results.append("-" * 63)
+            results.append(f"{'Index':<8} {'Time':<12} {'Value':<12} {'Crossing':<12} {'Limit':<6} {'Dir':<6}")
+            results.append("-" * 63)
+
+            for cp in self.crossing_points:
+                results.append(f"{cp['index']:<8} {cp['time']:<12.4f} {cp['value']:<12.4f} "
+                               f"{cp.get('crossing_time', cp['time']):<12.6f} {cp['type']:<6} {cp['direction']:<6}")
+        else:
+            results.append("No limit violations detected!")
+
+        results.append(f"\nVIOLATION SUMMARY:")
+        results.append(f"Points above high limits: {self.high_violations}")
+        results.append(f"Points below low limits: {self.low_violations}")
+        results.append(f"Total violations: {self.total_violations}")
+        results.append(f"Violation rate: {self.violation_rate:.2f}%")
+
+        if self.events is not None and len(self.events):
+            results.append(f"\nWORST EXCURSIONS ({len(self.events)} in total):")
+            results.append("-" * 63)
+            results.append(f"{'Start':<12} {'Duration':<12} {'Peak':<12} {'Area':<12} {'Limit':<6} {'Samples':<8}")
+            results.append("-" * 63)
+            for event in self.events.worst(5).to_records():
+                results.append(f"{event['start_time']:<12.4f} {event['duration']:<12.6f} {event['peak']:<12.4f} "
+                               f"{event['area']:<12.6f} {event['type']:<6} {event['samples']:<8}")
+
+        return "\n".join(results)
+
+
+def compute_violation_masks(time_data, waveform_data, limit_mask, block_size=DEFAULT_BLOCK_SIZE, progress=None,
+                            executor=None):
+    """Return boolean (high, low) masks of samples outside the limits
+
+    limit_mask is a LimitMask or a limit arrays dict. time_data may be a
+    UniformTime, whose blocks are evaluated segment by segment. With an
+    executor the blocks are evaluated on it; every block writes its own
+    slice of the masks. progress, if given, is called with the fraction of
+    samples tested after every block; an exception raised from it aborts
+    the test.
+    """
+    limit_mask = as_limit_mask(limit_mask)
+    time_data = as_time_array(time_data)
+    waveform_data = np.asarray(waveform_data)
+    n = len(waveform_data)
+    time_sorted = is_sorted(time_data)
+
+    high_mask = np.zeros(n, dtype=bool)
+    low_mask = np.zeros(n, dtype=bool)
+
+    def test_block(start):
+        stop = min(start + block_size, n)
+        high, low = limit_mask.evaluate(time_data[start:stop], time_sorted)
+        amp = waveform_data[start:stop]
+        np.greater(amp, high, out=high_mask[start:stop])
+        np.less(amp, low, out=low_mask[start:stop])
+        return stop
+
+    starts = range(0, n, block_size)
+    for stop in (executor.map(test_block, starts) if executor is not None else map(test_block, starts)):
+        if progress is not None:
+            progress(stop / n)
+
+    return high_mask, low_mask
+
+
+def _transitions(mask, previous):
+    """Indices where mask differs from the sample before it"""
+    changed = np.flatnonzero(mask[1:] != mask[:-1]) + 1
+    if previous is not None and len(mask) and mask[0] != previous:
+        changed = np.concatenate(([0], changed))
+    return changed
+
+
+def crossing_times(limit_mask, t0, v0, t1, v1, is_low):
+    """Return the (time, value) where the waveform crosses a limit
+
+    The waveform runs linearly from (t0, v0) to (t1, v1) and its violation
+    state differs at the two ends; the result is where it meets the
+    interpolated high (or, where is_low, low) limit. The limits at the pair
+    ends come from one merge of the sorted times against the mask; only
+    pairs with mask points strictly between their samples walk those
+    points, and in a sorted capture each mask point falls inside at most
+    one pair.
+    """
+    t0 = np.asarray(t0, dtype=np.float64)
+    t1 = np.asarray(t1, dtype=np.float64)
+    v0 = np.asarray(v0, dtype=np.float64)
+    v1 = np.asarray(v1, dtype=np.float64)
+    high0, low0 = limit_mask.evaluate(t0)
+    high1, low1 = limit_mask.evaluate(t1)
+    d0 = v0 - np.where(is_low, low0, high0)
+    d1 = v1 - np.where(is_low, low1, high1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = np.clip(d0 / (d0 - d1), 0.0, 1.0)
+    fraction[~np.isfinite(fraction)] = 1.0
+    times = t0 + fraction * (t1 - t0)
+    values = v0 + fraction * (v1 - v0)
+
+    # Pairs straddling mask points cross on one of several limit segments
+    first = np.searchsorted(limit_mask.time_points, np.minimum(t0, t1), side='right')
+    last = np.searchsorted(limit_mask.time_points, np.maximum(t0, t1), side='left')
+    for k in np.flatnonzero(last > first).tolist():
+        times[k], values[k] = _crossing_between_points(
+            limit_mask, float(t0[k]), float(v0[k]), float(t1[k]), float(v1[k]),
+            bool(is_low[k]), int(first[k]), int(last[k]))
+    return times, values
+
+
+def _crossing_between_points(limit_mask, t0, v0, t1, v1, is_low, first, last):
+    """Solve one crossing whose samples have mask points between them"""
+    knots = limit_mask.time_points[first:last].tolist()
+    if t1 < t0:
+        knots.reverse()
+    knots = [t0] + knots + [t1]
+
+    def distance(t):
+        # Waveform minus limit, with the waveform interpolated at t
+        limit = limit_mask.limits_at(t)[1 if is_low else 0]
+        return v0 + (t - t0) / (t1 - t0) * (v1 - v0) - limit
+
+    def violated(d):
+        return d < 0 if is_low else d > 0
+
+    d_prev = distance(t0)
+    start_state = violated(d_prev)
+    for a, b in zip(knots[:-1], knots[1:]):
+        d_next = distance(b)
+        if violated(d_next) != start_state or b == t1:
+            fraction = min(max(d_prev / (d_prev - d_next), 0.0), 1.0) if d_prev != d_next else 1.0
+            t = a + fraction * (b - a)
+            return t, v0 + (t - t0) / (t1 - t0) * (v1 - v0)
+        d_prev = d_next
+
+
+def find_crossing_points(time_data, waveform_data, high_mask, low_mask, index_offset=0, previous_state=None,
+                         limit_mask=None, previous_sample=None):
+    """Build crossing point dicts from the transitions in the violation masks
+
+    A crossing is reported at the first sample whose violation state differs
+    from the previous sample. Results are ordered by time, with ties kept in
+    sample order and high crossings before low ones. For a chunk of a longer
+    waveform, index_offset is the index of its first sample and
+    previous_state the (high, low) violation state of the sample before it.
+
+    Given the limit_mask, every crossing also gets 'crossing_time' and
+    'crossing_value', where the line between the two samples meets the
+    limit. A crossing at the chunk's first sample needs previous_sample,
+    the (time, value) before it; without it the sample itself is used.
+    """
+    previous_high, previous_low = previous_state if previous_state is not None else (None, None)
+    high_idx = _transitions(high_mask, previous_high)
+    low_idx = _transitions(low_mask, previous_low)
+
+    if len(high_idx) == 0 and len(low_idx) == 0:
+        return []
+
+    indices = np.concatenate((high_idx, low_idx))
+    is_low = np.concatenate((np.zeros(len(high_idx), dtype=bool), np.ones(len(low_idx), dtype=bool)))
+    entering = np.concatenate((high_mask[high_idx], low_mask[low_idx]))
+
+    # Sample order with high before low, then a stable sort on time
+    order = np.argsort(indices * 2 + is_low, kind='stable')
+    time_data = as_time_array(time_data)
+    order = order[np.argsort(time_data[indices[order]], kind='stable')]
+
+    indices = indices[order]
+    is_low = is_low[order]
+    entering = entering[order]
+    waveform_data = np.asarray(waveform_data)
+    times = time_data[indices]
+    values = waveform_data[indices]
+
+    if limit_mask is not None:
+        # Line from the sample before each crossing to the crossing sample
+        before = indices - 1
+        prev_times = time_data[before].astype(np.float64)
+        prev_values = waveform_data[before].astype(np.float64)
+        at_start = before < 0
+        if at_start.any():
+            prev_times[at_start], prev_values[at_start] = (previous_sample if previous_sample is not None
+                                                           else (times[at_start], values[at_start]))
+        exact_times, exact_values = crossing_times(as_limit_mask(limit_mask), prev_times, prev_values,
+                                                   times, values, is_low)
+        exact = zip(exact_times.tolist(), exact_values.tolist())
+    else:
+        exact = None
+
+    crossing_points = []
+    indices = indices + index_offset
+    for i, t, v, low, enter in zip(indices.tolist(), times.tolist(), values.tolist(),
+                                   is_low.tolist(), entering.tolist()):
+        if low:
+            cp = {'index': i, 'time': t, 'value': v, 'type': 'low', 'direction': 'down' if enter else 'up'}
+        else:
+            cp = {'index': i, 'time': t, 'value': v, 'type': 'high', 'direction': 'up' if enter else 'down'}
+        if exact is not None:
+            cp['crossing_time'], cp['crossing_value'] = next(exact)
+        crossing_points.append(cp)
+    return crossing_points
+
+
+def _excursions(time_data, waveform_data, mask, limit_mask, is_low, previous_sample, next_sample):
+    """Return the excursion table columns for the runs in one violation mask"""
+    edges = np.diff(mask.view(np.int8), prepend=0, append=0)
+    starts = np.flatnonzero(edges == 1)
+    stops = np.flatnonzero(edges == -1)
+    if len(starts) == 0:
+        return None
+
+    # Only the violating samples are looked at again, run by run
+    violating = np.flatnonzero(mask)
+    t = time_data[violating].astype(np.float64)
+    v = waveform_data[violating].astype(np.float64)
+    high, low = limit_mask.evaluate(t)
+    overshoot = low - v if is_low else v - high
+
+    lengths = stops - starts
+    first = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    last = first + lengths - 1
+    run = np.repeat(np.arange(len(starts)), lengths)
+
+    peak = np.maximum.reduceat(overshoot, first)
+    peak_pos = np.flatnonzero(overshoot == peak[run])
+    peak_pos = peak_pos[np.unique(run[peak_pos], return_index=True)[1]]
+
+    same_run = run[1:] == run[:-1]
+    pieces = (overshoot[1:] + overshoot[:-1]) * 0.5 * np.abs(np.diff(t))
+    area = np.bincount(run[1:][same_run], weights=pieces[same_run], minlength=len(starts)).astype(np.float64)
+
+    # Excursions start and end where the waveform crosses the limit; at the
+    # ends of the data without a neighbouring sample, at the sample itself
+    # Both ends of every run are solved in one call: first the entering
+    # crossings, then the leaving ones
+    runs = len(starts)
+    sample_pos = np.concatenate((first, last))
+    neighbour = np.concatenate((starts - 1, stops))
+    bounds = t[sample_pos]
+    inside = (neighbour >= 0) & (neighbour < len(mask))
+    known = inside.copy()
+    other_t = np.empty(2 * runs)
+    other_v = np.empty(2 * runs)
+    other_t[inside] = time_data[neighbour[inside]]
+    other_v[inside] = waveform_data[neighbour[inside]]
+    for edge, edge_sample in ((slice(None, runs), previous_sample), (slice(runs, None), next_sample)):
+        if edge_sample is not None:
+            outside = ~inside[edge]
+            other_t[edge][outside], other_v[edge][outside] = edge_sample
+            known[edge] |= outside
+    if known.any():
+        bounds[known] = crossing_times(limit_mask, other_t[known], other_v[known], t[sample_pos[known]],
+                                       v[sample_pos[known]], np.full(np.count_nonzero(known), is_low))[0]
+    start_time, end_time = bounds[:runs], bounds[runs:]
+    area += 0.5 * (overshoot[first] * np.abs(t[first] - start_time) + overshoot[last] * np.abs(end_time - t[last]))
+
+    return (np.full(len(starts), is_low), starts, stops, start_time, end_time,
+            peak, violating[peak_pos], t[peak_pos], area)
+
+
+def find_violation_events(time_data, waveform_data, high_mask, low_mask, limit_mask, index_offset=0,
+                          previous_sample=None, next_sample=None):
+    """Build the ViolationEvents table from the runs in the violation masks
+
+    Excursions running into the first or last sample end at the crossing
+    with previous_sample or next_sample, the (time, value) just outside this
+    stretch of a longer waveform, when given; their violation state is
+    assumed to be inside the limits.
+    """
+    limit_mask = as_limit_mask(limit_mask)
+    time_data = as_time_array(time_data)
+    waveform_data = np.asarray(waveform_data)
+    tables = []
+    for mask, is_low in ((high_mask, False), (low_mask, True)):
+        columns = _excursions(time_data, waveform_data, mask, limit_mask, is_low, previous_sample, next_sample)
+        if columns is not None:
+            tables.append(ViolationEvents(*columns))
+    return ViolationEvents.concatenate(tables).shifted(index_offset)
+
+
+def run_limit_test(time_data, waveform_data, limit_mask, block_size=DEFAULT_BLOCK_SIZE, progress=None, workers=1,
+                   chunk_size=None, aligner=None):
+    """Test a waveform against interpolated high/low limits
+
+    With workers > 1 the capture is tested in chunks of about chunk_size
+    samples on a thread pool; NumPy releases the GIL for the heavy work.
+    chunk_size defaults to a quarter of each worker's share, kept between
+    MIN_CHUNK_SIZE and block_size. The result is identical to the serial
+    one.
+
+    With a TimeAligner the mask is first moved by the capture's estimated
+    offset, which the result keeps as time_shift.
+    """
+    time_data = as_time_array(time_data)
+    waveform_data = np.asarray(waveform_data)
+    if aligner is not None:
+        time_shift = aligner.estimate(time_data, waveform_data)
+        result = run_limit_test(time_data, waveform_data, as_limit_mask(limit_mask).shifted(time_shift), block_size,
+                                progress, workers, chunk_size)
+        result.time_shift = time_shift
+        return result
+    n = len(waveform_data)
+    if workers > 1:
+        if chunk_size is None:
+            chunk_size = min(max(-(-n // (4 * workers)), MIN_CHUNK_SIZE), block_size)
+        if n > chunk_size:
+            return _run_chunked_limit_test(time_data, waveform_data, as_limit_mask(limit_mask), chunk_size,
+                                           progress, workers)
+    high_mask, low_mask = compute_violation_masks(time_data, waveform_data, limit_mask, block_size, progress)
+    crossing_points = find_crossing_points(time_data, waveform_data, high_mask, low_mask, limit_mask=limit_mask)
+    events = find_violation_events(time_data, waveform_data, high_mask, low_mask, limit_mask)
+    return LimitTestResult.from_events(events, n, crossing_points, high_mask, low_mask)
+
+
+def _chunk_bounds(high_mask, low_mask, chunk_size):
+    """Return sample indices splitting the masks into chunks of about chunk_size
+
+    Each boundary is moved forward to the first sample that does not
+    continue an excursion from the sample before it, so every excursion
+    lies within a single chunk.
+    """
+    n = len(high_mask)
+    bounds = [0]
+    start = chunk_size
+    while start < n:
+        stop = min(start + chunk_size, n)
+        joined = high_mask[start - 1:stop - 1] & high_mask[start:stop]
+        joined |= low_mask[start - 1:stop - 1] & low_mask[start:stop]
+        free = np.flatnonzero(~joined)
+        if len(free):
+            bounds.append(start + int(free[0]))
+            start = bounds[-1] + chunk_size
+        else:
+            start = stop
+    bounds.append(n)
+    return bounds
+
+
+def _run_chunked_limit_test(time_data, waveform_data, limit_mask, chunk_size, progress, workers):
+    """run_limit_test on a thread pool, one chunk of samples per task
+
+    The masks are computed block by block, then crossings and excursions
+    are found per chunk, with the state and sample before each chunk and
+    the sample after it taken from its neighbours. As no excursion spans
+    two chunks, the pieces join without any fix-up and every value is
+    computed exactly as in the serial test.
+    """
+    n = len(waveform_data)
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        high_mask, low_mask = compute_violation_masks(time_data, waveform_data, limit_mask, chunk_size, progress,
+                                                      executor)
+
+        def test_chunk(bounds):
+            a, b = bounds
+            previous_state = (bool(high_mask[a - 1]), bool(low_mask[a - 1])) if a > 0 else None
+            previous_sample = (time_data[a - 1], waveform_data[a - 1]) if a > 0 else None
+            next_sample = (time_data[b], waveform_data[b]) if b < n else None
+            crossing_points = find_crossing_points(time_data[a:b], waveform_data[a:b], high_mask[a:b], low_mask[a:b],
+                                                   a, previous_state, limit_mask, previous_sample)
+            events = find_violation_events(time_data[a:b], waveform_data[a:b], high_mask[a:b], low_mask[a:b],
+                                           limit_mask, a, previous_sample, next_sample)
+            return crossing_points, events
+
+        bounds = _chunk_bounds(high_mask, low_mask, chunk_size)
+        chunks = list(executor.map(test_chunk, zip(bounds[:-1], bounds[1:])))
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+    crossing_points = [cp for chunk_points, _ in chunks for cp in chunk_points]
+    if not is_sorted(time_data) and crossing_points:
+        # Chunks are in sample order; a stable sort on time gives the order
+        # of the serial test, ties in sample order
+        order = np.argsort([cp['time'] for cp in crossing_points], kind='stable')
+        crossing_points = [crossing_points[i] for i in order.tolist()]
+    events = ViolationEvents.concatenate([chunk_events for _, chunk_events in chunks])
+    return LimitTestResult.from_events(events, n, crossing_points, high_mask, low_mask)
+
+
+def changed_time_window(old_mask, new_mask):
+    """Return the (start, end) time window where two masks can disagree
+
+    Samples outside the window get identical limit values from both masks.
+    The window runs from the last unchanged point before the edit to the
+    first unchanged point after it, and is unbounded on a side where the
+    edit reaches the first or last point. Returns None if the masks are
+    identical.
+    """
+    old_mask = as_limit_mask(old_mask)
+    new_mask = as_limit_mask(new_mask)
+    if old_mask is new_mask:
+        return None
+
+    old = np.vstack((old_mask.time_points, old_mask.high_limits, old_mask.low_limits))
+    new = np.vstack((new_mask.time_points, new_mask.high_limits, new_mask.low_limits))
+    old_len, new_len = old.shape[1], new.shape[1]
+    common = min(old_len, new_len)
+
+    # Length of the unchanged run at the start, then at the end
+    differs = np.any(old[:, :common] != new[:, :common], axis=0)
+    head = int(np.argmax(differs)) if differs.any() else common
+    if head == old_len == new_len:
+        return None
+    room = common - head
+    differs = np.any(old[:, old_len - room:][:, ::-1] != new[:, new_len - room:][:, ::-1], axis=0)
+    tail = int(np.argmax(differs)) if differs.any() else room
+
+    start = float(old[0, head - 1]) if head > 0 else -np.inf
+    end = float(old[0, old_len - tail]) if tail > 0 else np.inf
+    return start, end
+
+
+def retest_limits(result, time_data, waveform_data, old_mask, new_mask, block_size=DEFAULT_BLOCK_SIZE,
+                  progress=None):
+    """Update a limit test result for edited limits
+
+    result must come from run_limit_test on the same samples with
+    old_mask. Only samples inside changed_time_window are evaluated again;
+    masks, crossings and excursions elsewhere are carried over, so moving one
+    point costs time proportional to the samples between its neighbours.
+    Returns a new LimitTestResult and leaves result untouched.
+    """
+    if result.high_mask is None or result.low_mask is None:
+        raise ValueError("Incremental re-test needs a result with violation masks")
+
+    time_data = as_time_array(time_data)
+    waveform_data = np.asarray(waveform_data)
+    window = changed_time_window(old_mask, new_mask)
+    if window is None:
+        return LimitTestResult(list(result.crossing_points), result.total_points,
+                               result.high_violations, result.low_violations,
+                               result.high_mask, result.low_mask, result.events)
+
+    high_mask = result.high_mask.copy()
+    low_mask = result.low_mask.copy()
+    start, end = window
+
+    if is_sorted(time_data):
+        # The affected samples form one contiguous run
+        a = int(np.searchsorted(time_data, start, side='left'))
+        b = int(np.searchsorted(time_data, end, side='right'))
+        high, low = compute_violation_masks(time_data[a:b], waveform_data[a:b], new_mask, block_size, progress)
+        high_mask[a:b] = high
+        low_mask[a:b] = low
+
+        # Crossings at a..b can change (b compares against the last
+        # re-tested sample); the sorted list is spliced around them
+        previous_state = (bool(high_mask[a - 1]), bool(low_mask[a - 1])) if a > 0 else None
+        previous_sample = (time_data[a - 1], waveform_data[a - 1]) if a > 0 else None
+        stop = min(b + 1, len(waveform_data))
+        middle = find_crossing_points(time_data[a:stop], waveform_data[a:stop],
+                                      high_mask[a:stop], low_mask[a:stop], a, previous_state,
+                                      new_mask, previous_sample)
+        old_points = result.crossing_points
+        left = bisect.bisect_left(old_points, a, key=lambda cp: cp['index'])
+        right = bisect.bisect_left(old_points, stop, key=lambda cp: cp['index'])
+        crossing_points = old_points[:left] + middle + old_points[right:]
+        events = _splice_events(result.events, time_data, waveform_data, high_mask, low_mask, new_mask, a, b)
+    else:
+        affected = np.flatnonzero((time_data >= start) & (time_data <= end))
+        high, low = compute_violation_masks(time_data[affected], waveform_data[affected], new_mask,
+                                            block_size, progress)
+        high_mask[affected] = high
+        low_mask[affected] = low
+        crossing_points = find_crossing_points(time_data, waveform_data, high_mask, low_mask,
+                                               limit_mask=new_mask)
+        events = find_violation_events(time_data, waveform_data, high_mask, low_mask, new_mask)
+
+    return LimitTestResult.from_events(events, len(high_mask), crossing_points, high_mask, low_mask)
+
+
+def _splice_events(events, time_data, waveform_data, high_mask, low_mask, limit_mask, a, b):
+    """Rebuild the excursions around re-tested samples a..b - 1
+
+    Excursions overlapping or next to the re-tested samples are rebuilt
+    together with them; the stretch is widened until no excursion crosses
+    its ends, so every other excursion is carried over unchanged.
+    """
+    if events is None:
+        return find_violation_events(time_data, waveform_data, high_mask, low_mask, limit_mask)
+
+    lo, hi = a, b
+    touching = (events.stop >= a) & (events.start <= b)
+    while touching.any():
+        lo = min(lo, int(events.start[touching].min()))
+        hi = max(hi, int(events.stop[touching].max()))
+        touching = (((events.start < lo) & (events.stop > lo))
+                    | ((events.start < hi) & (events.stop > hi)))
+
+    n = len(waveform_data)
+    middle = find_violation_events(time_data[lo:hi], waveform_data[lo:hi], high_mask[lo:hi], low_mask[lo:hi],
+                                   limit_mask, lo,
+                                   (time_data[lo - 1], waveform_data[lo - 1]) if lo > 0 else None,
+                                   (time_data[hi], waveform_data[hi]) if hi < n else None)
+    replaced = (events.start >= lo) & (events.start < hi)
+    return ViolationEvents.concatenate([events.take(~replaced), middle])
+
+
+def run_multi_channel_test(channels, limit_assignments, block_size=DEFAULT_BLOCK_SIZE, workers=1, progress=None):
+    """Test several channels in one pass and return {name: LimitTestResult}
+
+    channels maps a name to its (time_data, waveform_data) and
+    limit_assignments maps a name to its LimitMask; channels without an
+    assignment are not tested. Channels sharing both a time array and a
+    mask are tested together, interpolating the envelopes once per block
+    for all of them. With workers > 1 the blocks, then the crossing and
+    excursion searches, run on a thread pool; NumPy releases the GIL for
+    the heavy work. progress is called with the fraction of blocks done.
+    """
+    # Group by identity so shared arrays and masks are only interpolated once
+    groups = {}
+    for name, (time_data, waveform_data) in channels.items():
+        limit_mask = limit_assignments.get(name)
+        if limit_mask is not None:
+            key = (id(time_data), id(limit_mask))
+            if key not in groups:
+                time_data = as_time_array(time_data)
+                groups[key] = (time_data, is_sorted(time_data), as_limit_mask(limit_mask), [])
+            groups[key][3].append(name)
+
+    times = {}
+    waveforms = {}
+    masks = {}
+    limit_masks = {}
+    for time_data, _, limit_mask, names in groups.values():
+        for name in names:
+            times[name] = time_data
+            limit_masks[name] = limit_mask
+            waveforms[name] = np.asarray(channels[name][1])
+            if len(waveforms[name]) != len(time_data):
+                raise ValueError(f"Channel {name} has {len(waveforms[name])} samples for {len(time_data)} times")
+            masks[name] = (np.zeros(len(time_data), dtype=bool), np.zeros(len(time_data), dtype=bool))
+
+    def test_block(task):
+        time_data, time_sorted, limit_mask, names, start = task
+        stop = min(start + block_size, len(time_data))
+        high, low = limit_mask.evaluate(time_data[start:stop], time_sorted)
+        for name in names:
+            amp = waveforms[name][start:stop]
+            high_mask, low_mask = masks[name]
+            np.greater(amp, high, out=high_mask[start:stop])
+            np.less(amp, low, out=low_mask[start:stop])
+
+    def finish_channel(name):
+        high_mask, low_mask = masks[name]
+        crossing_points = find_crossing_points(times[name], waveforms[name], high_mask, low_mask,
+                                               limit_mask=limit_masks[name])
+        events = find_violation_events(times[name], waveforms[name], high_mask, low_mask, limit_masks[name])
+        return LimitTestResult.from_events(events, len(high_mask), crossing_points, high_mask, low_mask)
+
+    tasks = [(time_data, time_sorted, limit_mask, names, start)
+             for time_data, time_sorted, limit_mask, names in groups.values()
+             for start in range(0, len(time_data), block_size)]
+
+    executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        blocks = executor.map(test_block, tasks) if executor else map(test_block, tasks)
+        for done, _ in enumerate(blocks, 1):
+            if progress is not None:
+                progress(done / len(tasks))
+        names = list(masks)
+        results = executor.map(finish_channel, names) if executor else map(finish_channel, names)
+        results = dict(zip(names, results))
+    finally:
+        if executor is not None:
+            # Blocks still queued after a cancelled run are dropped
+            executor.shutdown(cancel_futures=True)
+
+    # Results in the order the channels were given
+    return {name: results[name] for name in channels if name in results}
+
+
+class StreamingLimitTest:
+    """Limit test fed one chunk of samples at a time
+
+    Only the crossing list, the excursion table and the last sample seen
+    with its violation state are kept between chunks, so memory is bounded
+    by the chunk size however long the capture is. Crossings and excursions
+    at chunk boundaries are detected exactly and the final result matches
+    run_limit_test.
+
+    A test that never ends, such as a live one, calls drain() after each
+    chunk instead of result(), so the lists do not grow with its history.
+    """
+
+    def __init__(self, limit_mask, block_size=DEFAULT_BLOCK_SIZE):
+        self.limit_mask = as_limit_mask(limit_mask)
+        self.block_size = block_size
+        self.crossing_points = []
+        self.events = []
+        # Excursions still running at the end of the last chunk
+        self.open_events = ViolationEvents.empty()
+        self.total_points = 0
+        self.previous_state = None
+        self.previous_sample = None
+
+    def feed(self, time_data, waveform_data):
+        """Test the next chunk of samples"""
+        time_data = as_time_array(time_data)
+        waveform_data = np.asarray(waveform_data)
+        if len(waveform_data) == 0:
+            return
+
+        high_mask, low_mask = compute_violation_masks(time_data, waveform_data, self.limit_mask, self.block_size)
+        self.crossing_points.extend(find_crossing_points(
+            time_data, waveform_data, high_mask, low_mask, self.total_points, self.previous_state,
+            self.limit_mask, self.previous_sample))
+
+        if not (len(self.open_events) or high_mask.any() or low_mask.any()):
+            events = None
+        elif self.previous_sample is None:
+            events = find_violation_events(time_data, waveform_data, high_mask, low_mask, self.limit_mask)
+        else:
+            # With the last sample of the previous chunk in front, a running
+            # excursion shows up as one starting at that sample
+            events = find_violation_events(
+                np.concatenate(([self.previous_sample[0]], time_data)),
+                np.concatenate(([self.previous_sample[1]], waveform_data)),
+                np.concatenate(([self.previous_state[0]], high_mask)),
+                np.concatenate(([self.previous_state[1]], low_mask)),
+                self.limit_mask, self.total_points - 1)
+            events = self._continue_open_events(events)
+
+        self.total_points += len(waveform_data)
+        if events is not None:
+            still_open = events.stop == self.total_points
+            self.events.append(events.take(~still_open))
+            self.open_events = events.take(still_open)
+        self.previous_state = (bool(high_mask[-1]), bool(low_mask[-1]))
+        self.previous_sample = (time_data[-1], waveform_data[-1])
+
+    def drain(self):
+        """Return and forget the crossings and finished excursions found so far
+
+        Returns (crossing_points, events); excursions still running stay
+        in open_events until they end.
+        """
+        crossing_points, self.crossing_points = self.crossing_points, []
+        events, self.events = ViolationEvents.concatenate(self.events), []
+        return crossing_points, events
+
+    def _continue_open_events(self, events):
+        """Join the excursions starting at the carried-over sample to the open ones"""
+        if len(self.open_events) == 0:
+            return events
+        columns = {name: getattr(events, name).copy() for name in
+                   ('start', 'start_time', 'peak', 'peak_index', 'peak_time', 'area')}
+        boundary = self.total_points - 1
+        for k in range(len(self.open_events)):
+            earlier = self.open_events.take([k])
+            row = np.flatnonzero((events.start == boundary) & (events.is_low == earlier.is_low[0]))[0]
+            columns['start'][row] = earlier.start[0]
+            columns['start_time'][row] = earlier.start_time[0]
+            columns['area'][row] += earlier.area[0]
+            if earlier.peak[0] >= columns['peak'][row]:
+                columns['peak'][row] = earlier.peak[0]
+                columns['peak_index'][row] = earlier.peak_index[0]
+                columns['peak_time'][row] = earlier.peak_time[0]
+        return ViolationEvents(events.is_low, columns['start'], events.stop, columns['start_time'],
+                               events.end_time, columns['peak'], columns['peak_index'],
+                               columns['peak_time'], columns['area'])
+
+    def result(self):
+        """Return the LimitTestResult for everything fed so far"""
+        # Chunks arrive in sample order; a stable sort restores global time
+        # order for captures whose time axis is not monotonic
+        crossing_points = sorted(self.crossing_points, key=lambda x: x['time'])
+        events = ViolationEvents.concatenate(self.events + [self.open_events])
+        return LimitTestResult.from_events(events, self.total_points, crossing_points)
+
+
+def run_streaming_limit_test(chunks, limit_mask, block_size=DEFAULT_BLOCK_SIZE):
+    """Test an iterable of (time_data, waveform_data) chunks"""
+    test = StreamingLimitTest(limit_mask, block_size)
+    for time_data, waveform_data in chunks:
+        test.feed(time_data, waveform_data)
+    return test.result()
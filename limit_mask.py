@@ -0,0 +1,221 @@
+"""Validated high/low limit mask shared by the designer, plot and tester"""
+import bisect
+
+import numpy as np
+
+from time_axis import UniformTime
+from waveform_decimation import is_sorted
+
+
+# Keys of the plain dict form used by limit files
+LIMIT_KEYS = ('time_points', 'high_limits', 'low_limits')
+# Evaluate a uniform time axis slice by slice while its segments average at
+# least this many samples; denser masks use the per-sample lookup
+MIN_SEGMENT_SAMPLES = 64
+
+
+class LimitMask:
+    """Immutable piecewise-linear high and low limits over time
+
+    The points are validated and sorted by time once, on construction, and
+    the per-segment slopes and the bounds are precomputed, so evaluating the
+    limits never re-derives them. Limits are linearly interpolated between
+    points and held at the first and last point's values outside them. A
+    sample exactly on a point gets exactly that point's values.
+
+    Masks never change after construction; editing one means building a new
+    mask, so a mask can be shared between threads without copying. Masks
+    with the same points compare equal.
+    """
+
+    def __init__(self, time_points, high_limits, low_limits):
+        time_points = np.array(time_points, dtype=np.float64)
+        high_limits = np.array(high_limits, dtype=np.float64)
+        low_limits = np.array(low_limits, dtype=np.float64)
+
+        if time_points.ndim != 1 or not (len(time_points) == len(high_limits) == len(low_limits)):
+            raise ValueError("time_points, high_limits and low_limits must have the same length")
+        if len(time_points) == 0:
+            raise ValueError("A limit mask needs at least one point")
+        if not (np.isfinite(time_points).all() and np.isfinite(high_limits).all()
+                and np.isfinite(low_limits).all()):
+            raise ValueError("Limit points must be finite numbers")
+
+        if not is_sorted(time_points):
+            order = np.argsort(time_points, kind='stable')
+            time_points, high_limits, low_limits = time_points[order], high_limits[order], low_limits[order]
+
+        # Segment i runs from point i to point i + 1; within it a limit is
+        # value[i] + (t - time_points[i]) * slope[i]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            widths = np.diff(time_points)
+            high_slopes = np.diff(high_limits) / widths
+            low_slopes = np.diff(low_limits) / widths
+        # Zero-width segments (repeated times) are never selected; the later
+        # point of a repeated time wins. Keep their slopes finite anyway
+        high_slopes[widths == 0] = 0.0
+        low_slopes[widths == 0] = 0.0
+
+        self.time_points = time_points
+        self.high_limits = high_limits
+        self.low_limits = low_limits
+        self.high_slopes = high_slopes
+        self.low_slopes = low_slopes
+        for array in (time_points, high_limits, low_limits, high_slopes, low_slopes):
+            array.flags.writeable = False
+
+        self.time_min = float(time_points[0])
+        self.time_max = float(time_points[-1])
+        self.value_min = float(min(high_limits.min(), low_limits.min()))
+        self.value_max = float(max(high_limits.max(), low_limits.max()))
+
+        # Python copies for scalar lookups without NumPy call overhead
+        self._times = time_points.tolist()
+        self._high = high_limits.tolist()
+        self._low = low_limits.tolist()
+        self._high_slopes = high_slopes.tolist()
+        self._low_slopes = low_slopes.tolist()
+
+    @classmethod
+    def from_dict(cls, limit_arrays):
+        """Build a mask from a {'time_points', 'high_limits', 'low_limits'} dict"""
+        return cls(*(limit_arrays[key] for key in LIMIT_KEYS))
+
+    def to_dict(self):
+        """Return the points as a JSON-friendly dict of lists"""
+        return {
+            'time_points': self.time_points.tolist(),
+            'high_limits': self.high_limits.tolist(),
+            'low_limits': self.low_limits.tolist(),
+        }
+
+    def __len__(self):
+        return len(self.time_points)
+
+    def __repr__(self):
+        return f"LimitMask({len(self)} points, t={self.time_min:g}..{self.time_max:g})"
+
+    def __eq__(self, other):
+        if not isinstance(other, LimitMask):
+            return NotImplemented
+        return (np.array_equal(self.time_points, other.time_points)
+                and np.array_equal(self.high_limits, other.high_limits)
+                and np.array_equal(self.low_limits, other.low_limits))
+
+    def __hash__(self):
+        return hash((self.time_points.tobytes(), self.high_limits.tobytes(), self.low_limits.tobytes()))
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        self.__init__(*(state[key] for key in LIMIT_KEYS))
+
+    def shifted(self, offset):
+        """Return the mask moved later in time by offset"""
+        if offset == 0:
+            return self
+        return LimitMask(self.time_points + offset, self.high_limits, self.low_limits)
+
+    def bounds(self):
+        """Return (time_min, time_max, value_min, value_max)"""
+        return self.time_min, self.time_max, self.value_min, self.value_max
+
+    def limits_at(self, time_val):
+        """Return the (high, low) limits at one time, in O(log M)"""
+        times = self._times
+        if time_val <= times[0]:
+            return self._high[0], self._low[0]
+        if time_val >= times[-1]:
+            return self._high[-1], self._low[-1]
+
+        i = bisect.bisect_right(times, time_val) - 1
+        offset = time_val - times[i]
+        return (self._high[i] + offset * self._high_slopes[i],
+                self._low[i] + offset * self._low_slopes[i])
+
+    def segment_indices(self, sample_times, assume_sorted=None):
+        """Return the segment used for every sample time
+
+        Sorted sample times are merged against the points in
+        O(N + M log N); anything else costs a binary search per sample.
+        """
+        n_segments = len(self.time_points) - 1
+        if assume_sorted is None:
+            assume_sorted = is_sorted(sample_times)
+
+        if assume_sorted:
+            # Samples from bounds[k] on lie at or beyond point k
+            bounds = np.searchsorted(sample_times, self.time_points, side='left')
+            counts = np.diff(bounds, prepend=0, append=len(sample_times))
+            segments = np.repeat(np.arange(-1, n_segments + 1), counts)
+        else:
+            segments = np.searchsorted(self.time_points, sample_times, side='right') - 1
+        np.clip(segments, 0, n_segments - 1, out=segments)
+        return segments
+
+    def evaluate(self, sample_times, assume_sorted=None):
+        """Return the (high, low) limit arrays at every sample time"""
+        if len(self.time_points) == 1:
+            return (np.full(len(sample_times), self.high_limits[0]),
+                    np.full(len(sample_times), self.low_limits[0]))
+        if isinstance(sample_times, UniformTime):
+            limits = self._evaluate_uniform(sample_times)
+            if limits is not None:
+                return limits
+
+        segments = self.segment_indices(sample_times, assume_sorted)
+        sample_times = np.asarray(sample_times, dtype=np.float64)
+        offsets = sample_times - self.time_points[segments]
+        high = offsets * self.high_slopes[segments]
+        high += self.high_limits[segments]
+        low = offsets * self.low_slopes[segments]
+        low += self.low_limits[segments]
+
+        after = sample_times >= self.time_max
+        high[after] = self.high_limits[-1]
+        low[after] = self.low_limits[-1]
+        before = sample_times <= self.time_min
+        high[before] = self.high_limits[0]
+        low[before] = self.low_limits[0]
+        return high, low
+
+    def _evaluate_uniform(self, sample_times):
+        """evaluate() for a UniformTime axis, one slice per segment
+
+        The sample range of every segment comes from arithmetic on the axis,
+        so the limits are filled in with slices instead of looking up a
+        segment per sample. Returns None when the mask has too many points
+        in range for that to pay off.
+        """
+        bounds = sample_times.searchsorted(self.time_points, side='left')
+        segments = np.flatnonzero(bounds[1:] > bounds[:-1])
+        if len(segments) * MIN_SEGMENT_SAMPLES > len(sample_times):
+            return None
+
+        times = np.asarray(sample_times)
+        high = np.empty(len(times))
+        low = np.empty(len(times))
+        for k in segments.tolist():
+            a, b = bounds[k], bounds[k + 1]
+            offsets = times[a:b] - self.time_points[k]
+            np.multiply(offsets, self.high_slopes[k], out=high[a:b])
+            high[a:b] += self.high_limits[k]
+            np.multiply(offsets, self.low_slopes[k], out=low[a:b])
+            low[a:b] += self.low_limits[k]
+
+        # Held values outside the points, in the same order as evaluate()
+        after = sample_times.searchsorted(self.time_max, side='left')
+        high[after:] = self.high_limits[-1]
+        low[after:] = self.low_limits[-1]
+        before = sample_times.searchsorted(self.time_min, side='right')
+        high[:before] = self.high_limits[0]
+        low[:before] = self.low_limits[0]
+        return high, low
+
+
+def as_limit_mask(limits):
+    """Return limits as a LimitMask, converting a limit arrays dict"""
+    if limits is None or isinstance(limits, LimitMask):
+        return limits
+    return LimitMask.from_dict(limits)
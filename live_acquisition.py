@@ -0,0 +1,533 @@
+"""Live acquisition: pluggable sample sources, a ring buffer and a rolling limit test
+
+Example:
+    instrument_dump | python live_acquisition.py --limits mask.json stdin
+    python live_acquisition.py --limits mask.json tail capture.csv
+    python live_acquisition.py --limits mask.json --time-column none tcp 192.168.1.20:5025
+"""
+import argparse
+import codecs
+import json
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from limit_engine import LimitTestResult, StreamingLimitTest
+from mask_library import MaskLibrary
+from violation_events import ViolationEvents
+from waveform_io import combine_columns, load_limit_mask, parse_raw_columns
+
+
+# Samples kept for display; older ones have been tested and are dropped
+DEFAULT_CAPACITY = 1 << 20
+# Ring slots per min/max bucket of the display summary
+DEFAULT_BUCKET_SIZE = 256
+# Bytes taken from a source per poll, so a backlog drains over several polls
+DEFAULT_READ_SIZE = 1 << 20
+# Crossing points kept for display
+DEFAULT_MAX_CROSSINGS = 10000
+# Finished excursions kept for the final result; older ones are only counted
+DEFAULT_MAX_EVENTS = 10000
+# Longest the CLI keeps testing data already received once it stops
+DRAIN_TIMEOUT = 1.0
+SOURCE_KINDS = ('tail', 'tcp', 'udp', 'stdin')
+
+
+class LiveSource:
+    """Text stream of samples, one per line, read without blocking
+
+    Each line holds delimited fields; value_column and time_column are field
+    indices. Lines are converted with the CSV loader rules: a line whose
+    value is missing or not a number (such as a header) is skipped, a bad
+    time falls back to the line index, and without a time column the time
+    axis is the sample index.
+    """
+
+    def __init__(self, value_column=1, time_column=0, delimiter=',', read_size=DEFAULT_READ_SIZE):
+        self.value_column = value_column
+        self.time_column = time_column
+        self.delimiter = delimiter
+        self.read_size = read_size
+        self.closed = False
+        self.row_count = 0
+        self.sample_count = 0
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._partial = ''
+
+    def read_bytes(self):
+        """Return the bytes available now, at most read_size; b'' if none"""
+        raise NotImplementedError
+
+    def close(self):
+        self.closed = True
+
+    def read(self):
+        """Return (time_data, waveform_data) for the complete lines received since the last read"""
+        text = self._partial + self._decoder.decode(self.read_bytes(), final=self.closed)
+        lines = text.split('\n')
+        # The last piece is an unfinished line unless the stream has ended
+        self._partial = '' if self.closed else lines.pop()
+        rows = [line.rstrip('\r').split(self.delimiter) for line in lines if line.strip()]
+        if not rows:
+            return np.empty(0), np.empty(0)
+
+        indices = [self.value_column] if self.time_column is None else [self.value_column, self.time_column]
+        columns, row_count = parse_raw_columns(rows, indices)
+        time_columns = columns[self.time_column] if self.time_column is not None else (None, None)
+        time_data, waveform_data = combine_columns(*columns[self.value_column], *time_columns,
+                                                   row_offset=self.row_count, sample_offset=self.sample_count,
+                                                   uniform_tolerance=None)
+        self.row_count += row_count
+        self.sample_count += len(waveform_data)
+        return time_data, waveform_data
+
+
+class FileTailSource(LiveSource):
+    """File that another program is still writing, read as it grows
+
+    Starts at the beginning of the file, so samples already written are
+    tested too. A file that shrinks is taken to have been restarted.
+    """
+
+    def __init__(self, file_path, **options):
+        super().__init__(**options)
+        self.file_path = file_path
+        self.position = 0
+
+    def read_bytes(self):
+        try:
+            size = os.path.getsize(self.file_path)
+        except OSError:
+            return b''  # Not created yet
+        if size < self.position:
+            self.position = 0
+            self._partial = ''
+            self._decoder.reset()
+        if size == self.position:
+            return b''
+        with open(self.file_path, 'rb') as f:
+            f.seek(self.position)
+            data = f.read(min(size - self.position, self.read_size))
+        self.position += len(data)
+        return data
+
+
+class SocketSource(LiveSource):
+    """Samples received on a local network socket
+
+    With 'tcp' the source connects to a server streaming lines of samples
+    (an instrument or a stand-in); with 'udp' it binds to the address and
+    takes the lines in every datagram it receives.
+    """
+
+    def __init__(self, host, port, protocol='tcp', timeout=5.0, **options):
+        super().__init__(**options)
+        self.protocol = protocol
+        if protocol == 'tcp':
+            self.sock = socket.create_connection((host, port), timeout=timeout)
+        elif protocol == 'udp':
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            try:
+                self.sock.bind((host, port))
+            except OSError:
+                self.sock.close()
+                raise
+        else:
+            raise ValueError(f"Unknown protocol {protocol!r}")
+        self.sock.setblocking(False)
+
+    def read_bytes(self):
+        chunks = []
+        size = 0
+        while size < self.read_size and not self.closed:
+            try:
+                data = self.sock.recv(min(self.read_size - size, 65536))
+            except (BlockingIOError, InterruptedError):
+                break
+            if not data and self.protocol == 'tcp':
+                self.close()  # The server closed the connection
+                break
+            chunks.append(data)
+            size += len(data)
+        return b''.join(chunks)
+
+    def close(self):
+        super().close()
+        self.sock.close()
+
+
+class StreamSource(LiveSource):
+    """Samples piped into a binary stream, such as stdin
+
+    Blocking reads happen on a daemon thread, so polling never waits.
+    """
+
+    def __init__(self, stream=None, **options):
+        super().__init__(**options)
+        if stream is None:
+            stream = sys.stdin.buffer
+        self.stream = stream
+        self._chunks = queue.Queue()
+        self._ended = False
+        threading.Thread(target=self._read_stream, daemon=True).start()
+
+    def _read_stream(self):
+        read = getattr(self.stream, 'read1', self.stream.read)
+        while True:
+            try:
+                data = read(65536)
+            except (OSError, ValueError):
+                data = b''
+            self._chunks.put(data)
+            if not data:
+                return
+
+    def read_bytes(self):
+        chunks = []
+        size = 0
+        while size < self.read_size and not self._ended:
+            try:
+                data = self._chunks.get_nowait()
+            except queue.Empty:
+                break
+            if not data:
+                self._ended = True
+                break
+            chunks.append(data)
+            size += len(data)
+        if self._ended and self._chunks.empty():
+            self.close()
+        return b''.join(chunks)
+
+
+def parse_address(address):
+    """Split 'host:port' (or just 'port') into (host, port)"""
+    host, _, port = address.rpartition(':')
+    return host or 'localhost', int(port)
+
+
+def open_source(kind, target='', **options):
+    """Create a live source: 'tail' a file path, 'tcp'/'udp' a host:port, or 'stdin'"""
+    if kind == 'tail':
+        return FileTailSource(target, **options)
+    if kind in ('tcp', 'udp'):
+        host, port = parse_address(target)
+        return SocketSource(host, port, kind, **options)
+    if kind == 'stdin':
+        return StreamSource(**options)
+    raise ValueError(f"Unknown source {kind!r}, expected one of {', '.join(SOURCE_KINDS)}")
+
+
+class RingBuffer:
+    """The newest samples of a live capture, with a min/max summary for display
+
+    Holds the last capacity samples in fixed arrays. Alongside them it keeps
+    the slot of the min and max sample of every bucket of bucket_size slots,
+    recomputed only for the buckets new samples landed in. Appending costs
+    time proportional to the new samples, and a display envelope of the
+    whole buffer costs O(capacity / bucket_size) whatever the history.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, bucket_size=DEFAULT_BUCKET_SIZE):
+        n_buckets = max(-(-capacity // bucket_size), 2)
+        self.bucket_size = bucket_size
+        self.capacity = n_buckets * bucket_size  # Whole buckets, so none wraps around
+        self.time_data = np.zeros(self.capacity)
+        self.waveform_data = np.zeros(self.capacity)
+        self.bucket_min = np.zeros(n_buckets, dtype=np.intp)
+        self.bucket_max = np.zeros(n_buckets, dtype=np.intp)
+        self.total = 0  # Samples ever appended
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def append(self, time_data, waveform_data):
+        n = len(waveform_data)
+        if n == 0:
+            return
+        if n > self.capacity:
+            # Only the newest capacity samples would survive anyway
+            self.total += n - self.capacity
+            time_data = time_data[-self.capacity:]
+            waveform_data = waveform_data[-self.capacity:]
+            n = self.capacity
+
+        head = self.total % self.capacity
+        first = min(n, self.capacity - head)
+        self.time_data[head:head + first] = time_data[:first]
+        self.waveform_data[head:head + first] = waveform_data[:first]
+        self.time_data[:n - first] = time_data[first:]
+        self.waveform_data[:n - first] = waveform_data[first:]
+        self.total += n
+
+        self._summarise(head, head + first)
+        if n > first:
+            self._summarise(0, n - first)
+
+    def _summarise(self, start, stop):
+        """Recompute the bucket summaries covering the new slots [start, stop)
+
+        The slots before start in its bucket were written earlier in this
+        pass, so they are included. Past stop the bucket still holds the
+        oldest samples; those are left out, and dropped from the display.
+        """
+        size = self.bucket_size
+        start -= start % size
+        full_stop = stop - stop % size
+        if full_stop > start:
+            body = self.waveform_data[start:full_stop].reshape(-1, size)
+            offsets = np.arange(start, full_stop, size)
+            self.bucket_min[start // size:full_stop // size] = body.argmin(axis=1) + offsets
+            self.bucket_max[start // size:full_stop // size] = body.argmax(axis=1) + offsets
+        if stop > full_stop:
+            part = self.waveform_data[full_stop:stop]
+            self.bucket_min[full_stop // size] = full_stop + int(part.argmin())
+            self.bucket_max[full_stop // size] = full_stop + int(part.argmax())
+
+    def snapshot(self):
+        """Return copies of the buffered (time_data, waveform_data), oldest first"""
+        if self.total <= self.capacity:
+            return self.time_data[:self.total].copy(), self.waveform_data[:self.total].copy()
+        head = self.total % self.capacity
+        return (np.concatenate((self.time_data[head:], self.time_data[:head])),
+                np.concatenate((self.waveform_data[head:], self.waveform_data[:head])))
+
+    def envelope(self, n_columns):
+        """Return (times, values) of a min/max view of the buffer, oldest first
+
+        Like decimate_minmax, every kept point is a real sample and each of
+        about n_columns columns keeps its min and max.
+        """
+        if self.total == 0:
+            return np.empty(0), np.empty(0)
+        size = self.bucket_size
+        n_buckets = len(self.bucket_min)
+        head = self.total % self.capacity
+        head_bucket = head // size
+        if self.total < self.capacity:
+            order = np.arange(-(-self.total // size))
+            oldest = 0
+        else:
+            # Oldest first; the bucket being written comes last when part of
+            # it is new, and first when it is all old
+            first = head_bucket + 1 if head % size else head_bucket
+            order = (np.arange(n_buckets) + first) % n_buckets
+            oldest = head
+
+        i_min = self.bucket_min[order]
+        i_max = self.bucket_max[order]
+        group = -(-len(order) // max(int(n_columns), 1))
+        if group > 1:
+            # Merge runs of buckets down to about n_columns
+            pad = -len(order) % group
+            i_min = np.concatenate((i_min, np.repeat(i_min[-1:], pad))).reshape(-1, group)
+            i_max = np.concatenate((i_max, np.repeat(i_max[-1:], pad))).reshape(-1, group)
+            rows = np.arange(len(i_min))
+            i_min = i_min[rows, self.waveform_data[i_min].argmin(axis=1)]
+            i_max = i_max[rows, self.waveform_data[i_max].argmax(axis=1)]
+
+        # Put each column's two points in sample order
+        min_first = (i_min - oldest) % self.capacity <= (i_max - oldest) % self.capacity
+        slots = np.empty(2 * len(i_min), dtype=np.intp)
+        slots[0::2] = np.where(min_first, i_min, i_max)
+        slots[1::2] = np.where(min_first, i_max, i_min)
+        return self.time_data[slots], self.waveform_data[slots]
+
+
+class LiveMonitor:
+    """Live source feeding a ring buffer and a rolling limit test
+
+    Each poll reads what the source has, appends it to the buffer and tests
+    only those samples, carrying crossings and excursions across polls with
+    a StreamingLimitTest. The test is drained after every poll: crossings
+    and finished excursions go into running totals and only the most recent
+    ones are kept, so the cost and memory of a poll and of its summary
+    depend on the new samples, not on the length of the session.
+    """
+
+    def __init__(self, source, limit_mask=None, capacity=DEFAULT_CAPACITY, max_crossings=DEFAULT_MAX_CROSSINGS,
+                 max_events=DEFAULT_MAX_EVENTS):
+        self.source = source
+        self.buffer = RingBuffer(capacity)
+        self.recent_crossings = deque(maxlen=max_crossings)
+        self.max_events = max_events
+        self.started = time.perf_counter()
+        self.set_limit_mask(limit_mask)
+
+    def set_limit_mask(self, limit_mask):
+        """Test the samples from now on against limit_mask; None stops testing"""
+        self.limit_mask = limit_mask
+        self.test = StreamingLimitTest(limit_mask) if limit_mask is not None else None
+        self.tested_from = self.buffer.total  # Buffer index of the test's first sample
+        self.recent_crossings.clear()
+        self.recent_events = ViolationEvents.empty()
+        self._crossing_count = 0
+        self._closed_events = 0
+        self._closed_high = 0
+        self._closed_low = 0
+        self._closed_peak = 0.0
+
+    def poll(self):
+        """Read and test whatever the source has; return the number of new samples"""
+        time_data, waveform_data = self.source.read()
+        if len(waveform_data) == 0:
+            return 0
+        self.buffer.append(time_data, waveform_data)
+
+        if self.test is not None:
+            self.test.feed(time_data, waveform_data)
+            crossing_points, events = self.test.drain()
+            self._crossing_count += len(crossing_points)
+            self.recent_crossings.extend(crossing_points)
+            if len(events):
+                self._closed_events += len(events)
+                self._closed_high += events.sample_count('high')
+                self._closed_low += events.sample_count('low')
+                self._closed_peak = max(self._closed_peak, float(events.peak.max()))
+                events = ViolationEvents.concatenate([self.recent_events, events])
+                self.recent_events = events.take(np.arange(max(len(events) - self.max_events, 0), len(events)))
+        return len(waveform_data)
+
+    def window_crossings(self):
+        """Return the recent crossing points whose samples are still buffered"""
+        first = self.buffer.total - len(self.buffer) - self.tested_from
+        return [cp for cp in self.recent_crossings if cp['index'] >= first]
+
+    def summary(self):
+        """Return the running totals of the live test as a JSON-friendly dict"""
+        open_events = self.test.open_events if self.test is not None else None
+        total_points = self.test.total_points if self.test is not None else 0
+        high = self._closed_high + (open_events.sample_count('high') if open_events is not None else 0)
+        low = self._closed_low + (open_events.sample_count('low') if open_events is not None else 0)
+        peak = self._closed_peak
+        if open_events is not None and len(open_events):
+            peak = max(peak, float(open_events.peak.max()))
+        elapsed = time.perf_counter() - self.started
+        return {
+            'received': self.buffer.total,
+            'samples_per_second': self.buffer.total / elapsed if elapsed > 0 else 0.0,
+            'total_points': total_points,
+            'crossing_count': self._crossing_count,
+            'high_violations': high,
+            'low_violations': low,
+            'total_violations': high + low,
+            'violation_rate': (high + low) / total_points * 100 if total_points else 0.0,
+            'excursion_count': self._closed_events + (len(open_events) if open_events is not None else 0),
+            'max_overshoot': peak,
+            'passed': high + low == 0,
+        }
+
+    def result(self):
+        """Return the LimitTestResult of the live test so far, or None
+
+        The violation counts cover the whole test; the crossings and
+        excursions are the most recent ones kept, as summary() counts them
+        all.
+        """
+        if self.test is None:
+            return None
+        summary = self.summary()
+        events = ViolationEvents.concatenate([self.recent_events, self.test.open_events])
+        return LimitTestResult(list(self.recent_crossings), summary['total_points'], summary['high_violations'],
+                               summary['low_violations'], events=events)
+
+    def close(self):
+        self.source.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Limit test samples as they arrive from a live source")
+    parser.add_argument('source', choices=SOURCE_KINDS, help="Where samples come from")
+    parser.add_argument('target', nargs='?', default='',
+                        help="File to tail, or host:port to connect to (tcp) or listen on (udp)")
+    parser.add_argument('--limits', required=True, help="Limit mask file (JSON, .wfmask or CSV)")
+    parser.add_argument('--library', help="Look --limits up as PRODUCT/NAME in this mask library")
+    parser.add_argument('--value-column', type=int, default=1, help="Field index of the sample value (default 1)")
+    parser.add_argument('--time-column', default='0',
+                        help="Field index of the sample time, or 'none' to use the sample index (default 0)")
+    parser.add_argument('--delimiter', default=',', help="Field delimiter (default ',')")
+    parser.add_argument('--interval', type=float, default=1.0, help="Seconds between status lines")
+    parser.add_argument('--duration', type=float, help="Stop after this many seconds")
+    parser.add_argument('--output', help="Write the final result summary and excursions to this JSON file")
+    parser.add_argument('--quiet', action='store_true', help="Only print the final summary")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.source != 'stdin' and not args.target:
+        print(f"A {args.source} source needs a target", file=sys.stderr)
+        return 2
+
+    if args.library:
+        try:
+            limit_mask = MaskLibrary(args.library).find(args.limits)
+        except KeyError:
+            print(f"No single mask named {args.limits} in {args.library}", file=sys.stderr)
+            return 2
+    else:
+        try:
+            limit_mask = load_limit_mask(args.limits)
+        except (OSError, ValueError) as e:
+            print(e, file=sys.stderr)
+            return 2
+
+    time_column = None if args.time_column.lower() == 'none' else int(args.time_column)
+    try:
+        source = open_source(args.source, args.target, value_column=args.value_column,
+                             time_column=time_column, delimiter=args.delimiter)
+    except (OSError, ValueError) as e:
+        print(f"Cannot open {args.source} source: {e}", file=sys.stderr)
+        return 2
+
+    monitor = LiveMonitor(source, limit_mask)
+    started = time.perf_counter()
+    next_status = started + args.interval
+    error = None
+    try:
+        while not source.closed:
+            if not monitor.poll():
+                time.sleep(0.01)
+            now = time.perf_counter()
+            if args.duration is not None and now - started >= args.duration:
+                break
+            if now >= next_status and not args.quiet:
+                summary = monitor.summary()
+                print(f"{'PASS' if summary['passed'] else 'FAIL':<5} {summary['total_points']} samples "
+                      f"({summary['samples_per_second']:.3g}/s), {summary['crossing_count']} crossings, "
+                      f"{summary['violation_rate']:.2f}% violations", flush=True)
+                next_status = now + args.interval
+        # Whatever arrived before stopping, unless a source that never
+        # ends keeps delivering
+        deadline = time.perf_counter() + DRAIN_TIMEOUT
+        while monitor.poll() and time.perf_counter() < deadline:
+            pass
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        error = f"{args.source} source failed: {e}"
+    finally:
+        monitor.close()
+
+    result = monitor.result()
+    summary = dict(result.summary(), **monitor.summary())
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'summary': summary, 'excursions': result.events.to_records()}, f, indent=2)
+    print(f"{'PASS' if result.passed else 'FAIL'}: {result.total_points} samples, "
+          f"{summary['crossing_count']} crossings, {summary['excursion_count']} excursions, "
+          f"{result.violation_rate:.2f}% violations")
+    if error is not None:
+        print(error, file=sys.stderr)
+        return 2
+    return 0 if result.passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,369 @@
+"""Limit masks trained from golden captures (no Qt required)
+
+Example:
+    python mask_generation.py --time-column Time --amplitude-column Voltage \
+        --method sigma --points 40 --output mask.json "golden/*.csv"
+"""
+import argparse
+import heapq
+import os
+import sys
+import time
+
+import numpy as np
+
+from batch_limit_test import expand_patterns
+from limit_mask import LimitMask
+from mask_library import save_mask_file
+from waveform_io import DEFAULT_CHUNK_ROWS, CsvWaveformSource
+
+
+# Per-window statistics an envelope can follow
+ENVELOPE_METHODS = ('minmax', 'sigma', 'percentile')
+# Time windows the statistics are gathered in
+DEFAULT_WINDOWS = 1000
+# Amplitude bins per window behind the percentile envelope
+DEFAULT_HISTOGRAM_BINS = 512
+DEFAULT_SIGMA = 3.0
+DEFAULT_PERCENTILES = (0.5, 99.5)
+# Points of a generated mask
+DEFAULT_POINTS = 20
+
+
+class GoldenEnvelope:
+    """Per-window amplitude statistics of any number of golden captures
+
+    The time range is split into equal windows, and add() folds a chunk of
+    samples from any capture into every window's count, minimum, maximum,
+    mean and variance (merged with Chan's formulas). Given a value_range,
+    each window also keeps an amplitude histogram for percentiles; values
+    outside the range land in the outermost bins. Memory depends only on
+    the number of windows, so captures far larger than RAM can be fed
+    chunk by chunk. Samples outside the time range, or with a non-finite
+    time or value, are only counted in ignored.
+    """
+
+    def __init__(self, time_min, time_max, windows=DEFAULT_WINDOWS, value_range=None, bins=DEFAULT_HISTOGRAM_BINS):
+        if not time_max > time_min:
+            raise ValueError("time_max must be greater than time_min")
+        if windows < 1:
+            raise ValueError("windows must be at least 1")
+        self.time_min = float(time_min)
+        self.time_max = float(time_max)
+        self.windows = int(windows)
+        self.width = (self.time_max - self.time_min) / self.windows
+
+        self.count = np.zeros(self.windows, dtype=np.int64)
+        self.mean = np.zeros(self.windows)
+        # Sum of squared deviations from the mean
+        self.m2 = np.zeros(self.windows)
+        self.minimum = np.full(self.windows, np.inf)
+        self.maximum = np.full(self.windows, -np.inf)
+        self.ignored = 0
+
+        self.value_range = None
+        self.histogram = None
+        if value_range is not None:
+            low, high = float(value_range[0]), float(value_range[1])
+            if not high > low:
+                # Constant golden data; any bins around it do
+                low, high = low - 0.5, low + 0.5
+            self.value_range = (low, high)
+            self.bins = int(bins)
+            self.histogram = np.zeros((self.windows, self.bins), dtype=np.int64)
+
+    def __repr__(self):
+        return f"GoldenEnvelope({self.windows} windows, {self.samples} samples)"
+
+    @property
+    def samples(self):
+        return int(self.count.sum())
+
+    def add(self, time_data, waveform_data):
+        """Fold a chunk of (time, amplitude) samples into the statistics"""
+        time_data = np.asarray(time_data, dtype=np.float64)
+        values = np.asarray(waveform_data, dtype=np.float64)
+        window = np.floor((time_data - self.time_min) / self.width)
+        # NaN times compare False, so they are dropped here too
+        inside = (window >= 0) & (time_data <= self.time_max) & np.isfinite(values)
+        if not inside.all():
+            self.ignored += int(np.count_nonzero(~inside))
+            window, values = window[inside], values[inside]
+        if len(values) == 0:
+            return
+        # time_max itself belongs to the last window
+        window = np.minimum(window.astype(np.intp), self.windows - 1)
+        if np.any(window[1:] < window[:-1]):
+            order = np.argsort(window, kind='stable')
+            window, values = window[order], values[order]
+
+        # One run of samples per window present in the chunk
+        starts = np.flatnonzero(np.diff(window, prepend=-1))
+        ids = window[starts]
+        counts = np.diff(np.append(starts, len(values)))
+        means = np.add.reduceat(values, starts) / counts
+        m2 = np.add.reduceat((values - np.repeat(means, counts)) ** 2, starts)
+
+        previous = self.count[ids]
+        total = previous + counts
+        delta = means - self.mean[ids]
+        self.mean[ids] += delta * (counts / total)
+        self.m2[ids] += m2 + delta ** 2 * (previous * counts / total)
+        self.count[ids] = total
+        self.minimum[ids] = np.minimum(self.minimum[ids], np.minimum.reduceat(values, starts))
+        self.maximum[ids] = np.maximum(self.maximum[ids], np.maximum.reduceat(values, starts))
+
+        if self.histogram is not None:
+            low, high = self.value_range
+            position = np.clip((values - low) * (self.bins / (high - low)), 0, self.bins - 1)
+            cells = window * self.bins + position.astype(np.intp)
+            self.histogram += np.bincount(cells, minlength=self.histogram.size).reshape(self.histogram.shape)
+
+    def percentile(self, q):
+        """Return the q-th percentile of every window, estimated from the histogram
+
+        Accurate to about one bin width and clipped to the window's exact
+        minimum and maximum; empty windows give NaN.
+        """
+        if self.histogram is None:
+            raise ValueError("Percentiles need a GoldenEnvelope created with a value_range")
+        cumulative = np.cumsum(self.histogram, axis=1)
+        target = q / 100.0 * self.count
+        rows = np.arange(self.windows)
+        # First bin whose cumulative count reaches the target
+        bins = np.minimum((cumulative < target[:, None]).sum(axis=1), self.bins - 1)
+        before = np.where(bins > 0, cumulative[rows, bins - 1], 0)
+        in_bin = self.histogram[rows, bins]
+        fraction = np.where(in_bin > 0, (target - before) / np.maximum(in_bin, 1), 0.0)
+
+        low, high = self.value_range
+        values = low + (bins + fraction) * ((high - low) / self.bins)
+        with np.errstate(invalid='ignore'):
+            values = np.minimum(np.maximum(values, self.minimum), self.maximum)
+        values[self.count == 0] = np.nan
+        return values
+
+    def envelope(self, method='minmax', sigma=DEFAULT_SIGMA, percentiles=DEFAULT_PERCENTILES):
+        """Return (time_points, high_limits, low_limits) with a point at every window edge
+
+        Per window the limits are the minimum and maximum, the mean +/-
+        sigma standard deviations or the two percentiles. Each edge takes
+        the outer value of the two windows it joins, so the lines between
+        edges never cut into a window's band. Empty windows are
+        interpolated from their neighbours.
+        """
+        if method not in ENVELOPE_METHODS:
+            raise ValueError(f"method must be one of {', '.join(ENVELOPE_METHODS)}")
+        filled = self.count > 0
+        if not filled.any():
+            raise ValueError("No golden samples were added")
+
+        if method == 'minmax':
+            high, low = self.maximum.copy(), self.minimum.copy()
+        elif method == 'sigma':
+            spread = sigma * np.sqrt(self.m2 / np.maximum(self.count, 1))
+            high, low = self.mean + spread, self.mean - spread
+        else:
+            low, high = self.percentile(percentiles[0]), self.percentile(percentiles[1])
+
+        if not filled.all():
+            centers = self.time_min + (np.arange(self.windows) + 0.5) * self.width
+            high = np.interp(centers, centers[filled], high[filled])
+            low = np.interp(centers, centers[filled], low[filled])
+
+        time_points = self.time_min + np.arange(self.windows + 1) * self.width
+        time_points[-1] = self.time_max
+        high = np.maximum(np.append(high[:1], high), np.append(high, high[-1:]))
+        low = np.minimum(np.append(low[:1], low), np.append(low, low[-1:]))
+        return time_points, high, low
+
+    def to_limit_mask(self, points=DEFAULT_POINTS, method='minmax', sigma=DEFAULT_SIGMA,
+                      percentiles=DEFAULT_PERCENTILES, margin=0.0):
+        """Return a LimitMask of the envelope simplified to at most points points
+
+        margin is added above the high limits and below the low ones.
+        """
+        time_points, high, low = simplify_limits(*self.envelope(method, sigma, percentiles), points)
+        return LimitMask(time_points, high + margin, low - margin)
+
+
+def simplify_limits(time_points, high_limits, low_limits, points):
+    """Reduce piecewise-linear high/low limits to at most points shared points
+
+    Douglas-Peucker style, but to a point budget: starting from the two end
+    points, the point furthest (vertically, in either line) from the
+    current simplification is kept next, until points are kept or the rest
+    lie on it. Kept high points are then raised, and low ones lowered, by
+    the most the simplification cut off next to them, so the result never
+    lies inside the original limits. time_points must be increasing.
+    """
+    if points < 2:
+        raise ValueError("points must be at least 2")
+    t = np.asarray(time_points, dtype=np.float64)
+    high = np.asarray(high_limits, dtype=np.float64)
+    low = np.asarray(low_limits, dtype=np.float64)
+    n = len(t)
+    if n <= points:
+        return t.copy(), high.copy(), low.copy()
+
+    def chord(line, a, b):
+        """line between points a and b, evaluated at the points from a to b"""
+        fraction = (t[a:b + 1] - t[a]) / (t[b] - t[a])
+        return line[a] + fraction * (line[b] - line[a])
+
+    def split(a, b):
+        if b - a < 2:
+            return
+        error = np.maximum(np.abs(high[a:b + 1] - chord(high, a, b)), np.abs(low[a:b + 1] - chord(low, a, b)))
+        j = int(np.argmax(error))
+        if error[j] > 0:
+            heapq.heappush(heap, (-error[j], a, b, a + j))
+
+    kept = [0, n - 1]
+    heap = []
+    split(0, n - 1)
+    while heap and len(kept) < points:
+        _, a, b, j = heapq.heappop(heap)
+        kept.append(j)
+        split(a, j)
+        split(j, b)
+    kept.sort()
+
+    raise_high = np.zeros(len(kept))
+    lower_low = np.zeros(len(kept))
+    for k in range(len(kept) - 1):
+        a, b = kept[k], kept[k + 1]
+        if b - a < 2:
+            continue
+        cut_high = max(float(np.max(high[a:b + 1] - chord(high, a, b))), 0.0)
+        cut_low = max(float(np.max(chord(low, a, b) - low[a:b + 1])), 0.0)
+        raise_high[k:k + 2] = np.maximum(raise_high[k:k + 2], cut_high)
+        lower_low[k:k + 2] = np.maximum(lower_low[k:k + 2], cut_low)
+    return t[kept], high[kept] + raise_high, low[kept] - lower_low
+
+
+def capture_bounds(chunks):
+    """Return (time_min, time_max, amp_min, amp_max) over (time, amplitude) chunks
+
+    Non-finite values are skipped; None without any finite sample.
+    """
+    bounds = None
+    for time_data, waveform_data in chunks:
+        time_data = np.asarray(time_data, dtype=np.float64)
+        values = np.asarray(waveform_data, dtype=np.float64)
+        finite = np.isfinite(time_data) & np.isfinite(values)
+        if not finite.all():
+            time_data, values = time_data[finite], values[finite]
+        if len(values) == 0:
+            continue
+        chunk = (time_data.min(), time_data.max(), values.min(), values.max())
+        if bounds is None:
+            bounds = chunk
+        else:
+            bounds = (min(bounds[0], chunk[0]), max(bounds[1], chunk[1]),
+                      min(bounds[2], chunk[2]), max(bounds[3], chunk[3]))
+    return None if bounds is None else tuple(float(value) for value in bounds)
+
+
+def train_from_files(file_paths, amp_column, time_column=None, windows=DEFAULT_WINDOWS, use_cache=True,
+                     chunk_rows=DEFAULT_CHUNK_ROWS, progress=None):
+    """Return a GoldenEnvelope of the named columns of several CSV captures
+
+    Every file is streamed twice, chunk by chunk: once for the common time
+    and amplitude range, then into the envelope, so memory is bounded by
+    the chunk size and the windows. Files with a .wfcache are read from
+    it. progress, if given, is called with the fraction of the passes
+    done; an exception raised from it aborts the training.
+    """
+    sources = [CsvWaveformSource(path, use_cache) for path in file_paths]
+    if not sources:
+        raise ValueError("No golden captures given")
+    for source in sources:
+        for column in (amp_column, time_column):
+            if column is not None and column not in source.headers:
+                raise ValueError(f"{source.file_path} has no column {column}")
+    steps = 2 * len(sources)
+
+    bounds = []
+    for k, source in enumerate(sources):
+        file_bounds = capture_bounds(source.iter_column_chunks(amp_column, time_column, chunk_rows))
+        if file_bounds is None:
+            raise ValueError(f"{source.file_path} has no samples in column {amp_column}")
+        bounds.append(file_bounds)
+        if progress is not None:
+            progress((k + 1) / steps)
+
+    time_min = min(b[0] for b in bounds)
+    time_max = max(b[1] for b in bounds)
+    if not time_max > time_min:
+        raise ValueError("The golden captures cover no time span")
+    envelope = GoldenEnvelope(time_min, time_max, windows,
+                              (min(b[2] for b in bounds), max(b[3] for b in bounds)))
+    for k, source in enumerate(sources):
+        for time_data, waveform_data in source.iter_column_chunks(amp_column, time_column, chunk_rows):
+            envelope.add(time_data, waveform_data)
+        if progress is not None:
+            progress((len(sources) + k + 1) / steps)
+    return envelope
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build a limit mask from golden CSV captures")
+    parser.add_argument('patterns', nargs='+', help="Golden CSV captures or glob patterns (quote them; ** is recursive)")
+    parser.add_argument('--amplitude-column', required=True, help="Name of the amplitude column")
+    time_group = parser.add_mutually_exclusive_group(required=True)
+    time_group.add_argument('--time-column', help="Name of the time column")
+    time_group.add_argument('--auto-time', action='store_true', help="Use the sample index as time")
+    parser.add_argument('--output', required=True, help="Mask file to write (.json or .wfmask)")
+    parser.add_argument('--method', choices=ENVELOPE_METHODS, default='minmax',
+                        help="Envelope statistic per window (default minmax)")
+    parser.add_argument('--sigma', type=float, default=DEFAULT_SIGMA,
+                        help=f"Standard deviations for --method sigma (default {DEFAULT_SIGMA:g})")
+    parser.add_argument('--percentiles', default=','.join(f"{q:g}" for q in DEFAULT_PERCENTILES),
+                        help="Low,high percentiles for --method percentile (default %(default)s)")
+    parser.add_argument('--margin', type=float, default=0.0, help="Extra distance outside the envelope")
+    parser.add_argument('--points', type=int, default=DEFAULT_POINTS,
+                        help=f"Points of the simplified mask (default {DEFAULT_POINTS})")
+    parser.add_argument('--windows', type=int, default=DEFAULT_WINDOWS,
+                        help=f"Time windows the statistics are gathered in (default {DEFAULT_WINDOWS})")
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS,
+                        help=f"Rows read at a time (default {DEFAULT_CHUNK_ROWS})")
+    parser.add_argument('--cache', action='store_true', help="Read the captures' .wfcache sidecars where they exist")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        percentiles = tuple(float(q) for q in args.percentiles.split(','))
+        if len(percentiles) != 2 or not 0 <= percentiles[0] < percentiles[1] <= 100:
+            raise ValueError
+    except ValueError:
+        print("--percentiles must be two increasing numbers between 0 and 100, e.g. 0.5,99.5", file=sys.stderr)
+        return 2
+
+    files = expand_patterns(args.patterns)
+    if not files:
+        print("No files match the given patterns", file=sys.stderr)
+        return 2
+
+    start = time.perf_counter()
+    try:
+        envelope = train_from_files(files, args.amplitude_column, None if args.auto_time else args.time_column,
+                                    args.windows, args.cache, args.chunk_rows)
+        limit_mask = envelope.to_limit_mask(args.points, args.method, args.sigma, percentiles, args.margin)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 2
+    name = os.path.splitext(os.path.basename(args.output))[0]
+    save_mask_file(args.output, limit_mask, name,
+                   description=f"{args.method} envelope of {len(files)} golden captures")
+
+    print(f"{envelope.samples} golden samples from {len(files)} files in {time.perf_counter() - start:.2f} s"
+          + (f" ({envelope.ignored} ignored)" if envelope.ignored else ""))
+    print(f"Wrote {args.output}: {len(limit_mask)} points, t={limit_mask.time_min:g}..{limit_mask.time_max:g}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
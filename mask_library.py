@@ -0,0 +1,311 @@
+"""Versioned limit mask files and an indexed on-disk mask library"""
+import json
+import os
+import re
+import struct
+from collections import OrderedDict
+
+import numpy as np
+
+from limit_mask import LIMIT_KEYS, LimitMask
+
+
+# Version written into every mask file; older versions stay readable
+FORMAT_VERSION = 1
+JSON_FORMAT = 'waveform-limit-mask'
+JSON_SUFFIX = '.json'
+BINARY_SUFFIX = '.wfmask'
+BINARY_MAGIC = b'WFMASK\x00\x00'
+# Magic, version, flags, point count, metadata length
+BINARY_HEADER = struct.Struct('<8sHHII')
+METADATA_KEYS = ('name', 'product', 'description')
+DEFAULT_LIBRARY_DIR = os.path.join(os.path.expanduser('~'), '.waveform_limit_tool', 'masks')
+
+
+def _metadata(file_path, metadata):
+    """Fill in missing metadata, naming the mask after its file"""
+    info = {key: str(metadata.get(key) or '') for key in METADATA_KEYS}
+    if not info['name']:
+        info['name'] = os.path.splitext(os.path.basename(file_path))[0]
+    return info
+
+
+def _write_atomic(path, data):
+    # Write then rename so a reader never sees a half-written file
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def mask_to_json(limit_mask, name='', product='', description=''):
+    """Return the versioned JSON document for a mask"""
+    document = {
+        'format': JSON_FORMAT,
+        'version': FORMAT_VERSION,
+        'name': name,
+        'product': product,
+        'description': description,
+    }
+    document.update(limit_mask.to_dict())
+    return json.dumps(document, indent=2)
+
+
+def mask_to_bytes(limit_mask, name='', product='', description=''):
+    """Return the compact binary form of a mask
+
+    A fixed header and a small JSON metadata block are followed by the
+    time, high and low points as little-endian float64, 8-byte aligned.
+    """
+    metadata = json.dumps({'name': name, 'product': product, 'description': description}).encode('utf-8')
+    metadata += b' ' * (-(BINARY_HEADER.size + len(metadata)) % 8)
+    header = BINARY_HEADER.pack(BINARY_MAGIC, FORMAT_VERSION, 0, len(limit_mask), len(metadata))
+    points = np.concatenate((limit_mask.time_points, limit_mask.high_limits, limit_mask.low_limits))
+    return header + metadata + points.astype('<f8').tobytes()
+
+
+def mask_from_json(data, file_path=''):
+    """Return (mask, metadata) from a parsed JSON document
+
+    Plain {'time_points', 'high_limits', 'low_limits'} dicts written before
+    the format was versioned are accepted too.
+    """
+    if not isinstance(data, dict) or not all(key in data for key in LIMIT_KEYS):
+        raise ValueError(f"{file_path} does not contain {', '.join(LIMIT_KEYS)}")
+    version = data.get('version', 0)
+    if not isinstance(version, int) or version > FORMAT_VERSION:
+        raise ValueError(f"{file_path} uses unsupported mask format version {version}")
+    return LimitMask.from_dict(data), _metadata(file_path, data)
+
+
+def mask_from_bytes(data, file_path=''):
+    """Return (mask, metadata) from the binary form"""
+    if len(data) < BINARY_HEADER.size:
+        raise ValueError(f"{file_path} is not a limit mask file")
+    magic, version, _, count, metadata_size = BINARY_HEADER.unpack_from(data)
+    if magic != BINARY_MAGIC:
+        raise ValueError(f"{file_path} is not a limit mask file")
+    if version > FORMAT_VERSION:
+        raise ValueError(f"{file_path} uses unsupported mask format version {version}")
+
+    offset = BINARY_HEADER.size + metadata_size
+    if len(data) != offset + 3 * 8 * count:
+        raise ValueError(f"{file_path} is truncated")
+    metadata = json.loads(data[BINARY_HEADER.size:offset].decode('utf-8'))
+    points = np.frombuffer(data, dtype='<f8', count=3 * count, offset=offset).reshape(3, count)
+    return LimitMask(*points), _metadata(file_path, metadata)
+
+
+def load_mask_file(file_path):
+    """Load a .json or .wfmask mask file, returning (mask, metadata)"""
+    if file_path.lower().endswith(BINARY_SUFFIX):
+        with open(file_path, 'rb') as f:
+            return mask_from_bytes(f.read(), file_path)
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return mask_from_json(json.load(f), file_path)
+
+
+def save_mask_file(file_path, limit_mask, name='', product='', description=''):
+    """Save a mask as versioned JSON, or in binary form for .wfmask paths"""
+    if file_path.lower().endswith(BINARY_SUFFIX):
+        data = mask_to_bytes(limit_mask, name, product, description)
+    else:
+        data = mask_to_json(limit_mask, name, product, description).encode('utf-8')
+    _write_atomic(file_path, data)
+
+
+def _safe_file_name(text):
+    """Turn a mask or product name into a portable file name"""
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', text).strip('._') or 'mask'
+
+
+class MaskLibrary:
+    """Directory of named masks with an index for lookup by name and product
+
+    The index (index.json) records every mask's name, product, file and
+    point count, so listing and finding masks never opens the mask files,
+    and loading one reads just that file. Recently loaded masks are kept in
+    an LRU cache; a cached mask is reused while its file is unchanged.
+    """
+
+    INDEX_NAME = 'index.json'
+    # Version 2 keys masks by a JSON [product, name] pair; older indexes
+    # are rebuilt from the mask files
+    INDEX_VERSION = 2
+
+    def __init__(self, directory=DEFAULT_LIBRARY_DIR, cache_size=32):
+        self.directory = directory
+        self.index_path = os.path.join(directory, self.INDEX_NAME)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self.index = self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            # Missing or damaged index; recover it from the mask files
+            return self.rebuild_index()
+
+        if index.get('version') != self.INDEX_VERSION:
+            return self.rebuild_index()
+        return index
+
+    def _write_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        _write_atomic(self.index_path, json.dumps(self.index, indent=1).encode('utf-8'))
+
+    @staticmethod
+    def key(name, product=''):
+        """Index key of a mask; names are unique within a product
+
+        The pair is JSON-encoded, so names and products containing '/'
+        never share a key.
+        """
+        return json.dumps([product, name])
+
+    def _entry(self, file_name, limit_mask, metadata):
+        stat = os.stat(os.path.join(self.directory, file_name))
+        entry = dict(metadata)
+        entry.update({
+            'file': file_name,
+            'points': len(limit_mask),
+            'time_min': limit_mask.time_min,
+            'time_max': limit_mask.time_max,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+        })
+        return entry
+
+    def rebuild_index(self):
+        """Re-scan every mask file in the directory and rewrite the index"""
+        self.index = {'version': self.INDEX_VERSION, 'masks': {}}
+        self._cache.clear()
+        if not os.path.isdir(self.directory):
+            return self.index
+
+        for root, _, files in os.walk(self.directory):
+            for file_name in sorted(files):
+                path = os.path.join(root, file_name)
+                if path == self.index_path or not file_name.lower().endswith((JSON_SUFFIX, BINARY_SUFFIX)):
+                    continue
+                try:
+                    limit_mask, metadata = load_mask_file(path)
+                except (OSError, ValueError):
+                    continue
+                relative = os.path.relpath(path, self.directory)
+                self.index['masks'][self.key(metadata['name'], metadata['product'])] = \
+                    self._entry(relative, limit_mask, metadata)
+        try:
+            self._write_index()
+        except OSError:
+            pass
+        return self.index
+
+    def __len__(self):
+        return len(self.index['masks'])
+
+    def entries(self, product=None, name=None):
+        """Return the index entries, optionally filtered by product and name substring"""
+        entries = self.index['masks'].values()
+        if product is not None:
+            entries = [entry for entry in entries if entry['product'] == product]
+        if name:
+            text = name.lower()
+            entries = [entry for entry in entries if text in entry['name'].lower()]
+        return sorted(entries, key=lambda entry: (entry['product'], entry['name']))
+
+    def products(self):
+        """Return the sorted product names in the library"""
+        return sorted({entry['product'] for entry in self.index['masks'].values()})
+
+    def save(self, limit_mask, name, product='', description='', binary=True):
+        """Store a mask under name and product, replacing any previous version"""
+        if not name:
+            raise ValueError("A library mask needs a name")
+        key = self.key(name, product)
+        old_entry = self.index['masks'].get(key)
+
+        file_name = _safe_file_name(name) + (BINARY_SUFFIX if binary else JSON_SUFFIX)
+        if product:
+            file_name = os.path.join(_safe_file_name(product), file_name)
+        taken = {entry['file'] for k, entry in self.index['masks'].items() if k != key}
+        stem, suffix = os.path.splitext(file_name)
+        count = 1
+        while file_name in taken:
+            count += 1
+            file_name = f"{stem}_{count}{suffix}"
+
+        path = os.path.join(self.directory, file_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        save_mask_file(path, limit_mask, name, product, description)
+        if old_entry is not None and old_entry['file'] != file_name:
+            self._remove_file(old_entry['file'])
+
+        metadata = {'name': name, 'product': product, 'description': description}
+        self.index['masks'][key] = self._entry(file_name, limit_mask, metadata)
+        self._write_index()
+        self._remember(key, limit_mask, self.index['masks'][key])
+        return self.index['masks'][key]
+
+    def load(self, name, product=''):
+        """Return the named mask, reading only its own file
+
+        Raises KeyError for masks not in the index.
+        """
+        key = self.key(name, product)
+        entry = self.index['masks'][key]
+        path = os.path.join(self.directory, entry['file'])
+        stat = os.stat(path)
+
+        cached = self._cache.get(key)
+        if cached is not None and cached[1] == (stat.st_size, stat.st_mtime_ns):
+            self._cache.move_to_end(key)
+            return cached[0]
+
+        limit_mask, _ = load_mask_file(path)
+        if (entry['size'], entry['mtime_ns']) != (stat.st_size, stat.st_mtime_ns):
+            # Edited outside the library; refresh its entry
+            entry.update(self._entry(entry['file'], limit_mask, entry))
+            try:
+                self._write_index()
+            except OSError:
+                pass
+        self._remember(key, limit_mask, entry)
+        return limit_mask
+
+    def find(self, reference):
+        """Return the mask named by a "PRODUCT/NAME" (or "NAME") reference
+
+        Products and names may contain '/' themselves, so every split is
+        tried. Raises KeyError when no mask or more than one matches.
+        """
+        parts = reference.split('/')
+        keys = [('/'.join(parts[:i]), '/'.join(parts[i:])) for i in range(len(parts))]
+        matches = [(product, name) for product, name in keys
+                   if self.key(name, product) in self.index['masks']]
+        if len(matches) != 1:
+            raise KeyError(reference)
+        product, name = matches[0]
+        return self.load(name, product)
+
+    def delete(self, name, product=''):
+        """Remove a mask and its file from the library"""
+        key = self.key(name, product)
+        entry = self.index['masks'].pop(key)
+        self._cache.pop(key, None)
+        self._remove_file(entry['file'])
+        self._write_index()
+
+    def _remove_file(self, file_name):
+        try:
+            os.remove(os.path.join(self.directory, file_name))
+        except OSError:
+            pass
+
+    def _remember(self, key, limit_mask, entry):
+        self._cache[key] = (limit_mask, (entry['size'], entry['mtime_ns']))
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
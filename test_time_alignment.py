@@ -0,0 +1,42 @@
+"""Regression tests for TimeAligner offsets on step-shaped captures"""
+import numpy as np
+import pytest
+
+from limit_engine import run_limit_test
+from limit_mask import LimitMask
+from time_alignment import ALIGN_METHODS, TimeAligner
+from time_axis import UniformTime
+
+
+# A step from -1 to 1 between t=3 and t=3.2; the capture below sits in the
+# middle of it
+STEP_MASK = LimitMask([0, 3, 3.2, 10], [-0.8, -0.8, 1.2, 1.2], [-1.2, -1.2, 0.8, 0.8])
+TIME = UniformTime(0.0, 1e-3, 10001)
+
+
+def step_capture(shift):
+    return np.clip((np.asarray(TIME) - 3.1 - shift) / 0.1, -1, 1)
+
+
+@pytest.mark.parametrize('method', ALIGN_METHODS)
+def test_aligned_step_needs_no_shift(method):
+    aligner = TimeAligner.from_mask(STEP_MASK, method)
+    assert abs(aligner.estimate(TIME, step_capture(0.0))) < TIME.interval / 10
+
+    result = run_limit_test(TIME, step_capture(0.0), STEP_MASK, aligner=aligner)
+    assert result.total_violations == 0
+
+
+@pytest.mark.parametrize('method', ALIGN_METHODS)
+@pytest.mark.parametrize('shift', [-0.1, 0.1])
+def test_known_step_shift_is_recovered(method, shift):
+    aligner = TimeAligner.from_mask(STEP_MASK, method)
+    assert abs(aligner.estimate(TIME, step_capture(shift)) - shift) < TIME.interval
+
+
+@pytest.mark.parametrize('shift', [-0.3, 0.0, 0.1, 1.0])
+def test_tanh_reference_correlation(shift):
+    reference_time = np.linspace(0, 10, 5001)
+    aligner = TimeAligner(reference_time, np.tanh((reference_time - 5) / 0.2), 'correlation')
+    capture = np.tanh((np.asarray(TIME) - 5 - shift) / 0.2)
+    assert abs(aligner.estimate(TIME, capture) - shift) < TIME.interval
@@ -0,0 +1,292 @@
+"""Trigger-jitter alignment of captures against a reference (no Qt required)
+
+A capture triggered a little early or late fails a mask at every edge even
+though its shape is good. TimeAligner estimates how much later than the
+reference a capture runs; testing against the mask shifted by that much
+compares the shapes instead of the trigger times. Shifting the mask moves
+a few points instead of every sample, so uniformly sampled time stays
+implicit and reported times stay those of the capture.
+"""
+import numpy as np
+
+from time_axis import UniformTime, as_time_array, uniform_time
+from waveform_decimation import is_sorted
+
+
+# Ways of estimating the offset: the first edge through a level, or the
+# peak of the cross-correlation with the reference
+ALIGN_METHODS = ('edge', 'correlation')
+# Most grid points the reference is resampled to for correlation
+MAX_REFERENCE_SAMPLES = 1 << 16
+# Smallest spread a correlation window is normalised by, as a fraction of
+# the largest spread over all lags searched
+MIN_SPREAD_FRACTION = 0.5
+# Samples scanned at a time while looking for an edge; the scan stops at
+# the first one, so large captures are rarely read to the end
+EDGE_SCAN_BLOCK = 1 << 16
+
+
+def _first_crossing(blocks, level, rising):
+    """Return the interpolated time of the first crossing of level, or None
+
+    blocks yields consecutive (time, values) pieces in time order. A
+    crossing is a sample before the level followed by one at or past it;
+    NaN is on neither side, so it never produces one.
+    """
+    previous = None
+    for time_data, waveform_data in blocks:
+        values = np.asarray(waveform_data, dtype=np.float64)
+        if len(values) == 0:
+            continue
+        before = values < level if rising else values > level
+        past = ~before & ~np.isnan(values)
+        hits = np.flatnonzero(before[:-1] & past[1:]) + 1
+        if previous is not None and previous[1] and past[0]:
+            i = 0
+        elif len(hits):
+            i = int(hits[0])
+        else:
+            previous = (time_data[-1], bool(before[-1]), values[-1])
+            continue
+
+        if i == 0:
+            t0, v0 = previous[0], previous[2]
+        else:
+            t0, v0 = time_data[i - 1], values[i - 1]
+        t1, v1 = time_data[i], values[i]
+        return float(t0 + (level - v0) * (t1 - t0) / (v1 - v0))
+    return None
+
+
+def _window(time_data, time_min, time_max, margin=0):
+    """Return (a, b) so time_data[a:b] holds the times from time_min to time_max
+
+    margin samples either side are added, so interpolation at the ends of
+    the window has the neighbours it needs.
+    """
+    a = max(int(np.searchsorted(time_data, time_min, side='left')) - margin, 0)
+    b = min(int(np.searchsorted(time_data, time_max, side='right')) + margin, len(time_data))
+    return a, b
+
+
+def _sorted(time_data, waveform_data):
+    """Return time and values with time sorted, UniformTime kept as it is"""
+    time_data = as_time_array(time_data)
+    waveform_data = np.asarray(waveform_data)
+    if not is_sorted(time_data):
+        order = np.argsort(time_data, kind='stable')
+        time_data, waveform_data = time_data[order], waveform_data[order]
+    return time_data, waveform_data
+
+
+class TimeAligner:
+    """Estimates the time offset of captures against one reference
+
+    'edge' finds the first crossing of level in the reference's direction,
+    interpolated between samples, and returns its distance from the
+    reference's crossing. The scan stops at that crossing and only the
+    values are read, so it costs little more than reading up to the edge.
+    level defaults to halfway between the reference's extremes.
+
+    'correlation' resamples the reference onto a uniform grid of at most
+    MAX_REFERENCE_SAMPLES points once; each capture is interpolated onto
+    the same grid, widened by max_shift on both sides, and the offset is
+    the FFT cross-correlation peak refined by a parabola through its
+    neighbours. Each lag is normalised by the spread of the capture under
+    the reference, so the peak is the best shape match even for steps and
+    other signals whose mean depends on the window. It uses the whole
+    shape, so it suits captures without one clean edge.
+
+    max_shift limits the offsets searched, in time units; by default an
+    edge is searched in the whole capture and a correlation over the
+    reference's span. Aligners hold no per-capture state and pickle, so
+    one can be shared by threads and worker processes.
+    """
+
+    def __init__(self, reference_time, reference_data, method='edge', max_shift=None, level=None):
+        if method not in ALIGN_METHODS:
+            raise ValueError(f"method must be one of {', '.join(ALIGN_METHODS)}")
+        if max_shift is not None and not max_shift > 0:
+            raise ValueError("max_shift must be positive")
+        reference_time, reference_data = _sorted(reference_time, reference_data)
+        reference_data = np.asarray(reference_data, dtype=np.float64)
+        finite = np.isfinite(reference_data)
+        if finite.sum() < 2:
+            raise ValueError("The alignment reference needs at least two valid samples")
+        if not finite.all():
+            reference_time, reference_data = np.asarray(reference_time)[finite], reference_data[finite]
+
+        self.method = method
+        self.max_shift = max_shift
+        if method == 'edge':
+            self._init_edge(reference_time, reference_data, level)
+        else:
+            self._init_correlation(reference_time, reference_data)
+
+    @classmethod
+    def from_mask(cls, limit_mask, method='edge', max_shift=None, level=None):
+        """Aligner whose reference is the centre line between the limits"""
+        time_points = limit_mask.time_points
+        centre = (limit_mask.high_limits + limit_mask.low_limits) / 2
+        if method == 'correlation' and limit_mask.time_max > limit_mask.time_min:
+            # The line between the points is the reference, not just the points
+            time_points = np.linspace(limit_mask.time_min, limit_mask.time_max, MAX_REFERENCE_SAMPLES)
+            centre = np.interp(time_points, limit_mask.time_points, centre)
+        return cls(time_points, centre, method, max_shift, level)
+
+    def _init_edge(self, reference_time, reference_data, level):
+        if level is None:
+            level = (reference_data.min() + reference_data.max()) / 2
+        self.level = float(level)
+        blocks = [(reference_time, reference_data)]
+        # The reference's first crossing in either direction sets the edge
+        crossings = [(_first_crossing(blocks, self.level, rising), rising) for rising in (True, False)]
+        crossings = [crossing for crossing in crossings if crossing[0] is not None]
+        if not crossings:
+            raise ValueError(f"The alignment reference has no edge through {self.level:g}")
+        self.edge_time, self.rising = min(crossings)
+
+    def _init_correlation(self, reference_time, reference_data):
+        count = min(len(reference_data), MAX_REFERENCE_SAMPLES)
+        start, stop = float(reference_time[0]), float(reference_time[-1])
+        if not stop > start:
+            raise ValueError("The alignment reference must span some time")
+        grid = UniformTime(start, (stop - start) / (count - 1), count)
+        if uniform_time(reference_time) is None or count < len(reference_data):
+            reference_data = np.interp(np.asarray(grid), np.asarray(reference_time), reference_data)
+        reference_data = reference_data - reference_data.mean()
+        if not np.any(reference_data):
+            raise ValueError("The alignment reference is flat; there is nothing to correlate")
+
+        self.grid = grid
+        self._norm = float(np.sqrt(np.dot(reference_data, reference_data)))
+        if self.max_shift is None:
+            self.max_lag = count - 1
+        else:
+            self.max_lag = max(int(np.ceil(self.max_shift / grid.interval)), 1)
+        # Capture grid: the reference grid widened by max_lag points each side
+        self.capture_grid = UniformTime(grid.time_at(-self.max_lag), grid.interval, count + 2 * self.max_lag)
+        # Long enough that the lags searched never wrap around
+        self.fft_size = 1 << int(len(self.capture_grid) + count - 2).bit_length()
+        self._spectrum = np.conj(np.fft.rfft(reference_data, self.fft_size))
+
+    def search_window(self):
+        """Return the (time_min, time_max) of capture samples an estimate reads"""
+        if self.method == 'edge':
+            if self.max_shift is None:
+                return -np.inf, np.inf
+            return self.edge_time - self.max_shift, self.edge_time + self.max_shift
+        return float(self.capture_grid.min()), float(self.capture_grid.max())
+
+    def estimate(self, time_data, waveform_data):
+        """Return how much later than the reference the capture runs
+
+        Raises ValueError when the capture has no edge or nothing that
+        correlates with the reference within the search window.
+        """
+        time_data, waveform_data = _sorted(time_data, waveform_data)
+        margin = 1 if self.method == 'correlation' else 0
+        a, b = _window(time_data, *self.search_window(), margin)
+        time_data, waveform_data = time_data[a:b], waveform_data[a:b]
+        if self.method == 'correlation':
+            return self._estimate_correlation(time_data, waveform_data)
+        blocks = ((time_data[start:start + EDGE_SCAN_BLOCK], waveform_data[start:start + EDGE_SCAN_BLOCK])
+                  for start in range(0, len(waveform_data), EDGE_SCAN_BLOCK))
+        return self._estimate_edge(blocks)
+
+    def estimate_chunks(self, chunks):
+        """estimate() for a capture read as consecutive (time, values) chunks
+
+        The chunks must be in time order. Only the samples in the search
+        window are kept, and reading stops once the window or the edge is
+        passed, so captures larger than RAM can be aligned.
+        """
+        time_min, time_max = self.search_window()
+        margin = 1 if self.method == 'correlation' else 0
+
+        def in_window():
+            for time_data, waveform_data in chunks:
+                time_data = as_time_array(time_data)
+                if len(time_data) == 0:
+                    continue
+                a, b = _window(time_data, time_min, time_max, margin)
+                if a < b:
+                    yield time_data[a:b], np.asarray(waveform_data)[a:b]
+                if b < len(time_data):
+                    return
+
+        if self.method == 'edge':
+            return self._estimate_edge(in_window())
+        pieces = [(np.asarray(time_data), waveform_data) for time_data, waveform_data in in_window()]
+        if not pieces:
+            raise ValueError("The capture has no samples in the alignment window")
+        time_data, waveform_data = (np.concatenate(columns) for columns in zip(*pieces))
+        # Margin samples of neighbouring chunks can repeat or fall out of order
+        keep = np.concatenate(([True], np.diff(time_data) > 0))
+        return self._estimate_correlation(time_data[keep], waveform_data[keep])
+
+    def _estimate_edge(self, blocks):
+        crossing = _first_crossing(blocks, self.level, self.rising)
+        if crossing is None:
+            direction = 'rising' if self.rising else 'falling'
+            raise ValueError(f"No {direction} edge through {self.level:g} to align on")
+        return crossing - self.edge_time
+
+    def _resample(self, time_data, waveform_data):
+        """Return the capture linearly interpolated onto capture_grid
+
+        Outside the capture the end values are held. A uniform capture
+        reads only the two samples around each grid point, so the cost
+        does not grow with its length.
+        """
+        grid = np.asarray(self.capture_grid)
+        if isinstance(time_data, UniformTime) and len(time_data) >= 2:
+            position = np.clip((grid - time_data.time_at(0)) / time_data.interval, 0, len(time_data) - 1)
+            index = np.minimum(position.astype(np.intp), len(time_data) - 2)
+            fraction = position - index
+            samples = waveform_data[index] * (1 - fraction) + waveform_data[index + 1] * fraction
+            if np.isfinite(samples).all():
+                return samples
+        waveform_data = np.asarray(waveform_data, dtype=np.float64)
+        finite = np.isfinite(waveform_data)
+        if not finite.all():
+            time_data, waveform_data = np.asarray(time_data)[finite], waveform_data[finite]
+        if len(waveform_data) < 2:
+            raise ValueError("The capture has no samples in the alignment window")
+        return np.interp(grid, np.asarray(time_data), waveform_data)
+
+    def _estimate_correlation(self, time_data, waveform_data):
+        samples = self._resample(time_data, np.asarray(waveform_data))
+        samples = samples - samples.mean()
+        spectrum = np.fft.rfft(samples, self.fft_size)
+        # correlation[k] = sum over i of samples[i + k] * reference[i]
+        lags = 2 * self.max_lag + 1
+        correlation = np.fft.irfft(spectrum * self._spectrum, self.fft_size)[:lags]
+
+        # Normalise by the spread of the samples under the reference at each
+        # lag, so the peak is where the shapes match rather than where most
+        # of the capture lies on the side of the reference's mean
+        count = len(self.grid)
+        sums = np.concatenate(([0.0], np.cumsum(samples)))
+        squares = np.concatenate(([0.0], np.cumsum(samples * samples)))
+        window_sum = sums[count:count + lags] - sums[:lags]
+        spread = squares[count:count + lags] - squares[:lags] - window_sum * window_sum / count
+        spread = np.sqrt(np.maximum(spread, 0.0))
+        # Nearly flat windows (the held ends of a capture) would match any
+        # shape once scaled up; their spread counts as at least this much
+        floor = MIN_SPREAD_FRACTION * spread.max()
+        if not floor > 0:
+            raise ValueError("The capture is flat; there is nothing to correlate")
+        correlation /= np.maximum(spread, floor) * self._norm
+
+        k = int(np.argmax(correlation))
+        if not correlation[k] > 0:
+            raise ValueError("The capture does not correlate with the alignment reference")
+
+        lag = float(k)
+        if 0 < k < len(correlation) - 1:
+            y0, y1, y2 = correlation[k - 1:k + 2]
+            curvature = y0 - 2 * y1 + y2
+            if curvature < 0:
+                lag += 0.5 * (y0 - y2) / curvature
+        return float((lag - self.max_lag) * self.grid.interval)
@@ -0,0 +1,153 @@
+"""Implicit time axis of uniformly sampled waveforms"""
+import numpy as np
+
+
+# Largest distance of any sample time from the uniform grid, in intervals,
+# for a time column to be stored as (start, interval, count)
+UNIFORM_TOLERANCE = 1e-3
+# Samples compared against the grid at a time while detecting
+UNIFORM_BLOCK = 1 << 16
+
+
+class UniformTime:
+    """Sample times start + i * interval for i in range(count)
+
+    Stands in for a sorted float64 time array without storing it: indexing
+    with an integer or a fancy index computes just those times, slicing
+    returns another UniformTime, and searchsorted is a division instead of
+    a binary search, so mask vertices map straight to sample ranges. NumPy
+    functions that need the values (np.asarray, np.concatenate, ...) get
+    them through __array__. Every time is computed the same way, so the
+    values match the materialized array bit for bit.
+    """
+
+    dtype = np.dtype(np.float64)
+    ndim = 1
+    nbytes = 0
+
+    def __init__(self, start, interval, count, first=0):
+        if not interval > 0:
+            raise ValueError("interval must be positive")
+        self.start = float(start)
+        self.interval = float(interval)
+        self.count = max(int(count), 0)
+        # Index of the first sample on the parent axis of a slice
+        self.first = int(first)
+
+    def __len__(self):
+        return self.count
+
+    def __repr__(self):
+        return f"UniformTime(start={float(self.time_at(0))!r}, interval={self.interval!r}, count={self.count})"
+
+    @property
+    def shape(self):
+        return (self.count,)
+
+    @property
+    def size(self):
+        return self.count
+
+    def time_at(self, index):
+        """Return the time of a sample index, or an array of them"""
+        return (np.asarray(index) + self.first) * self.interval + self.start
+
+    def values(self, start=0, stop=None):
+        """Return the times of samples start to stop - 1 as a float64 array"""
+        start, stop, _ = slice(start, stop).indices(self.count)
+        return self.time_at(np.arange(start, max(stop, start)))
+
+    def __array__(self, dtype=None, copy=None):
+        values = self.values()
+        return values if dtype is None else values.astype(dtype, copy=False)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.count)
+            if step == 1:
+                return UniformTime(self.start, self.interval, max(stop - start, 0), self.first + start)
+            return self.time_at(np.arange(start, stop, step))
+        if isinstance(key, (int, np.integer)):
+            if not -self.count <= key < self.count:
+                raise IndexError(f"index {key} is out of bounds for axis 0 with size {self.count}")
+            return np.float64(self.time_at(key % self.count))
+        key = np.asarray(key)
+        if key.dtype == bool:
+            if key.shape != (self.count,):
+                raise IndexError("boolean index does not match the time axis")
+            key = np.flatnonzero(key)
+        elif len(key) and (key.min() < -self.count or key.max() >= self.count):
+            raise IndexError(f"index out of bounds for axis 0 with size {self.count}")
+        return self.time_at(key % max(self.count, 1))
+
+    def min(self, axis=None, out=None, **kwargs):
+        if self.count == 0:
+            raise ValueError("zero-size time axis has no minimum")
+        return self[0]
+
+    def max(self, axis=None, out=None, **kwargs):
+        if self.count == 0:
+            raise ValueError("zero-size time axis has no maximum")
+        return self[-1]
+
+    def searchsorted(self, v, side='left', sorter=None):
+        """Same result as np.searchsorted on the materialized times
+
+        The index is computed from the interval and then nudged a sample at
+        a time where rounding put it on the wrong side of v.
+        """
+        values = np.asarray(v, dtype=np.float64)
+        with np.errstate(invalid='ignore'):
+            guess = np.ceil((values - self.time_at(0)) / self.interval)
+            # NaN sorts after everything, as in NumPy
+            guess = np.where(np.isnan(values), self.count, np.clip(guess, 0, self.count))
+        index = guess.astype(np.intp)
+
+        while True:
+            before = self.time_at(np.maximum(index - 1, 0))
+            step_back = (index > 0) & ((before >= values) if side == 'left' else (before > values))
+            if not step_back.any():
+                break
+            index -= step_back
+        while True:
+            at = self.time_at(np.minimum(index, max(self.count - 1, 0)))
+            step_on = (index < self.count) & ((at < values) if side == 'left' else (at <= values))
+            if not step_on.any():
+                break
+            index += step_on
+        return index[()] if index.ndim == 0 else index
+
+
+def uniform_time(time_data, tolerance=UNIFORM_TOLERANCE):
+    """Return time_data as a UniformTime if it is uniformly sampled, else None
+
+    The grid runs from the first to the last time in equal steps; every time
+    must lie within tolerance intervals of its grid point. Times off the
+    grid by that little move the limit at a sample by at most tolerance
+    times the interval times the slope of the mask, so the grid stands in
+    for the column.
+    """
+    if isinstance(time_data, UniformTime):
+        return time_data
+    time_data = np.asarray(time_data, dtype=np.float64)
+    if time_data.ndim != 1 or len(time_data) < 2:
+        return None
+    interval = (time_data[-1] - time_data[0]) / (len(time_data) - 1)
+    if not (np.isfinite(interval) and interval > 0):
+        return None
+
+    axis = UniformTime(time_data[0], interval, len(time_data))
+    limit = tolerance * interval
+    for start in range(0, len(time_data), UNIFORM_BLOCK):
+        stop = min(start + UNIFORM_BLOCK, len(time_data))
+        # NaN compares False, so it also fails
+        if not np.all(np.abs(time_data[start:stop] - axis.values(start, stop)) <= limit):
+            return None
+    return axis
+
+
+def as_time_array(time_data):
+    """Return time_data as an array, keeping a UniformTime implicit"""
+    if isinstance(time_data, UniformTime):
+        return time_data
+    return np.asarray(time_data)
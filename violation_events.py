@@ -0,0 +1,140 @@
+"""Run-length table of the excursions found by a limit test"""
+import csv
+import json
+
+import numpy as np
+
+
+# Columns of the table, in export order
+EVENT_COLUMNS = ('type', 'start', 'stop', 'samples', 'start_time', 'end_time', 'duration',
+                 'peak', 'peak_index', 'peak_time', 'area')
+# Columns an excursion list can be ranked by
+RANK_KEYS = ('samples', 'duration', 'peak', 'area')
+
+
+class ViolationEvents:
+    """Columnar table with one row per excursion outside a limit
+
+    An excursion is a run of consecutive samples above the high limit (or
+    below the low limit), covering sample indices start to stop - 1. Its
+    start and end times are where the waveform crosses the limit, or the
+    first or last sample at the ends of the capture. peak is the largest
+    distance outside the limit, at peak_index and peak_time, and area is
+    the trapezoid-rule integral of that distance over the excursion.
+
+    Rows are ordered by start index, high before low. The table takes space
+    per excursion, not per sample, and never changes after construction.
+    """
+
+    def __init__(self, is_low, start, stop, start_time, end_time, peak, peak_index, peak_time, area):
+        self.is_low = np.asarray(is_low, dtype=bool)
+        self.start = np.asarray(start, dtype=np.int64)
+        self.stop = np.asarray(stop, dtype=np.int64)
+        self.start_time = np.asarray(start_time, dtype=np.float64)
+        self.end_time = np.asarray(end_time, dtype=np.float64)
+        self.peak = np.asarray(peak, dtype=np.float64)
+        self.peak_index = np.asarray(peak_index, dtype=np.int64)
+        self.peak_time = np.asarray(peak_time, dtype=np.float64)
+        self.area = np.asarray(area, dtype=np.float64)
+
+    def _columns(self):
+        return (self.is_low, self.start, self.stop, self.start_time, self.end_time,
+                self.peak, self.peak_index, self.peak_time, self.area)
+
+    @classmethod
+    def empty(cls):
+        return cls(*([],) * 9)
+
+    @classmethod
+    def concatenate(cls, tables):
+        """Join tables, keeping rows ordered by start index"""
+        tables = [table for table in tables if len(table)]
+        if not tables:
+            return cls.empty()
+        if len(tables) == 1:
+            return tables[0]
+        joined = cls(*(np.concatenate(columns) for columns in zip(*(table._columns() for table in tables))))
+        return joined.take(np.lexsort((joined.is_low, joined.start)))
+
+    def take(self, rows):
+        """Return the rows selected by an index array or boolean mask"""
+        return ViolationEvents(*(column[rows] for column in self._columns()))
+
+    def shifted(self, offset):
+        """Return the table with sample indices moved by offset"""
+        if offset == 0:
+            return self
+        return ViolationEvents(self.is_low, self.start + offset, self.stop + offset, self.start_time,
+                               self.end_time, self.peak, self.peak_index + offset, self.peak_time, self.area)
+
+    def __len__(self):
+        return len(self.start)
+
+    def __repr__(self):
+        return f"ViolationEvents({self.count('high')} high, {self.count('low')} low)"
+
+    @property
+    def samples(self):
+        return self.stop - self.start
+
+    @property
+    def duration(self):
+        return self.end_time - self.start_time
+
+    def of_type(self, limit_type):
+        """Return only the 'high' or 'low' excursions"""
+        return self.take(self.is_low == (limit_type == 'low'))
+
+    def count(self, limit_type=None):
+        """Number of excursions, optionally of one type"""
+        if limit_type is None:
+            return len(self)
+        return int(np.count_nonzero(self.is_low == (limit_type == 'low')))
+
+    def sample_count(self, limit_type=None):
+        """Number of samples outside the limits, optionally of one type"""
+        samples = self.samples
+        if limit_type is not None:
+            samples = samples[self.is_low == (limit_type == 'low')]
+        return int(samples.sum())
+
+    def top(self, n=10, key='peak'):
+        """Return the n largest excursions by samples, duration, peak or area"""
+        if key not in RANK_KEYS:
+            raise ValueError(f"key must be one of {', '.join(RANK_KEYS)}")
+        values = getattr(self, key)
+        # Largest first, ties in sample order
+        return self.take(np.argsort(-values, kind='stable')[:n])
+
+    def longest(self, n=10):
+        return self.top(n, 'duration')
+
+    def worst(self, n=10):
+        return self.top(n, 'peak')
+
+    def to_records(self):
+        """Return the rows as JSON-friendly dicts"""
+        columns = {
+            'type': np.where(self.is_low, 'low', 'high').tolist(),
+            'start': self.start.tolist(),
+            'stop': self.stop.tolist(),
+            'samples': self.samples.tolist(),
+            'start_time': self.start_time.tolist(),
+            'end_time': self.end_time.tolist(),
+            'duration': self.duration.tolist(),
+            'peak': self.peak.tolist(),
+            'peak_index': self.peak_index.tolist(),
+            'peak_time': self.peak_time.tolist(),
+            'area': self.area.tolist(),
+        }
+        return [dict(zip(EVENT_COLUMNS, row)) for row in zip(*(columns[key] for key in EVENT_COLUMNS))]
+
+    def write_csv(self, file_path):
+        with open(file_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=EVENT_COLUMNS)
+            writer.writeheader()
+            writer.writerows(self.to_records())
+
+    def write_json(self, file_path):
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_records(), f, indent=2)
@@ -0,0 +1,87 @@
+"""Read-only capture arrays shared by the tester, the plots and the designer"""
+import numpy as np
+
+from time_axis import UniformTime
+from waveform_decimation import MinMaxPyramid
+
+
+# Storage types offered for amplitudes; time is always float64
+AMPLITUDE_DTYPES = ('float64', 'float32')
+
+
+def _read_only(array, dtype):
+    """Return array as a read-only array of dtype, copying only to convert"""
+    array = np.asarray(array, dtype=dtype)
+    if array.ndim != 1:
+        raise ValueError("Waveform arrays must be one-dimensional")
+    if array.flags.writeable:
+        # A view, so the caller's array stays writeable
+        array = array.view()
+        array.flags.writeable = False
+    return array
+
+
+class Waveform:
+    """Time and amplitude arrays of one capture
+
+    The arrays are read-only, so the main window, the plot and the limit
+    designer all reference the same memory instead of keeping copies, and
+    arrays memory-mapped from a column cache are used as they are. Time is
+    float64 (8 bytes per sample). Amplitudes are float64 too, or float32
+    where about 7 significant digits are enough, which takes 4 bytes per
+    sample instead of 8; limit tests and crossing interpolation still work
+    in float64. A uniformly sampled capture keeps its UniformTime axis,
+    which stores no times at all.
+
+    The min/max pyramid used for plotting is built on first use and shared
+    by everything holding the waveform.
+    """
+
+    def __init__(self, time_data, waveform_data, amplitude_dtype='float64', time_sorted=None, bounds=None):
+        if amplitude_dtype not in AMPLITUDE_DTYPES:
+            raise ValueError(f"amplitude_dtype must be one of {', '.join(AMPLITUDE_DTYPES)}")
+        if isinstance(time_data, UniformTime):
+            self.time_data = time_data
+        else:
+            self.time_data = _read_only(time_data, np.float64)
+        self.waveform_data = _read_only(waveform_data, amplitude_dtype)
+        if len(self.time_data) != len(self.waveform_data):
+            raise ValueError("time_data and waveform_data must have the same length")
+
+        self.time_sorted = time_sorted
+        self._bounds = None
+        if bounds is not None:
+            # Amplitude bounds of the stored values; rounding keeps the order
+            time_min, time_max, amp_min, amp_max = bounds
+            dtype = self.waveform_data.dtype.type
+            self._bounds = (float(time_min), float(time_max), float(dtype(amp_min)), float(dtype(amp_max)))
+        self._pyramid = None
+
+    def __len__(self):
+        return len(self.time_data)
+
+    def __repr__(self):
+        return f"Waveform({len(self)} samples, {self.amplitude_dtype})"
+
+    @property
+    def amplitude_dtype(self):
+        return self.waveform_data.dtype.name
+
+    @property
+    def nbytes(self):
+        """Bytes taken by the time and amplitude arrays"""
+        return self.time_data.nbytes + self.waveform_data.nbytes
+
+    @property
+    def pyramid(self):
+        """The MinMaxPyramid of the waveform, built on first use"""
+        if self._pyramid is None:
+            self._pyramid = MinMaxPyramid(self.time_data, self.waveform_data, self.time_sorted)
+            self.time_sorted = self._pyramid.time_sorted
+        return self._pyramid
+
+    def bounds(self):
+        """Return (time_min, time_max, amp_min, amp_max), or None without samples"""
+        if self._bounds is None and len(self):
+            self._bounds = tuple(float(value) for value in self.pyramid.time_bounds() + self.pyramid.bounds())
+        return self._bounds
@@ -0,0 +1,193 @@
+"""Envelope-preserving decimation of waveforms for display"""
+import numpy as np
+
+from time_axis import UniformTime, as_time_array
+
+
+def is_sorted(values):
+    """Return True if values never decrease"""
+    if isinstance(values, UniformTime):
+        return True
+    values = np.asarray(values)
+    return len(values) < 2 or bool(np.all(values[1:] >= values[:-1]))
+
+
+def visible_index_range(time_data, time_min, time_max):
+    """Return the (start, stop) sample range covering [time_min, time_max]
+
+    time_data must be sorted. One extra sample is kept on each side so the
+    trace runs to the edge of the view instead of stopping short of it. A
+    UniformTime axis finds the range by arithmetic.
+    """
+    start = int(np.searchsorted(time_data, time_min, side='left'))
+    stop = int(np.searchsorted(time_data, time_max, side='right'))
+    return max(start - 1, 0), min(stop + 1, len(time_data))
+
+
+def minmax_indices(waveform_data, n_columns, start=0, stop=None):
+    """Return indices of the min and max sample of each of n_columns buckets
+
+    The samples in [start, stop) are split into consecutive buckets of equal
+    size and both extremes of every bucket are kept, in sample order, so at
+    most 2 * n_columns points remain. Every sample lies between its bucket's
+    min and max, so drawing the kept points as a polyline covers the full
+    vertical extent of each pixel column and no spike is lost.
+    """
+    if stop is None:
+        stop = len(waveform_data)
+    n = stop - start
+    n_columns = max(int(n_columns), 1)
+
+    if n <= 2 * n_columns:
+        return np.arange(start, stop)
+
+    size = -(-n // n_columns)  # Samples per bucket, rounded up
+    full = n // size
+    body = np.asarray(waveform_data[start:start + full * size]).reshape(full, size)
+    offsets = start + np.arange(full) * size
+
+    i_min = body.argmin(axis=1) + offsets
+    i_max = body.argmax(axis=1) + offsets
+    indices = np.empty(2 * full, dtype=np.intp)
+    indices[0::2] = np.minimum(i_min, i_max)
+    indices[1::2] = np.maximum(i_min, i_max)
+
+    tail_start = start + full * size
+    if tail_start < stop:
+        tail = np.asarray(waveform_data[tail_start:stop])
+        tail_indices = sorted({int(tail.argmin()) + tail_start, int(tail.argmax()) + tail_start})
+        indices = np.concatenate((indices, tail_indices))
+
+    return indices
+
+
+def decimate_minmax(time_data, waveform_data, n_columns, time_min=None, time_max=None):
+    """Return (times, values) of a min/max decimated view of a waveform
+
+    When time_min/time_max are given and time_data is sorted, only samples
+    inside that window are considered.
+    """
+    start, stop = 0, len(waveform_data)
+    if time_min is not None and time_max is not None and is_sorted(time_data):
+        start, stop = visible_index_range(time_data, time_min, time_max)
+
+    indices = minmax_indices(waveform_data, n_columns, start, stop)
+    return as_time_array(time_data)[indices], np.asarray(waveform_data)[indices]
+
+
+class MinMaxPyramid:
+    """Precomputed min/max summaries of a waveform at 2^k sample decimation
+
+    Level k splits the samples into buckets of 2^k and stores the indices of
+    each bucket's min and max sample. Levels start at BASE_LEVEL so the index
+    arrays stay well below the size of the waveform itself; narrower views
+    are decimated from the raw samples, which is just as cheap at that
+    point. Built once per loaded column, after which picking points for any
+    visible range costs O(pixels) regardless of the capture length. Pass
+    time_sorted when it is already known, e.g. from the column statistics,
+    to skip the check.
+    """
+
+    BASE_LEVEL = 4
+
+    def __init__(self, time_data, waveform_data, time_sorted=None):
+        self.time_data = as_time_array(time_data)
+        self.waveform_data = np.asarray(waveform_data)
+        self.time_sorted = is_sorted(self.time_data) if time_sorted is None else time_sorted
+        self.levels = []
+
+        values = self.waveform_data
+        size = 1 << self.BASE_LEVEL
+        n = len(values)
+        if n <= size:
+            return
+
+        # Base level straight from the samples
+        full = n // size
+        body = values[:full * size].reshape(full, size)
+        offsets = np.arange(full) * size
+        i_min = body.argmin(axis=1) + offsets
+        i_max = body.argmax(axis=1) + offsets
+        if full * size < n:
+            tail = values[full * size:]
+            i_min = np.append(i_min, int(tail.argmin()) + full * size)
+            i_max = np.append(i_max, int(tail.argmax()) + full * size)
+        self.levels.append((i_min, i_max))
+
+        # Each further level merges pairs of buckets from the one below
+        while len(i_min) > 1:
+            pairs = len(i_min) // 2
+            a_min, b_min = i_min[0:2 * pairs:2], i_min[1:2 * pairs:2]
+            a_max, b_max = i_max[0:2 * pairs:2], i_max[1:2 * pairs:2]
+            next_min = np.where(values[b_min] < values[a_min], b_min, a_min)
+            next_max = np.where(values[b_max] > values[a_max], b_max, a_max)
+            if len(i_min) % 2:
+                next_min = np.append(next_min, i_min[-1])
+                next_max = np.append(next_max, i_max[-1])
+            i_min, i_max = next_min, next_max
+            self.levels.append((i_min, i_max))
+
+    def __len__(self):
+        return len(self.waveform_data)
+
+    def bounds(self):
+        """Return the (min, max) amplitude of the whole waveform
+
+        NaN samples are ignored; both are NaN when no sample is valid.
+        """
+        if self.levels:
+            i_min, i_max = self.levels[-1]
+            low, high = self.waveform_data[i_min[0]], self.waveform_data[i_max[0]]
+        else:
+            low, high = self.waveform_data.min(), self.waveform_data.max()
+        if np.isnan(low) or np.isnan(high):
+            # argmin and argmax pick a NaN wherever there is one
+            low, high = np.fmin.reduce(self.waveform_data), np.fmax.reduce(self.waveform_data)
+        return low, high
+
+    def time_bounds(self):
+        """Return the (min, max) time of the whole waveform"""
+        if self.time_sorted:
+            return self.time_data[0], self.time_data[-1]
+        return self.time_data.min(), self.time_data.max()
+
+    def indices(self, n_columns, start=0, stop=None):
+        """Return sample indices of a min/max view of [start, stop)
+
+        Uses the coarsest level whose buckets still give at least n_columns
+        points, so at most about 4 * n_columns indices are returned.
+        """
+        if stop is None:
+            stop = len(self.waveform_data)
+        n = stop - start
+        n_columns = max(int(n_columns), 1)
+        if n <= 0:
+            return np.arange(0)
+
+        level = (n // n_columns).bit_length() - 1
+        if level < self.BASE_LEVEL or not self.levels:
+            return minmax_indices(self.waveform_data, n_columns, start, stop)
+
+        level = min(level, self.BASE_LEVEL + len(self.levels) - 1)
+        i_min, i_max = self.levels[level - self.BASE_LEVEL]
+        first = start >> level
+        last = ((stop - 1) >> level) + 1
+        i_min, i_max = i_min[first:last], i_max[first:last]
+
+        indices = np.empty(2 * len(i_min), dtype=np.intp)
+        indices[0::2] = np.minimum(i_min, i_max)
+        indices[1::2] = np.maximum(i_min, i_max)
+        return indices
+
+    def decimate(self, n_columns, time_min=None, time_max=None):
+        """Return (times, values) of the waveform decimated to n_columns
+
+        Same result shape as decimate_minmax, but the view is assembled from
+        the precomputed levels.
+        """
+        start, stop = 0, len(self.waveform_data)
+        if time_min is not None and time_max is not None and self.time_sorted:
+            start, stop = visible_index_range(self.time_data, time_min, time_max)
+
+        indices = self.indices(n_columns, start, stop)
+        return self.time_data[indices], self.waveform_data[indices]
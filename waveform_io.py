@@ -0,0 +1,781 @@
+"""Columnar loading of waveform captures into typed arrays"""
+import csv
+import importlib.util
+import json
+import os
+import threading
+import time
+from itertools import chain, islice
+
+import numpy as np
+
+from limit_mask import LimitMask
+from mask_library import BINARY_SUFFIX, JSON_SUFFIX, load_mask_file
+from time_axis import UNIFORM_TOLERANCE, UniformTime, uniform_time
+from waveform_decimation import is_sorted
+
+
+# Rows converted per chunk while parsing a column
+DEFAULT_CHUNK_ROWS = 1 << 16
+# Share of rows that must hold numbers for a column to count as numeric
+NUMERIC_FRACTION = 0.5
+# CSV parsers, fastest first; 'auto' picks the first one installed
+PARSE_BACKENDS = ('pyarrow', 'numpy', 'python')
+# Bytes per block handed to pyarrow's CSV reader
+PYARROW_BLOCK_SIZE = 1 << 24
+
+
+def available_backends():
+    """Return the installed CSV parse backends, fastest first"""
+    backends = []
+    if importlib.util.find_spec('pyarrow') is not None:
+        backends.append('pyarrow')
+    # numpy's C loadtxt arrived in 1.23
+    if np.lib.NumpyVersion(np.__version__) >= '1.23.0':
+        backends.append('numpy')
+    backends.append('python')
+    return backends
+
+
+def resolve_backend(backend='auto'):
+    """Return the backend to use for 'auto' or a backend name"""
+    if backend == 'auto':
+        return available_backends()[0]
+    if backend not in PARSE_BACKENDS:
+        raise ValueError(f"Unknown parse backend '{backend}', expected auto or one of {', '.join(PARSE_BACKENDS)}")
+    if backend not in available_backends():
+        raise ValueError(f"Parse backend '{backend}' is not installed")
+    return backend
+
+
+def sniff_csv(file_path):
+    """Return the header row and delimiter of a CSV file"""
+    with open(file_path, 'r', newline='', encoding='utf-8') as csvfile:
+        # Try to detect delimiter
+        sample = csvfile.read(1024)
+        csvfile.seek(0)
+        delimiter = csv.Sniffer().sniff(sample).delimiter
+
+        reader = csv.reader(csvfile, delimiter=delimiter)
+        headers = next(reader)
+
+    return headers, delimiter
+
+
+def _parse_cells(cells):
+    """Convert a list of strings to float64, returning (values, valid_mask)"""
+    try:
+        # Whole chunk in one call; only falls through when a cell is bad
+        values = np.array(cells, dtype=np.float64)
+        return values, None
+    except ValueError:
+        pass
+
+    values = np.empty(len(cells), dtype=np.float64)
+    valid = np.ones(len(cells), dtype=bool)
+    for i, cell in enumerate(cells):
+        try:
+            values[i] = float(cell)
+        except ValueError:
+            valid[i] = False
+    return values, valid
+
+
+def parse_raw_columns(rows, indices, chunk_rows=DEFAULT_CHUNK_ROWS, progress=None):
+    """Parse the given column indices of rows without applying any row rules
+
+    Returns ({index: (values, valid)}, row_count) where valid is a boolean
+    mask of convertible cells, or None when every cell converted. progress,
+    if given, is called with the number of rows parsed after every chunk;
+    an exception raised from it aborts the parse.
+    """
+    rows = iter(rows)
+    chunks = {index: [] for index in indices}
+    row_count = 0
+
+    while True:
+        chunk = list(islice(rows, chunk_rows))
+        if not chunk:
+            break
+
+        for index in chunks:
+            cells = [row[index] if len(row) > index else '' for row in chunk]
+            chunks[index].append(_parse_cells(cells))
+        row_count += len(chunk)
+        if progress is not None:
+            progress(row_count)
+
+    return _join_chunks(chunks), row_count
+
+
+def _join_chunks(chunks):
+    """Join {index: [(values, valid), ...]} into {index: (values, valid)}"""
+    columns = {}
+    for index, parsed in chunks.items():
+        if not parsed:
+            columns[index] = (np.empty(0, dtype=np.float64), None)
+            continue
+        values = np.concatenate([values for values, _ in parsed])
+        if all(valid is None for _, valid in parsed):
+            valid = None
+        else:
+            valid = np.concatenate([np.ones(len(values), dtype=bool) if valid is None else valid
+                                    for values, valid in parsed])
+        columns[index] = (values, valid)
+    return columns
+
+
+def combine_columns(amp_values, amp_valid, time_values=None, time_valid=None, row_offset=0, sample_offset=0,
+                    uniform_tolerance=UNIFORM_TOLERANCE):
+    """Apply the loader rules to raw column values
+
+    Rows whose amplitude cell is missing or not a number are skipped, time
+    cell included, so every amplitude keeps the time of its own row. A time
+    cell that cannot be converted falls back to the row index. Without a
+    time column the time axis is the sample index. Time sampled uniformly
+    within uniform_tolerance (see uniform_time) comes back as a UniformTime,
+    so the axis takes no memory; chunk readers pass None to keep the times
+    as read, since each chunk would get a grid of its own. Fully valid
+    amplitude columns are returned as-is, so memory-mapped input stays
+    lazily loaded. The offsets give the row and sample index of the first
+    value when combining a chunk from the middle of a file.
+    """
+    if time_values is None:
+        waveform_data = amp_values if amp_valid is None else amp_values[amp_valid]
+        return UniformTime(sample_offset, 1.0, len(waveform_data)), waveform_data
+
+    time_data = time_values
+    if time_valid is not None:
+        # Use index if conversion fails
+        row_index = np.arange(row_offset, row_offset + len(time_values), dtype=np.float64)
+        time_data = np.where(time_valid, time_values, row_index)
+
+    waveform_data = amp_values
+    if amp_valid is not None:
+        time_data, waveform_data = time_data[amp_valid], amp_values[amp_valid]
+    uniform = uniform_time(time_data, uniform_tolerance) if uniform_tolerance is not None else None
+    return (time_data if uniform is None else uniform), waveform_data
+
+
+def parse_columns(rows, amp_index, time_index=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Parse the amplitude and time columns of rows into float64 arrays
+
+    Returns (time_data, waveform_data, row_count), see combine_columns for
+    how bad cells are handled.
+    """
+    indices = [amp_index] if time_index is None else [amp_index, time_index]
+    columns, row_count = parse_raw_columns(rows, indices, chunk_rows)
+    if time_index is None:
+        time_data, waveform_data = combine_columns(*columns[amp_index])
+    else:
+        time_data, waveform_data = combine_columns(*columns[amp_index], *columns[time_index])
+    return time_data, waveform_data, row_count
+
+
+def iter_column_chunks(rows, amp_index, time_index=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Yield (time_data, waveform_data) arrays for successive chunks of rows
+
+    Applies the same rules as parse_columns, but only one chunk of rows is
+    held in memory at a time.
+    """
+    indices = [amp_index] if time_index is None else [amp_index, time_index]
+    rows = iter(rows)
+    row_offset = 0
+    sample_offset = 0
+
+    while True:
+        chunk = list(islice(rows, chunk_rows))
+        if not chunk:
+            break
+
+        columns, row_count = parse_raw_columns(chunk, indices, chunk_rows)
+        time_columns = columns[time_index] if time_index is not None else (None, None)
+        time_data, waveform_data = combine_columns(*columns[amp_index], *time_columns, row_offset=row_offset,
+                                                   sample_offset=sample_offset, uniform_tolerance=None)
+        row_offset += row_count
+        sample_offset += len(waveform_data)
+        yield time_data, waveform_data
+
+
+class ColumnStats:
+    """Inferred type and summary of one parsed column
+
+    kind is 'numeric' when at least NUMERIC_FRACTION of the rows hold
+    finite numbers, 'text' otherwise and 'empty' without rows. missing
+    counts the rows whose cell is empty, not a number, NaN or infinite;
+    minimum and maximum cover the finite numbers, and is_sorted is True
+    when no row is missing and the values never decrease.
+    """
+
+    FIELDS = ('kind', 'rows', 'count', 'missing', 'minimum', 'maximum', 'is_sorted')
+
+    def __init__(self, kind, rows, count, missing, minimum=None, maximum=None, is_sorted=False):
+        self.kind = kind
+        self.rows = rows
+        self.count = count
+        self.missing = missing
+        self.minimum = minimum
+        self.maximum = maximum
+        self.is_sorted = is_sorted
+
+    @classmethod
+    def from_column(cls, values, valid):
+        """Summarise (values, valid) as returned by parse_raw_columns"""
+        rows = len(values)
+        finite = np.isfinite(values)
+        if valid is not None:
+            finite &= valid
+        count = int(np.count_nonzero(finite))
+        if rows == 0:
+            return cls('empty', 0, 0, 0)
+        if count == 0:
+            return cls('text', rows, 0, rows)
+
+        numbers = values if count == rows else values[finite]
+        kind = 'numeric' if count >= NUMERIC_FRACTION * rows else 'text'
+        return cls(kind, rows, count, rows - count, float(numbers.min()), float(numbers.max()),
+                   count == rows and is_sorted(values))
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(*(data[field] for field in cls.FIELDS))
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @property
+    def numeric(self):
+        return self.kind == 'numeric'
+
+    @property
+    def missing_rate(self):
+        """Share of rows without a finite number, as a percentage"""
+        return self.missing / self.rows * 100 if self.rows else 0.0
+
+    def describe(self):
+        """One-line summary for tooltips and status text"""
+        if self.kind == 'empty':
+            return "empty"
+        if self.count == 0:
+            return f"{self.kind}, {self.rows} rows, no numbers"
+        return (f"{self.kind}, {self.rows} rows, range {self.minimum:g} to {self.maximum:g}, "
+                f"{self.missing_rate:.1f}% missing")
+
+
+class ParseReport:
+    """Which backend parsed a source, and how fast"""
+
+    def __init__(self, backend, rows, columns, seconds):
+        self.backend = backend
+        self.rows = rows
+        self.columns = columns
+        self.seconds = seconds
+
+    @property
+    def cells(self):
+        return self.rows * self.columns
+
+    @property
+    def rate(self):
+        """Cells parsed per second"""
+        return self.cells / self.seconds if self.seconds > 0 else 0.0
+
+    def describe(self):
+        return (f"{self.backend}, {self.rows} rows x {self.columns} columns in {self.seconds:.2f} s "
+                f"({self.rate / 1e6:.1f} M cells/s)")
+
+
+class WaveformCache:
+    """Sidecar directory of parsed CSV columns, memory-mapped on later opens
+
+    The cache is keyed on the CSV's absolute path, size, modification time
+    and delimiter; any change discards the stored columns. Each column is
+    stored as a .npy file (plus a validity mask when some cells did not
+    convert) so columns can be added as they are first selected.
+    """
+
+    VERSION = 1
+    SUFFIX = '.wfcache'
+
+    def __init__(self, file_path, delimiter):
+        self.directory = file_path + self.SUFFIX
+        self.index_path = os.path.join(self.directory, 'index.json')
+
+        stat = os.stat(file_path)
+        self.key = {
+            'version': self.VERSION,
+            'path': os.path.abspath(file_path),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'delimiter': delimiter,
+        }
+        self.index = self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {'key': self.key, 'row_count': None, 'columns': {}}
+
+        if index.get('key') != self.key:
+            # Stale cache for an older version of the file
+            return {'key': self.key, 'row_count': None, 'columns': {}}
+        return index
+
+    @property
+    def row_count(self):
+        return self.index['row_count']
+
+    def _column_path(self, index, kind):
+        return os.path.join(self.directory, f"column_{index}_{kind}.npy")
+
+    def get_column(self, index):
+        """Return memory-mapped (values, valid) for a column, or None if absent"""
+        entry = self.index['columns'].get(str(index))
+        if entry is None:
+            return None
+        try:
+            values = np.load(self._column_path(index, 'values'), mmap_mode='r')
+            valid = np.load(self._column_path(index, 'valid'), mmap_mode='r') if entry['has_invalid'] else None
+        except (OSError, ValueError):
+            return None
+        return values, valid
+
+    def put_columns(self, columns, row_count):
+        """Store parsed columns; failures only disable caching"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            if self.index['row_count'] != row_count:
+                self.index = {'key': self.key, 'row_count': row_count, 'columns': {}}
+
+            for index, (values, valid) in columns.items():
+                self._write_array(self._column_path(index, 'values'), values)
+                if valid is not None:
+                    self._write_array(self._column_path(index, 'valid'), valid)
+                self.index['columns'][str(index)] = {'has_invalid': valid is not None}
+        except OSError:
+            return
+        self._write_index()
+
+    def get_stats(self):
+        """Return the stored column statistics, or None"""
+        stats = self.index.get('stats')
+        if stats is None:
+            return None
+        return [ColumnStats.from_dict(column) for column in stats]
+
+    def put_stats(self, stats):
+        """Store the statistics of every column; failures only disable caching"""
+        self.index['stats'] = [column.to_dict() for column in stats]
+        self._write_index()
+
+    def _write_index(self):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = self.index_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.index, f)
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            pass
+
+    def _write_array(self, path, array):
+        # Write then rename so a reader never maps a half-written file
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(array))
+        os.replace(tmp_path, path)
+
+
+class WaveformSource:
+    """Tabular waveform data whose columns are parsed on demand
+
+    Parsing holds a lock on the source, so a background job that replaces
+    another waits for it to stop instead of parsing, caching and updating
+    the parse state at the same time.
+    """
+
+    def __init__(self, headers):
+        self.headers = headers
+        self.row_count = None
+        self.column_stats = None  # One ColumnStats per header once scanned
+        self.last_parse = None  # ParseReport of the latest parse
+        self._columns_cache = {}
+        self._lock = threading.RLock()
+
+    def iter_rows(self):
+        """Yield the non-empty data rows as lists of strings"""
+        raise NotImplementedError
+
+    def read_columns(self, amp_column, time_column=None, progress=None):
+        """Return (time_data, waveform_data) arrays for the named columns
+
+        progress, if given, is called with the fraction of the source read
+        so far; an exception raised from it aborts the read.
+        """
+        amp_index = self.headers.index(amp_column)
+        time_index = self.headers.index(time_column) if time_column is not None else None
+
+        key = (amp_index, time_index)
+        with self._lock:
+            if key not in self._columns_cache:
+                if time_index is None:
+                    columns = self.read_raw_columns([amp_index], progress)
+                    arrays = combine_columns(*columns[amp_index])
+                else:
+                    columns = self.read_raw_columns([amp_index, time_index], progress)
+                    arrays = combine_columns(*columns[amp_index], *columns[time_index])
+                # Only keep the latest selection to bound memory
+                self._columns_cache = {key: arrays}
+            return self._columns_cache[key]
+
+    def read_channels(self, amp_columns, time_column=None, progress=None):
+        """Return {column: (time_data, waveform_data)} for several amplitude columns
+
+        All columns are parsed in a single pass over the source. Each channel
+        follows the read_columns rules; channels without bad cells share one
+        time array.
+        """
+        amp_indices = [self.headers.index(column) for column in amp_columns]
+        time_index = self.headers.index(time_column) if time_column is not None else None
+        indices = sorted(set(amp_indices) | ({time_index} if time_index is not None else set()))
+        columns = self.read_raw_columns(indices, progress)
+
+        time_columns = columns[time_index] if time_index is not None else ()
+        shared_time = None
+        channels = {}
+        for column, index in zip(amp_columns, amp_indices):
+            values, valid = columns[index]
+            if valid is None and shared_time is not None:
+                channels[column] = (shared_time, values)
+                continue
+            time_data, waveform_data = combine_columns(values, valid, *time_columns)
+            if valid is None:
+                shared_time = time_data
+            channels[column] = (time_data, waveform_data)
+        return channels
+
+    def scan_columns(self, progress=None):
+        """Parse every column once and return a ColumnStats per header
+
+        The statistics are kept on the source, so the first call costs one
+        pass over the data and later ones nothing.
+        """
+        with self._lock:
+            if self.column_stats is None:
+                columns = self.read_raw_columns(range(len(self.headers)), progress)
+                self.column_stats = [ColumnStats.from_column(*columns[index])
+                                     for index in range(len(self.headers))]
+            return self.column_stats
+
+    def stats_for(self, column):
+        """Return the ColumnStats of a named column, or None before a scan"""
+        if self.column_stats is None:
+            return None
+        return self.column_stats[self.headers.index(column)]
+
+    def column_bounds(self, amp_column, time_column=None):
+        """Return (time_min, time_max, amp_min, amp_max) of read_columns' arrays
+
+        Taken from the column statistics, so it costs nothing. None before a
+        scan or when a column has missing cells, since the loader rules then
+        drop or renumber rows.
+        """
+        amp_stats = self.stats_for(amp_column)
+        if amp_stats is None or amp_stats.missing or amp_stats.rows == 0:
+            return None
+        if time_column is None:
+            return 0.0, float(amp_stats.rows - 1), amp_stats.minimum, amp_stats.maximum
+        time_stats = self.stats_for(time_column)
+        if time_stats.missing:
+            return None
+        return time_stats.minimum, time_stats.maximum, amp_stats.minimum, amp_stats.maximum
+
+    def time_sorted(self, time_column=None):
+        """Return whether read_columns' time axis is sorted, or None if unknown"""
+        if time_column is None:
+            return True  # The sample index
+        time_stats = self.stats_for(time_column)
+        if time_stats is None or time_stats.missing:
+            return None
+        return time_stats.is_sorted
+
+    def read_raw_columns(self, indices, progress=None):
+        """Return {index: (values, valid)} for the given column indices"""
+        indices = list(indices)
+        callback = None
+        if progress is not None:
+            callback = lambda row_count: progress(self.fraction_read(row_count))
+        with self._lock:
+            start = time.perf_counter()
+            columns, self.row_count, backend = self.parse_raw_columns(indices, callback)
+            self.last_parse = ParseReport(backend, self.row_count, len(indices), time.perf_counter() - start)
+        return columns
+
+    def parse_raw_columns(self, indices, progress=None):
+        """Parse the columns in one pass, returning (columns, row_count, backend)"""
+        columns, row_count = parse_raw_columns(self.iter_rows(), indices, progress=progress)
+        return columns, row_count, 'python'
+
+    def fraction_read(self, row_count):
+        """Estimate how much of the source has been read after row_count rows"""
+        if not self.row_count:
+            return 0.0
+        return min(row_count / self.row_count, 1.0)
+
+    def iter_column_chunks(self, amp_column, time_column=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+        """Yield (time_data, waveform_data) chunks without loading whole columns"""
+        amp_index = self.headers.index(amp_column)
+        time_index = self.headers.index(time_column) if time_column is not None else None
+        return iter_column_chunks(self.iter_rows(), amp_index, time_index, chunk_rows)
+
+    def count_rows(self):
+        """Return the number of data rows, scanning the source if needed"""
+        with self._lock:
+            if self.row_count is None:
+                self.row_count = sum(1 for _ in self.iter_rows())
+            return self.row_count
+
+
+class CsvWaveformSource(WaveformSource):
+    """CSV file whose header and delimiter are sniffed once
+
+    Columns are parsed by the given backend ('auto' for the fastest one
+    installed). Every backend follows the csv module's reading and the
+    loader's cell rules; input a native parser does not handle the same
+    way is handed to the next slower backend, down to the pure-Python one.
+    """
+
+    def __init__(self, file_path, use_cache=True, backend='auto'):
+        headers, delimiter = sniff_csv(file_path)
+        super().__init__(headers)
+        self.file_path = file_path
+        self.delimiter = delimiter
+        self.backend = resolve_backend(backend)
+        self.file_size = os.path.getsize(file_path)
+        self.chars_read = 0
+        self.cache = WaveformCache(file_path, delimiter) if use_cache else None
+        if self.cache is not None:
+            self.row_count = self.cache.row_count
+
+    def read_raw_columns(self, indices, progress=None):
+        if self.cache is None:
+            return super().read_raw_columns(indices, progress)
+
+        with self._lock:
+            columns = {}
+            for index in indices:
+                column = self.cache.get_column(index)
+                if column is not None:
+                    columns[index] = column
+
+            missing = [index for index in indices if index not in columns]
+            if missing:
+                # One pass over the file for every column not cached yet
+                parsed = super().read_raw_columns(missing, progress)
+                self.cache.put_columns(parsed, self.row_count)
+                for index in missing:
+                    # Hand out the memory-mapped copy so the parsed arrays are freed
+                    column = self.cache.get_column(index)
+                    columns[index] = column if column is not None else parsed[index]
+            return columns
+
+    def scan_columns(self, progress=None):
+        with self._lock:
+            if self.column_stats is None and self.cache is not None:
+                self.column_stats = self.cache.get_stats()
+            if self.column_stats is None:
+                # The parsed columns go into the cache too, so selecting one
+                # afterwards maps it instead of parsing the file again
+                super().scan_columns(progress)
+                if self.cache is not None:
+                    self.cache.put_stats(self.column_stats)
+            return self.column_stats
+
+    def parse_raw_columns(self, indices, progress=None):
+        backends = PARSE_BACKENDS[PARSE_BACKENDS.index(self.backend):]
+        for backend in backends:
+            parsed = getattr(self, '_parse_' + backend)(indices, progress)
+            if parsed is not None:
+                return parsed + (backend,)
+
+    def _parse_python(self, indices, progress):
+        return parse_raw_columns(self.iter_rows(), indices, progress=progress)
+
+    def _parse_numpy(self, indices, progress, chunk_rows=DEFAULT_CHUNK_ROWS):
+        """Parse chunks of lines with numpy's C loadtxt
+
+        A chunk loadtxt rejects, e.g. for a bad cell or a short row, is
+        parsed with the csv module instead. Quoted fields can span lines,
+        so from the first quote on the rest of the file goes through the
+        csv module.
+        """
+        chunks = {index: [] for index in indices}
+        row_count = 0
+        with open(self.file_path, 'r', newline='', encoding='utf-8') as csvfile:
+            lines = self._count_chars(csvfile)
+            header = next(lines, '')
+            if '"' in header:
+                return None
+
+            while True:
+                chunk = list(islice(lines, chunk_rows))
+                if not chunk:
+                    break
+                text = ''.join(chunk)
+                if '"' in text:
+                    rows = (row for row in csv.reader(chain(chunk, lines), delimiter=self.delimiter) if row)
+                    offset = row_count
+                    callback = None if progress is None else lambda count: progress(offset + count)
+                    rest, count = parse_raw_columns(rows, indices, chunk_rows, callback)
+                    for index, column in rest.items():
+                        chunks[index].append(column)
+                    row_count += count
+                    break
+
+                parsed = None
+                if text.strip('\r\n'):
+                    try:
+                        table = np.loadtxt(chunk, dtype=np.float64, delimiter=self.delimiter,
+                                           comments=None, usecols=indices, ndmin=2)
+                        parsed = {index: (np.ascontiguousarray(table[:, i]), None)
+                                  for i, index in enumerate(indices)}
+                        count = len(table)
+                    except ValueError:
+                        pass
+                if parsed is None:
+                    rows = (row for row in csv.reader(chunk, delimiter=self.delimiter) if row)
+                    parsed, count = parse_raw_columns(rows, indices, chunk_rows)
+                for index, column in parsed.items():
+                    chunks[index].append(column)
+                row_count += count
+                if progress is not None:
+                    progress(row_count)
+
+        return _join_chunks(chunks), row_count
+
+    def _parse_pyarrow(self, indices, progress):
+        """Parse with pyarrow's multithreaded CSV reader
+
+        Cells are read as strings and cast to float64 per block; a block
+        column the cast rejects is converted with the Python rules. Returns
+        None for files pyarrow cannot read as the csv module would, such as
+        rows with a different number of cells.
+        """
+        import pyarrow
+        import pyarrow.csv
+
+        names = [str(index) for index in range(len(self.headers))]
+        selected = [names[index] for index in indices]
+        read_options = pyarrow.csv.ReadOptions(column_names=names, skip_rows=1, block_size=PYARROW_BLOCK_SIZE)
+        parse_options = pyarrow.csv.ParseOptions(delimiter=self.delimiter)
+        convert_options = pyarrow.csv.ConvertOptions(column_types={name: pyarrow.string() for name in selected},
+                                                     include_columns=selected, strings_can_be_null=False)
+
+        chunks = {index: [] for index in indices}
+        row_count = 0
+        try:
+            with open(self.file_path, 'rb') as f:
+                reader = pyarrow.csv.open_csv(f, read_options, parse_options, convert_options)
+                for batch in reader:
+                    for index, name in zip(indices, selected):
+                        cells = batch.column(name)
+                        try:
+                            column = (cells.cast(pyarrow.float64()).to_numpy(zero_copy_only=False), None)
+                        except pyarrow.ArrowInvalid:
+                            column = _parse_cells(cells.to_pylist())
+                        chunks[index].append(column)
+                    row_count += batch.num_rows
+                    self.chars_read = f.tell()
+                    if progress is not None:
+                        progress(row_count)
+        except pyarrow.ArrowInvalid:
+            return None
+
+        return _join_chunks(chunks), row_count
+
+    def fraction_read(self, row_count):
+        # Based on the file position, since the row count is not known
+        # until the first full pass
+        if not self.file_size:
+            return 0.0
+        return min(self.chars_read / self.file_size, 1.0)
+
+    def iter_rows(self):
+        with open(self.file_path, 'r', newline='', encoding='utf-8') as csvfile:
+            reader = csv.reader(self._count_chars(csvfile), delimiter=self.delimiter)
+            next(reader, None)  # Skip headers
+            for row in reader:
+                if row:  # Skip empty rows
+                    yield row
+
+    def _count_chars(self, lines):
+        self.chars_read = 0
+        for line in lines:
+            self.chars_read += len(line)
+            yield line
+
+    def iter_column_chunks(self, amp_column, time_column=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+        amp_index = self.headers.index(amp_column)
+        time_index = self.headers.index(time_column) if time_column is not None else None
+
+        cached = None
+        if self.cache is not None and self.cache.row_count is not None:
+            indices = [amp_index] if time_index is None else [amp_index, time_index]
+            cached = [self.cache.get_column(index) for index in indices]
+            if any(column is None for column in cached):
+                cached = None
+
+        if cached is None:
+            return super().iter_column_chunks(amp_column, time_column, chunk_rows)
+        return self._iter_cached_chunks(cached, self.cache.row_count, chunk_rows)
+
+    def _iter_cached_chunks(self, cached, row_count, chunk_rows):
+        # Slices of the memory-mapped columns; only the current chunk is paged in
+        sample_offset = 0
+        for start in range(0, row_count, chunk_rows):
+            stop = min(start + chunk_rows, row_count)
+            chunk = []
+            for values, valid in cached:
+                chunk.extend((values[start:stop], valid[start:stop] if valid is not None else None))
+            time_data, waveform_data = combine_columns(*chunk, row_offset=start, sample_offset=sample_offset,
+                                                       uniform_tolerance=None)
+            sample_offset += len(waveform_data)
+            yield time_data, waveform_data
+
+
+class RowWaveformSource(WaveformSource):
+    """Rows of strings already held in memory, such as generated sample data"""
+
+    def __init__(self, headers, rows):
+        super().__init__(headers)
+        self.rows = rows
+
+    def iter_rows(self):
+        return (row for row in self.rows if row)
+
+    def fraction_read(self, row_count):
+        return min(row_count / len(self.rows), 1.0) if self.rows else 0.0
+
+
+def load_limit_mask(file_path):
+    """Load a LimitMask from a mask file (.json or .wfmask) or a CSV table
+
+    CSV files have a header row followed by time, high limit, low limit
+    columns, as in the designer's table.
+    """
+    if file_path.lower().endswith((JSON_SUFFIX, BINARY_SUFFIX)):
+        return load_mask_file(file_path)[0]
+
+    headers, delimiter = sniff_csv(file_path)
+    rows = []
+    with open(file_path, 'r', newline='', encoding='utf-8') as csvfile:
+        reader = csv.reader(csvfile, delimiter=delimiter)
+        next(reader, None)  # Skip headers
+        for row in reader:
+            if row:
+                rows.append([float(value) for value in row[:3]])
+    if any(len(row) < 3 for row in rows):
+        raise ValueError(f"Limit file {file_path} needs time, high limit and low limit columns")
+    return LimitMask(*zip(*rows)) if rows else LimitMask([], [], [])
@@ -1,19 +1,187 @@
+import os
 import sys
-import csv
 import math
 import random
+import threading
 from PySide6.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, 
                               QWidget, QPushButton, QLabel, QLineEdit, QFileDialog, 
                               QMessageBox, QGroupBox, QGridLayout, QTextEdit, QSplitter,
-                              QGraphicsView, QGraphicsScene, QComboBox, QCheckBox,
+                              QGraphicsView, QGraphicsScene, QGraphicsItem, QComboBox, QCheckBox,
                               QDialog, QSpinBox, QTabWidget, QTableWidget, QTableWidgetItem,
-                              QHeaderView, QDialogButtonBox)
-from PySide6.QtCore import Qt, QRectF, QPointF, Signal
-from PySide6.QtGui import QFont, QPainter, QPen, QBrush, QColor, QPolygonF, QCursor
+                              QHeaderView, QDialogButtonBox, QProgressBar, QInputDialog)
+from PySide6.QtCore import Qt, QRectF, QPointF, Signal, QObject, QRunnable, QThreadPool, QEventLoop, QTimer
+from PySide6.QtGui import (QFont, QPainter, QPainterPath, QPen, QBrush, QColor, QPolygonF, QCursor,
+                           QImage)
+
+import numpy as np
+
+from limit_engine import (DEFAULT_BLOCK_SIZE, compute_violation_masks, retest_limits, run_limit_test,
+                          run_multi_channel_test)
+from limit_mask import LimitMask
+from live_acquisition import LiveMonitor, open_source
+from mask_generation import DEFAULT_POINTS, GoldenEnvelope, train_from_files
+from mask_library import MaskLibrary, save_mask_file
+from time_alignment import TimeAligner
+from time_axis import UniformTime
+from waveform import Waveform
+from waveform_decimation import decimate_minmax, is_sorted
+from waveform_io import CsvWaveformSource, RowWaveformSource, load_limit_mask
+
+
+def polyline_path(xs, ys):
+    """Build an open QPainterPath through the given scene coordinates"""
+    path = QPainterPath()
+    if len(xs) == 0:
+        return path
+    path.addPolygon(QPolygonF([QPointF(x, y) for x, y in zip(xs.tolist(), ys.tolist())]))
+    return path
+
+
+def grid_path(rect, divisions=5):
+    """Build one path holding the grid lines of a plot rectangle"""
+    path = QPainterPath()
+    for i in range(divisions + 1):
+        x = rect.left() + i * rect.width() / divisions
+        path.moveTo(x, rect.top())
+        path.lineTo(x, rect.bottom())
+    for i in range(divisions + 1):
+        y = rect.top() + i * rect.height() / divisions
+        path.moveTo(rect.left(), y)
+        path.lineTo(rect.right(), y)
+    return path
+
+
+def axes_path(rect):
+    """Build the x and y axis lines along the bottom and left of a plot rectangle"""
+    path = QPainterPath()
+    path.moveTo(rect.right(), rect.bottom())
+    path.lineTo(rect.left(), rect.bottom())
+    path.lineTo(rect.left(), rect.top())
+    return path
+
+
+def inputs_changed(drawn_inputs, layer, *inputs):
+    """Return True, and remember the inputs, if a plot layer needs redrawing
+
+    Inputs are compared by identity: data arrays and masks are replaced,
+    never modified in place, once they are handed to a plot widget.
+    """
+    drawn = drawn_inputs.get(layer)
+    if drawn is not None and len(drawn) == len(inputs) and all(a is b for a, b in zip(drawn, inputs)):
+        return False
+    drawn_inputs[layer] = inputs
+    return True
+
+
+class MarkerItem(QGraphicsItem):
+    """Circular markers at many scene points, drawn as a single item
+
+    Markers keep their size in screen pixels at any zoom. Only the markers
+    inside the exposed area are painted, and markers that land on the same
+    device pixel are painted once, so a repaint costs time proportional to
+    what is on screen rather than to the marker count.
+    """
+
+    def __init__(self, xs, ys, radius, pen, brush):
+        super().__init__()
+        self.radius = radius  # In device pixels
+        self.pen = pen
+        self.brush = brush
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption, True)
+        self.set_points(xs, ys)
+        
+    def set_points(self, xs, ys):
+        """Replace the markers with ones at the given scene points"""
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        if len(xs) > 1 and not is_sorted(xs):
+            order = np.argsort(xs, kind='stable')
+            xs, ys = xs[order], ys[order]
+        self.prepareGeometryChange()
+        self.xs = xs
+        self.ys = ys
+        
+        # Padded by the marker size at one pixel per scene unit; the plot is
+        # never shown smaller than that
+        margin = self.radius + self.pen.widthF()
+        if len(xs):
+            self.bounds = QRectF(xs[0] - margin, ys.min() - margin,
+                                 xs[-1] - xs[0] + 2 * margin, ys.max() - ys.min() + 2 * margin)
+        else:
+            self.bounds = QRectF()
+        self.update()
+            
+    def __len__(self):
+        return len(self.xs)
+        
+    def boundingRect(self):
+        return self.bounds
+        
+    def visible_markers(self, exposed, transform):
+        """Return the device x and y of the markers to paint in the exposed rect"""
+        scale_x = max(abs(transform.m11()), 1e-12)
+        scale_y = max(abs(transform.m22()), 1e-12)
+        margin_x = (self.radius + self.pen.widthF()) / scale_x
+        margin_y = (self.radius + self.pen.widthF()) / scale_y
+        # Markers are sorted by x, so the exposed columns are one slice
+        start = np.searchsorted(self.xs, exposed.left() - margin_x, side='left')
+        stop = np.searchsorted(self.xs, exposed.right() + margin_x, side='right')
+        xs = self.xs[start:stop]
+        ys = self.ys[start:stop]
+        inside = (ys >= exposed.top() - margin_y) & (ys <= exposed.bottom() + margin_y)
+        xs = xs[inside] * transform.m11() + transform.dx()
+        ys = ys[inside] * transform.m22() + transform.dy()
+        if len(xs) < 2:
+            return xs, ys
+            
+        # One marker per device pixel
+        px = np.round(xs).astype(np.int64)
+        py = np.round(ys).astype(np.int64)
+        px -= px.min()
+        py -= py.min()
+        _, first = np.unique(px * (int(py.max()) + 1) + py, return_index=True)
+        return xs[first], ys[first]
+        
+    def paint(self, painter, option, widget=None):
+        transform = painter.worldTransform()
+        xs, ys = self.visible_markers(option.exposedRect, transform)
+        if len(xs) == 0:
+            return
+            
+        # Two batched point draws: round outline dots, then translucent fill
+        # dots replacing their insides. They are stamped into a layer so the
+        # fill does not mix with the outline underneath it
+        margin = int(np.ceil(self.radius + self.pen.widthF())) + 1
+        left, top = int(np.floor(xs.min())) - margin, int(np.floor(ys.min())) - margin
+        width, height = int(np.ceil(xs.max())) + margin - left, int(np.ceil(ys.max())) + margin - top
+        layer = QImage(width, height, QImage.Format_ARGB32_Premultiplied)
+        layer.fill(Qt.transparent)
+        
+        points = QPolygonF([QPointF(x, y) for x, y in zip((xs - left).tolist(), (ys - top).tolist())])
+        stamp = QPainter(layer)
+        stamp.setRenderHint(QPainter.Antialiasing)
+        pen_width = self.pen.widthF()
+        stamp.setPen(QPen(self.pen.color(), 2 * self.radius + pen_width, Qt.SolidLine, Qt.RoundCap))
+        stamp.drawPoints(points)
+        stamp.setCompositionMode(QPainter.CompositionMode_Source)
+        stamp.setPen(QPen(self.brush.color(), max(2 * self.radius - pen_width, 0.0), Qt.SolidLine, Qt.RoundCap))
+        stamp.drawPoints(points)
+        stamp.end()
+        
+        painter.save()
+        painter.resetTransform()
+        painter.drawImage(QPointF(left, top), layer)
+        painter.restore()
 
 
 class LimitDesignerDialog(QDialog):
-    def __init__(self, parent=None, time_data=None, waveform_data=None, existing_limits=None):
+    # Starting limits offered for loaded data: (label, envelope method)
+    ENVELOPE_CHOICES = [("Flat margin", None), ("Min/max envelope", 'minmax'),
+                        ("Mean ± 3σ envelope", 'sigma'), ("0.5-99.5% envelope", 'percentile')]
+    # Distance of an envelope from the data, as a share of the amplitude range
+    ENVELOPE_MARGIN = 0.05
+    
+    def __init__(self, parent=None, waveform=None, existing_mask=None, test_result=None):
         super().__init__(parent)
         self.setWindowTitle("Limit Array Designer")
         self.setGeometry(200, 200, 900, 700)
@@ -24,18 +192,21 @@ class LimitDesignerDialog(QDialog):
         self.high_limits = []
         self.low_limits = []
         
-        # Use actual waveform data if provided, otherwise generate sample data
-        if time_data is not None and waveform_data is not None:
-            self.sample_time = time_data.copy()
-            self.sample_data = waveform_data.copy()
-            self.has_real_data = True
-        else:
-            self.sample_data = []
-            self.sample_time = []
-            self.has_real_data = False
+        # Use actual waveform data if provided, otherwise generate sample data.
+        # The waveform is read-only, so it is shared with the main window
+        self.waveform = waveform
+        self.has_real_data = waveform is not None
         
-        # Store existing limits to reload them
-        self.existing_limits = existing_limits
+        # Store the existing mask to reload its points
+        self.existing_mask = existing_mask
+        
+        # Live test of the limits being edited; re-tested incrementally
+        # against the mask it was computed for
+        self.live_result = None
+        self.live_mask = None
+        if existing_mask is not None and test_result is not None:
+            self.live_result = test_result
+            self.live_mask = existing_mask
         
         # Plot settings
         self.drawing_mode = None  # 'high', 'low', or None
@@ -88,6 +259,15 @@ class LimitDesignerDialog(QDialog):
         self.reset_btn.clicked.connect(self.reset_to_default)
         controls_layout.addWidget(self.reset_btn, 2, 1)
         
+        self.envelope_combo = QComboBox()
+        for label, method in self.ENVELOPE_CHOICES:
+            self.envelope_combo.addItem(label, method)
+        self.envelope_combo.setToolTip("Default limits for loaded data: flat lines, or an envelope of the "
+                                       "waveform simplified to the number of points")
+        self.envelope_combo.setEnabled(self.has_real_data)
+        self.envelope_combo.currentIndexChanged.connect(self.reset_to_default)
+        controls_layout.addWidget(self.envelope_combo, 2, 2)
+        
         layout.addWidget(controls_group)
         
         # Main content with tabs
@@ -111,6 +291,10 @@ class LimitDesignerDialog(QDialog):
         instructions.setStyleSheet("background-color: #f0f0f0; padding: 10px; border: 1px solid #ccc;")
         plot_layout.addWidget(instructions)
         
+        self.live_result_label = QLabel()
+        self.live_result_label.setStyleSheet("padding: 4px; font-weight: bold;")
+        plot_layout.addWidget(self.live_result_label)
+        
         self.tab_widget.addTab(plot_tab, "Interactive Plot")
         
         # Table tab
@@ -167,7 +351,7 @@ class LimitDesignerDialog(QDialog):
         self.num_points = self.points_spinbox.value()
         
         # Only reinitialize if the number of points has actually changed from existing data
-        if self.existing_limits and len(self.existing_limits['time_points']) == self.num_points:
+        if self.existing_mask is not None and len(self.existing_mask) == self.num_points:
             # Keep existing limits if the point count matches
             return
         
@@ -180,9 +364,9 @@ class LimitDesignerDialog(QDialog):
         
     def initialize_limits(self):
         """Initialize limit arrays with default values"""
-        if self.has_real_data and self.sample_time:
+        if self.has_real_data and len(self.waveform) > 0:
             # Use actual data time range
-            time_min, time_max = min(self.sample_time), max(self.sample_time)
+            time_min, time_max = self.waveform.bounds()[:2]
             self.time_points = [time_min + i * (time_max - time_min) / (self.num_points - 1) for i in range(self.num_points)]
         else:
             # Use default time range
@@ -192,11 +376,11 @@ class LimitDesignerDialog(QDialog):
         
     def load_existing_or_initialize_limits(self):
         """Load existing limits if available, otherwise initialize new ones"""
-        if self.existing_limits:
-            # Load existing limit arrays
-            self.time_points = self.existing_limits['time_points'].copy()
-            self.high_limits = self.existing_limits['high_limits'].copy()
-            self.low_limits = self.existing_limits['low_limits'].copy()
+        if self.existing_mask is not None:
+            # Load the points of the existing mask for editing
+            self.time_points = self.existing_mask.time_points.tolist()
+            self.high_limits = self.existing_mask.high_limits.tolist()
+            self.low_limits = self.existing_mask.low_limits.tolist()
             self.num_points = len(self.time_points)
             self.points_spinbox.blockSignals(True)  # Prevent triggering on_points_changed
             self.points_spinbox.setValue(self.num_points)
@@ -208,14 +392,36 @@ class LimitDesignerDialog(QDialog):
         
     def initialize_limits_from_data(self):
         """Initialize limits based on actual waveform data"""
-        if not self.sample_data or not self.sample_time:
+        if self.waveform is None or len(self.waveform) == 0:
             self.initialize_limits()
             return
             
-        time_min, time_max = min(self.sample_time), max(self.sample_time)
-        amp_min, amp_max = min(self.sample_data), max(self.sample_data)
+        time_min, time_max, amp_min, amp_max = self.waveform.bounds()
+        if not (np.isfinite(amp_min) and np.isfinite(amp_max)):
+            # No valid amplitudes to start the limits from
+            self.initialize_limits()
+            return
         amp_range = amp_max - amp_min
         
+        method = self.envelope_combo.currentData()
+        if method is not None and time_max > time_min:
+            # Envelope of the waveform, fed in blocks to bound the temporaries
+            envelope = GoldenEnvelope(time_min, time_max, value_range=(amp_min, amp_max))
+            for start in range(0, len(self.waveform), DEFAULT_BLOCK_SIZE):
+                stop = start + DEFAULT_BLOCK_SIZE
+                envelope.add(self.waveform.time_data[start:stop], self.waveform.waveform_data[start:stop])
+            margin = amp_range * self.ENVELOPE_MARGIN if amp_range > 0 else 1.0
+            limit_mask = envelope.to_limit_mask(self.num_points, method, margin=margin)
+            self.time_points = limit_mask.time_points.tolist()
+            self.high_limits = limit_mask.high_limits.tolist()
+            self.low_limits = limit_mask.low_limits.tolist()
+            # Fewer points are kept where the envelope is straight
+            self.num_points = len(self.time_points)
+            self.points_spinbox.blockSignals(True)
+            self.points_spinbox.setValue(self.num_points)
+            self.points_spinbox.blockSignals(False)
+            return
+        
         # Create time points across the data range
         self.time_points = [time_min + i * (time_max - time_min) / (self.num_points - 1) for i in range(self.num_points)]
         
@@ -226,16 +432,15 @@ class LimitDesignerDialog(QDialog):
         
     def generate_sample_data(self):
         """Generate sample waveform data"""
-        self.sample_time = [i * 0.1 for i in range(101)]  # 0 to 10 seconds
-        self.sample_data = []
+        t = np.arange(101) * 0.1  # 0 to 10 seconds
+        self.live_result = None
         
-        for t in self.sample_time:
-            # Create a complex waveform with multiple frequency components
-            value = (math.sin(t * 2) * 1.5 + 
-                    math.sin(t * 5) * 0.8 + 
-                    math.sin(t * 0.5) * 0.5 +
-                    random.uniform(-0.2, 0.2))  # Add some noise
-            self.sample_data.append(value)
+        # Create a complex waveform with multiple frequency components
+        values = (np.sin(t * 2) * 1.5 +
+                  np.sin(t * 5) * 0.8 +
+                  np.sin(t * 0.5) * 0.5 +
+                  np.random.uniform(-0.2, 0.2, len(t)))  # Add some noise
+        self.waveform = Waveform(t, values)
             
         self.update_plot()
         
@@ -281,10 +486,41 @@ class LimitDesignerDialog(QDialog):
         
     def update_plot(self):
         """Update the plot display"""
-        self.plot_widget.set_data(
-            self.sample_time, self.sample_data,
-            self.time_points, self.high_limits, self.low_limits
-        )
+        limit_mask = self.get_limit_mask()
+        self.plot_widget.set_data(self.waveform, limit_mask)
+        self.update_live_result(limit_mask)
+        
+    def update_live_result(self, limit_mask):
+        """Re-test the edited limits and show pass/fail"""
+        if self.waveform is None or len(self.waveform) < 2:
+            self.live_result = None
+            self.live_result_label.clear()
+            return
+            
+        if self.live_result is None:
+            self.live_result = run_limit_test(self.waveform.time_data, self.waveform.waveform_data, limit_mask)
+        else:
+            # Only samples between the neighbours of the edited points are tested again
+            self.live_result = retest_limits(self.live_result, self.waveform.time_data,
+                                             self.waveform.waveform_data, self.live_mask, limit_mask)
+        self.live_mask = limit_mask
+        
+        result = self.live_result
+        if result.passed:
+            self.live_result_label.setText("Live test: PASS - no samples outside the limits")
+            self.live_result_label.setStyleSheet("padding: 4px; font-weight: bold; color: green;")
+        else:
+            self.live_result_label.setText(f"Live test: FAIL - {result.high_violations} above, "
+                                           f"{result.low_violations} below, "
+                                           f"{len(result.crossing_points)} crossings "
+                                           f"({result.violation_rate:.2f}%)")
+            self.live_result_label.setStyleSheet("padding: 4px; font-weight: bold; color: red;")
+            
+    def get_test_result(self):
+        """Return (result, limit_mask) of the live test, or (None, None)"""
+        if self.live_result is None:
+            return None, None
+        return self.live_result, self.live_mask
         
     def update_table(self):
         """Update the table with current limit values"""
@@ -303,6 +539,8 @@ class LimitDesignerDialog(QDialog):
         """Handle table cell changes"""
         try:
             value = float(self.table.item(row, col).text())
+            if not math.isfinite(value):
+                raise ValueError(value)
             
             if col == 0:  # Time
                 self.time_points[row] = value
@@ -338,13 +576,9 @@ class LimitDesignerDialog(QDialog):
             self.update_table()
             self.update_plot()
             
-    def get_limit_arrays(self):
-        """Return the current limit arrays"""
-        return {
-            'time_points': self.time_points.copy(),
-            'high_limits': self.high_limits.copy(),
-            'low_limits': self.low_limits.copy()
-        }
+    def get_limit_mask(self):
+        """Return the edited points as a LimitMask"""
+        return LimitMask(self.time_points, self.high_limits, self.low_limits)
 
 
 class LimitPlotWidget(QGraphicsView):
@@ -356,39 +590,66 @@ class LimitPlotWidget(QGraphicsView):
         self.setScene(self.scene)
         
         # Data storage
-        self.sample_time = []
-        self.sample_data = []
-        self.time_points = []
-        self.high_limits = []
-        self.low_limits = []
+        self.waveform = None
+        self.limit_mask = None
+        self.data_bounds = None
+        self.sample_points = None
+        self.view_range = None
+        self.drawn_inputs = {}
+        self.plot_visible = None
         
         # Plot settings
         self.margin = 50
-        self.plot_rect = QRectF()
+        self.plot_rect = QRectF(self.margin, self.margin, 700 - 2 * self.margin, 400 - 2 * self.margin)
         
         # Setup view
         self.setDragMode(QGraphicsView.NoDrag)
         self.setRenderHint(QPainter.Antialiasing)
-        
-    def set_data(self, sample_time, sample_data, time_points, high_limits, low_limits):
-        """Set the data to be plotted"""
-        self.sample_time = sample_time
-        self.sample_data = sample_data
-        self.time_points = time_points
-        self.high_limits = high_limits
-        self.low_limits = low_limits
+        self.create_items()
+        
+    def create_items(self):
+        """Add the plot items, which live as long as the widget, in drawing order"""
+        self.scene.addPath(grid_path(self.plot_rect), QPen(QColor(200, 200, 200), 1, Qt.DotLine))
+        self.scene.addPath(axes_path(self.plot_rect), QPen(QColor(0, 0, 0), 2))
+        self.sample_item = self.scene.addPath(QPainterPath(), QPen(QColor(100, 100, 100), 2))
+        self.high_line_item = self.scene.addPath(QPainterPath(), QPen(QColor(200, 0, 0), 2, Qt.DashLine))
+        self.low_line_item = self.scene.addPath(QPainterPath(), QPen(QColor(0, 0, 200), 2, Qt.DashLine))
+        self.high_point_item = MarkerItem([], [], 5, QPen(QColor(200, 0, 0), 2), QBrush(QColor(255, 200, 200)))
+        self.low_point_item = MarkerItem([], [], 5, QPen(QColor(0, 0, 200), 2), QBrush(QColor(200, 200, 255)))
+        self.scene.addItem(self.high_point_item)
+        self.scene.addItem(self.low_point_item)
+        self.title_item = self.scene.addText("", QFont("Arial", 12, QFont.Bold))
+        self.plot_items = self.scene.items()
+        self.set_plot_visible(False)
+        
+    def set_plot_visible(self, visible):
+        """Show or hide every plot item"""
+        if visible == self.plot_visible:
+            return
+        self.plot_visible = visible
+        for item in self.plot_items:
+            item.setVisible(visible)
+        
+    def set_data(self, waveform, limit_mask):
+        """Set the Waveform and limits to be plotted"""
+        self.waveform = waveform
+        self.limit_mask = limit_mask
         self.update_plot()
         
     def update_plot(self):
-        """Update the plot with current data"""
-        self.scene.clear()
-        
-        if not self.sample_data:
+        """Update the plot items whose data or axes changed
+
+        Editing the limits only redraws the limit items, and the sample trace
+        is summarised once per data set, so an edit takes the same time at
+        any sample count.
+        """
+        if inputs_changed(self.drawn_inputs, 'data', self.waveform):
+            self.summarise_data()
+        self.set_plot_visible(self.data_bounds is not None)
+        if self.data_bounds is None:
             return
             
         self.calculate_plot_rect()
-        self.draw_grid()
-        self.draw_axes()
         self.draw_sample_data()
         self.draw_limit_lines()
         self.draw_limit_points()
@@ -396,30 +657,37 @@ class LimitPlotWidget(QGraphicsView):
         
         self.fitInView(self.scene.itemsBoundingRect(), Qt.KeepAspectRatio)
         
-    def calculate_plot_rect(self):
-        """Calculate the plotting rectangle"""
-        if not self.sample_data:
+    def summarise_data(self):
+        """Cache the bounds and decimated trace of new sample data"""
+        if self.waveform is None or len(self.waveform) == 0:
+            self.data_bounds = None
+            self.sample_points = None
             return
             
-        time_min, time_max = min(self.sample_time), max(self.sample_time)
-        amp_min, amp_max = min(self.sample_data), max(self.sample_data)
+        self.data_bounds = self.waveform.bounds()
+        # One min/max pair per pixel column
+        self.sample_points = decimate_minmax(self.waveform.time_data, self.waveform.waveform_data,
+                                             int(self.plot_rect.width()))
+        
+    def calculate_plot_rect(self):
+        """Calculate the data range shown in the plotting rectangle"""
+        time_min, time_max, amp_min, amp_max = self.data_bounds
         
         # Include limit points in range
-        if self.high_limits:
-            amp_max = max(amp_max, max(self.high_limits))
-        if self.low_limits:
-            amp_min = min(amp_min, min(self.low_limits))
+        if self.limit_mask is not None:
+            amp_min = min(amp_min, self.limit_mask.value_min)
+            amp_max = max(amp_max, self.limit_mask.value_max)
             
         # Add padding
         time_range = time_max - time_min if time_max != time_min else 1
         amp_range = amp_max - amp_min if amp_max != amp_min else 1
         
-        self.time_min = time_min - time_range * 0.05
-        self.time_max = time_max + time_range * 0.05
-        self.amp_min = amp_min - amp_range * 0.1
-        self.amp_max = amp_max + amp_range * 0.1
-        
-        self.plot_rect = QRectF(self.margin, self.margin, 700 - 2 * self.margin, 400 - 2 * self.margin)
+        view_range = (time_min - time_range * 0.05, time_max + time_range * 0.05,
+                      amp_min - amp_range * 0.1, amp_max + amp_range * 0.1)
+        # Kept as the same object while unchanged, so layers see no change
+        if view_range != self.view_range:
+            self.view_range = view_range
+            self.time_min, self.time_max, self.amp_min, self.amp_max = view_range
         
     def data_to_scene(self, time_val, amp_val):
         """Convert data coordinates to scene coordinates"""
@@ -439,71 +707,54 @@ class LimitPlotWidget(QGraphicsView):
         amp_val = self.amp_min + (self.plot_rect.bottom() - scene_point.y()) / self.plot_rect.height() * (self.amp_max - self.amp_min)
         return time_val, amp_val
         
-    def draw_grid(self):
-        """Draw grid lines"""
-        pen = QPen(QColor(200, 200, 200), 1, Qt.DotLine)
-        
-        for i in range(6):
-            x = self.plot_rect.left() + i * self.plot_rect.width() / 5
-            self.scene.addLine(x, self.plot_rect.top(), x, self.plot_rect.bottom(), pen)
-            
-        for i in range(6):
-            y = self.plot_rect.top() + i * self.plot_rect.height() / 5
-            self.scene.addLine(self.plot_rect.left(), y, self.plot_rect.right(), y, pen)
-            
-    def draw_axes(self):
-        """Draw axes"""
-        pen = QPen(QColor(0, 0, 0), 2)
-        self.scene.addLine(self.plot_rect.left(), self.plot_rect.bottom(), 
-                          self.plot_rect.right(), self.plot_rect.bottom(), pen)
-        self.scene.addLine(self.plot_rect.left(), self.plot_rect.top(), 
-                          self.plot_rect.left(), self.plot_rect.bottom(), pen)
-                          
+    def data_to_scene_arrays(self, times, amps):
+        """Convert arrays of data coordinates to scene x and y arrays"""
+        if self.time_max == self.time_min or self.amp_max == self.amp_min:
+            return (np.full(len(times), self.plot_rect.left()),
+                    np.full(len(amps), self.plot_rect.bottom()))
+            
+        xs = self.plot_rect.left() + (times - self.time_min) / (self.time_max - self.time_min) * self.plot_rect.width()
+        ys = self.plot_rect.bottom() - (amps - self.amp_min) / (self.amp_max - self.amp_min) * self.plot_rect.height()
+        return xs, ys
+        
     def draw_sample_data(self):
         """Draw the sample waveform"""
-        if len(self.sample_time) < 2:
+        if not inputs_changed(self.drawn_inputs, 'sample_data', self.view_range, self.sample_points):
+            return
+        if len(self.waveform) < 2:
+            self.sample_item.setPath(QPainterPath())
             return
             
-        pen = QPen(QColor(100, 100, 100), 2)
-        
-        # Draw line segments instead of polygon to avoid connecting last to first
-        for i in range(len(self.sample_time) - 1):
-            p1 = self.data_to_scene(self.sample_time[i], self.sample_data[i])
-            p2 = self.data_to_scene(self.sample_time[i + 1], self.sample_data[i + 1])
-            self.scene.addLine(p1.x(), p1.y(), p2.x(), p2.y(), pen)
+        xs, ys = self.data_to_scene_arrays(*self.sample_points)
+        self.sample_item.setPath(polyline_path(xs, ys))
             
     def draw_limit_lines(self):
         """Draw interpolated limit lines"""
-        if len(self.time_points) < 2:
+        if not inputs_changed(self.drawn_inputs, 'limit_lines', self.view_range, self.limit_mask):
+            return
+        if self.limit_mask is None or len(self.limit_mask) < 2:
+            self.high_line_item.setPath(QPainterPath())
+            self.low_line_item.setPath(QPainterPath())
             return
             
-        # High limit line - draw as connected line segments
-        high_pen = QPen(QColor(200, 0, 0), 2, Qt.DashLine)
-        for i in range(len(self.time_points) - 1):
-            p1 = self.data_to_scene(self.time_points[i], self.high_limits[i])
-            p2 = self.data_to_scene(self.time_points[i + 1], self.high_limits[i + 1])
-            self.scene.addLine(p1.x(), p1.y(), p2.x(), p2.y(), high_pen)
-            
-        # Low limit line - draw as connected line segments
-        low_pen = QPen(QColor(0, 0, 200), 2, Qt.DashLine)
-        for i in range(len(self.time_points) - 1):
-            p1 = self.data_to_scene(self.time_points[i], self.low_limits[i])
-            p2 = self.data_to_scene(self.time_points[i + 1], self.low_limits[i + 1])
-            self.scene.addLine(p1.x(), p1.y(), p2.x(), p2.y(), low_pen)
+        xs, high_ys = self.data_to_scene_arrays(self.limit_mask.time_points, self.limit_mask.high_limits)
+        _, low_ys = self.data_to_scene_arrays(self.limit_mask.time_points, self.limit_mask.low_limits)
+        self.high_line_item.setPath(polyline_path(xs, high_ys))
+        self.low_line_item.setPath(polyline_path(xs, low_ys))
             
     def draw_limit_points(self):
         """Draw individual limit points"""
-        # High limit points
-        for t, h in zip(self.time_points, self.high_limits):
-            point = self.data_to_scene(t, h)
-            self.scene.addEllipse(point.x() - 4, point.y() - 4, 8, 8, 
-                                 QPen(QColor(200, 0, 0), 2), QBrush(QColor(255, 200, 200)))
-            
-        # Low limit points
-        for t, l in zip(self.time_points, self.low_limits):
-            point = self.data_to_scene(t, l)
-            self.scene.addEllipse(point.x() - 4, point.y() - 4, 8, 8, 
-                                 QPen(QColor(0, 0, 200), 2), QBrush(QColor(200, 200, 255)))
+        if not inputs_changed(self.drawn_inputs, 'limit_points', self.view_range, self.limit_mask):
+            return
+        if self.limit_mask is None:
+            self.high_point_item.set_points([], [])
+            self.low_point_item.set_points([], [])
+            return
+            
+        xs, high_ys = self.data_to_scene_arrays(self.limit_mask.time_points, self.limit_mask.high_limits)
+        _, low_ys = self.data_to_scene_arrays(self.limit_mask.time_points, self.limit_mask.low_limits)
+        self.high_point_item.set_points(xs, high_ys)
+        self.low_point_item.set_points(xs, low_ys)
             
     def draw_labels(self):
         """Draw axis labels"""
@@ -514,13 +765,14 @@ class LimitPlotWidget(QGraphicsView):
         else:
             title_text = "Limit Designer - Sample Data"
             
-        title = self.scene.addText(title_text, QFont("Arial", 12, QFont.Bold))
-        title_rect = title.boundingRect()
-        title.setPos((700 - title_rect.width()) / 2, 5)
+        if self.title_item.toPlainText() != title_text:
+            self.title_item.setPlainText(title_text)
+            title_rect = self.title_item.boundingRect()
+            self.title_item.setPos((700 - title_rect.width()) / 2, 5)
         
     def mousePressEvent(self, event):
         """Handle mouse press events for setting limit points"""
-        if event.button() == Qt.LeftButton:
+        if event.button() == Qt.LeftButton and self.plot_visible:
             scene_pos = self.mapToScene(event.pos())
             
             # Check if click is within plot area
@@ -538,66 +790,137 @@ class WaveformPlotWidget(QGraphicsView):
         self.setScene(self.scene)
         
         # Data storage
-        self.time_data = None
-        self.waveform_data = None
-        self.limit_arrays = None
+        self.waveform = None
+        self.limit_mask = None
         self.crossing_points = []
+        self.violation_mask = None
+        self.data_bounds = None
+        self.view_range = None
+        self.drawn_inputs = {}
+        self.plot_visible = None
         
         # Plot settings
         self.margin = 60  # Increased margin for better label spacing
-        self.plot_rect = QRectF()
+        self.plot_rect = QRectF(self.margin, self.margin, 600 - 2 * self.margin, 400 - 2 * self.margin)
         
         # Setup view
         self.setDragMode(QGraphicsView.RubberBandDrag)
         self.setRenderHint(QPainter.Antialiasing)
         self.setHorizontalScrollBarPolicy(Qt.ScrollBarAsNeeded)
         self.setVerticalScrollBarPolicy(Qt.ScrollBarAsNeeded)
+        self.create_items()
+        
+    def create_items(self):
+        """Add the plot items, which live as long as the widget, in drawing order"""
+        self.scene.addPath(grid_path(self.plot_rect), QPen(QColor(200, 200, 200), 1, Qt.DotLine))
+        self.scene.addPath(axes_path(self.plot_rect), QPen(QColor(0, 0, 0), 2))
+        self.waveform_item = self.scene.addPath(QPainterPath(), QPen(QColor(0, 100, 200), 2))
+        self.high_line_item = self.scene.addPath(QPainterPath(), QPen(QColor(200, 0, 0), 2, Qt.DashLine))
+        self.low_line_item = self.scene.addPath(QPainterPath(), QPen(QColor(200, 0, 0), 2, Qt.DashLine))
+        self.limit_point_item = MarkerItem([], [], 5, QPen(QColor(200, 0, 0), 1), QBrush(QColor(255, 200, 200)))
+        self.violation_item = MarkerItem([], [], 4, QPen(QColor(255, 0, 0), 1), QBrush(QColor(255, 0, 0, 100)))
+        self.crossing_item = MarkerItem([], [], 9, QPen(QColor(0, 150, 0), 2), QBrush(QColor(0, 255, 0, 150)))
+        for item in (self.limit_point_item, self.violation_item, self.crossing_item):
+            self.scene.addItem(item)
+        self.create_labels()
+        self.plot_items = self.scene.items()
+        
+        self.empty_text = self.scene.addText("Load CSV file and select columns to display waveform", QFont("Arial", 12))
+        self.empty_text.setPos(150, 150)
+        self.set_plot_visible(False)
+        
+    def create_labels(self):
+        """Add the title, axis labels and tick labels"""
+        # Title
+        title = self.scene.addText("Waveform Limit Analysis", QFont("Arial", 14, QFont.Bold))
+        title_rect = title.boundingRect()
+        title.setPos(
+            (600 - title_rect.width()) / 2, 
+            10
+        )
+        
+        # X-axis label
+        x_label = self.scene.addText("Time", QFont("Arial", 12))
+        x_label_rect = x_label.boundingRect()
+        x_label.setPos(
+            (600 - x_label_rect.width()) / 2, 
+            self.plot_rect.bottom() + 30
+        )
         
-    def set_data(self, time_data, waveform_data, limit_arrays=None, crossing_points=None):
-        """Set the data to be plotted"""
-        self.time_data = time_data
-        self.waveform_data = waveform_data
-        self.limit_arrays = limit_arrays
+        # Y-axis label (rotated) - positioned further left to avoid overlap
+        y_label = self.scene.addText("Amplitude", QFont("Arial", 12))
+        y_label.setRotation(-90)
+        y_label_rect = y_label.boundingRect()
+        y_label.setPos(
+            -10, 
+            (self.plot_rect.height() + y_label_rect.width()) / 2 + self.plot_rect.top()
+        )
+        
+        # Tick labels, filled in by draw_tick_labels
+        font = QFont("Arial", 9)
+        self.x_tick_items = [self.scene.addText("", font) for _ in range(6)]
+        self.y_tick_items = [self.scene.addText("", font) for _ in range(6)]
+        
+    def set_plot_visible(self, visible):
+        """Show the plot items, or the empty-plot message instead"""
+        if visible == self.plot_visible:
+            return
+        self.plot_visible = visible
+        for item in self.plot_items:
+            item.setVisible(visible)
+        self.empty_text.setVisible(not visible)
+        
+    def set_data(self, waveform, limit_mask=None, crossing_points=None, violation_mask=None):
+        """Set the Waveform to be plotted, or None for an empty plot
+
+        violation_mask marks the samples outside the limits, as found by the
+        limit test; without it no violations are drawn. The waveform's
+        bounds and min/max pyramid are computed once and kept with it, not
+        per redraw.
+        """
+        self.waveform = waveform
+        self.limit_mask = limit_mask
         self.crossing_points = crossing_points or []
+        self.violation_mask = violation_mask
         self.update_plot()
         
     def update_plot(self):
-        """Update the plot with current data"""
-        self.scene.clear()
-        
-        if self.time_data is None or self.waveform_data is None:
-            self.draw_empty_plot()
+        """Update the plot items whose data or axes changed
+
+        The items live as long as the widget. Each layer is redrawn only when
+        its own inputs or the axis ranges change, so showing new limits or a
+        new test result leaves the waveform and labels alone.
+        """
+        if inputs_changed(self.drawn_inputs, 'data', self.waveform):
+            self.summarise_data()
+        self.set_plot_visible(self.data_bounds is not None)
+        if self.data_bounds is None:
             return
             
         # Calculate plot boundaries
         self.calculate_plot_rect()
         
         # Draw plot elements
-        self.draw_grid()
-        self.draw_axes()
-        self.draw_waveform()
-        self.draw_limit_arrays()
+        self.draw_limit_mask()
         self.draw_violations()
         self.draw_crossing_points()
-        self.draw_labels()
+        self.draw_tick_labels()
         
-        # Fit view to content
-        self.fitInView(self.scene.itemsBoundingRect(), Qt.KeepAspectRatio)
+        # Fit view to content, which redraws the waveform for the view
+        self.fit_to_view()
+        
+    def summarise_data(self):
+        """Cache the time and amplitude bounds of new data"""
+        self.data_bounds = self.waveform.bounds() if self.waveform is not None else None
         
     def calculate_plot_rect(self):
-        """Calculate the plotting rectangle based on data bounds"""
-        if len(self.time_data) == 0 or len(self.waveform_data) == 0:
-            return
-            
-        time_min, time_max = min(self.time_data), max(self.time_data)
-        amp_min, amp_max = min(self.waveform_data), max(self.waveform_data)
+        """Calculate the data range shown in the plotting rectangle"""
+        time_min, time_max, amp_min, amp_max = self.data_bounds
         
         # Extend amplitude range to include limit values if they exist
-        if self.limit_arrays:
-            if self.limit_arrays['high_limits']:
-                amp_max = max(amp_max, max(self.limit_arrays['high_limits']))
-            if self.limit_arrays['low_limits']:
-                amp_min = min(amp_min, min(self.limit_arrays['low_limits']))
+        if self.limit_mask is not None:
+            amp_min = min(amp_min, self.limit_mask.value_min)
+            amp_max = max(amp_max, self.limit_mask.value_max)
         
         # Add padding
         time_range = time_max - time_min if time_max != time_min else 1
@@ -606,18 +929,12 @@ class WaveformPlotWidget(QGraphicsView):
         time_padding = time_range * 0.05
         amp_padding = amp_range * 0.1
         
-        self.time_min = time_min - time_padding
-        self.time_max = time_max + time_padding
-        self.amp_min = amp_min - amp_padding
-        self.amp_max = amp_max + amp_padding
-        
-        # Define plot rectangle (in scene coordinates)
-        self.plot_rect = QRectF(
-            self.margin, 
-            self.margin, 
-            600 - 2 * self.margin, 
-            400 - 2 * self.margin
-        )
+        view_range = (time_min - time_padding, time_max + time_padding,
+                      amp_min - amp_padding, amp_max + amp_padding)
+        # Kept as the same object while unchanged, so layers see no change
+        if view_range != self.view_range:
+            self.view_range = view_range
+            self.time_min, self.time_max, self.amp_min, self.amp_max = view_range
         
     def data_to_scene(self, time_val, amp_val):
         """Convert data coordinates to scene coordinates"""
@@ -628,208 +945,107 @@ class WaveformPlotWidget(QGraphicsView):
         y = self.plot_rect.bottom() - (amp_val - self.amp_min) / (self.amp_max - self.amp_min) * self.plot_rect.height()
         return QPointF(x, y)
         
-    def interpolate_limit(self, time_val, time_points, limit_values):
-        """Interpolate limit value at given time"""
-        if not time_points or not limit_values:
+    def data_to_scene_arrays(self, times, amps):
+        """Convert arrays of data coordinates to scene x and y arrays"""
+        if self.time_max == self.time_min or self.amp_max == self.amp_min:
+            return (np.full(len(times), self.plot_rect.left()),
+                    np.full(len(amps), self.plot_rect.bottom()))
+            
+        xs = self.plot_rect.left() + (times - self.time_min) / (self.time_max - self.time_min) * self.plot_rect.width()
+        ys = self.plot_rect.bottom() - (amps - self.amp_min) / (self.amp_max - self.amp_min) * self.plot_rect.height()
+        return xs, ys
+        
+    def visible_time_range(self):
+        """Return the data time range and pixel width of the plot in the viewport"""
+        visible = self.mapToScene(self.viewport().rect()).boundingRect()
+        left = max(visible.left(), self.plot_rect.left())
+        right = min(visible.right(), self.plot_rect.right())
+        if right <= left:
             return None
             
-        # Handle edge cases
-        if time_val <= time_points[0]:
-            return limit_values[0]
-        if time_val >= time_points[-1]:
-            return limit_values[-1]
-            
-        # Find interpolation points
-        for i in range(len(time_points) - 1):
-            if time_points[i] <= time_val <= time_points[i + 1]:
-                # Linear interpolation
-                t1, t2 = time_points[i], time_points[i + 1]
-                v1, v2 = limit_values[i], limit_values[i + 1]
-                ratio = (time_val - t1) / (t2 - t1) if t2 != t1 else 0
-                return v1 + ratio * (v2 - v1)
-                
-        return limit_values[0]  # Fallback
-        
-    def draw_empty_plot(self):
-        """Draw empty plot with message"""
-        text = self.scene.addText("Load CSV file and select columns to display waveform", QFont("Arial", 12))
-        text.setPos(150, 150)
-        
-    def draw_grid(self):
-        """Draw grid lines"""
-        pen = QPen(QColor(200, 200, 200), 1, Qt.DotLine)
-        
-        # Vertical grid lines
-        for i in range(6):
-            x = self.plot_rect.left() + i * self.plot_rect.width() / 5
-            line = self.scene.addLine(x, self.plot_rect.top(), x, self.plot_rect.bottom(), pen)
-            
-        # Horizontal grid lines
-        for i in range(6):
-            y = self.plot_rect.top() + i * self.plot_rect.height() / 5
-            line = self.scene.addLine(self.plot_rect.left(), y, self.plot_rect.right(), y, pen)
-            
-    def draw_axes(self):
-        """Draw axes"""
-        pen = QPen(QColor(0, 0, 0), 2)
-        
-        # X-axis
-        self.scene.addLine(
-            self.plot_rect.left(), 
-            self.plot_rect.bottom(), 
-            self.plot_rect.right(), 
-            self.plot_rect.bottom(), 
-            pen
-        )
+        scale = (self.time_max - self.time_min) / self.plot_rect.width()
+        time_min = self.time_min + (left - self.plot_rect.left()) * scale
+        time_max = self.time_min + (right - self.plot_rect.left()) * scale
+        pixels = self.mapFromScene(QPointF(right, 0)).x() - self.mapFromScene(QPointF(left, 0)).x()
+        return time_min, time_max, max(pixels, 1)
         
-        # Y-axis
-        self.scene.addLine(
-            self.plot_rect.left(), 
-            self.plot_rect.top(), 
-            self.plot_rect.left(), 
-            self.plot_rect.bottom(), 
-            pen
-        )
-        
-    def draw_waveform(self):
-        """Draw the main waveform"""
-        if len(self.time_data) < 2:
+    def refresh_waveform(self):
+        """Redraw the waveform from the pyramid level matching the current view"""
+        if not self.plot_visible:
             return
             
-        pen = QPen(QColor(0, 100, 200), 2)
-        
-        # Draw line segments instead of polygon to avoid connecting last to first
-        for i in range(len(self.time_data) - 1):
-            p1 = self.data_to_scene(self.time_data[i], self.waveform_data[i])
-            p2 = self.data_to_scene(self.time_data[i + 1], self.waveform_data[i + 1])
-            self.scene.addLine(p1.x(), p1.y(), p2.x(), p2.y(), pen)
-            
-    def draw_limit_arrays(self):
-        """Draw limit arrays if they exist"""
-        if not self.limit_arrays:
+        view = self.visible_time_range()
+        if view is None or len(self.waveform) < 2:
+            self.waveform_item.setPath(QPainterPath())
             return
             
-        time_points = self.limit_arrays['time_points']
-        high_limits = self.limit_arrays['high_limits']
-        low_limits = self.limit_arrays['low_limits']
-        
-        if len(time_points) < 2:
+        time_min, time_max, pixels = view
+        times, amps = self.waveform.pyramid.decimate(pixels, time_min, time_max)
+        xs, ys = self.data_to_scene_arrays(times, amps)
+        self.waveform_item.setPath(polyline_path(xs, ys))
+            
+    def draw_limit_mask(self):
+        """Draw the limit lines and points of the limit mask"""
+        if not inputs_changed(self.drawn_inputs, 'limit_mask', self.view_range, self.limit_mask):
+            return
+        if self.limit_mask is None or len(self.limit_mask) < 2:
+            self.high_line_item.setPath(QPainterPath())
+            self.low_line_item.setPath(QPainterPath())
+            self.limit_point_item.set_points([], [])
             return
             
-        # Draw high limit line as connected line segments
-        high_pen = QPen(QColor(200, 0, 0), 2, Qt.DashLine)
-        for i in range(len(time_points) - 1):
-            p1 = self.data_to_scene(time_points[i], high_limits[i])
-            p2 = self.data_to_scene(time_points[i + 1], high_limits[i + 1])
-            self.scene.addLine(p1.x(), p1.y(), p2.x(), p2.y(), high_pen)
-            
-        # Draw low limit line as connected line segments
-        low_pen = QPen(QColor(200, 0, 0), 2, Qt.DashLine)
-        for i in range(len(time_points) - 1):
-            p1 = self.data_to_scene(time_points[i], low_limits[i])
-            p2 = self.data_to_scene(time_points[i + 1], low_limits[i + 1])
-            self.scene.addLine(p1.x(), p1.y(), p2.x(), p2.y(), low_pen)
-            
-        # Draw limit points
-        for t, h in zip(time_points, high_limits):
-            point = self.data_to_scene(t, h)
-            self.scene.addEllipse(point.x() - 3, point.y() - 3, 6, 6, 
-                                 QPen(QColor(200, 0, 0), 1), QBrush(QColor(255, 200, 200)))
-            
-        for t, l in zip(time_points, low_limits):
-            point = self.data_to_scene(t, l)
-            self.scene.addEllipse(point.x() - 3, point.y() - 3, 6, 6, 
-                                 QPen(QColor(200, 0, 0), 1), QBrush(QColor(255, 200, 200)))
+        xs, high_ys = self.data_to_scene_arrays(self.limit_mask.time_points, self.limit_mask.high_limits)
+        _, low_ys = self.data_to_scene_arrays(self.limit_mask.time_points, self.limit_mask.low_limits)
+        self.high_line_item.setPath(polyline_path(xs, high_ys))
+        self.low_line_item.setPath(polyline_path(xs, low_ys))
+        self.limit_point_item.set_points(np.concatenate((xs, xs)), np.concatenate((high_ys, low_ys)))
             
     def draw_violations(self):
-        """Draw violation points"""
-        if not self.limit_arrays:
+        """Draw the samples the limit test found outside the limits"""
+        if not inputs_changed(self.drawn_inputs, 'violations', self.view_range, self.violation_mask,
+                              self.waveform):
+            return
+        if self.violation_mask is None or len(self.violation_mask) != len(self.waveform):
+            self.violation_item.set_points([], [])
             return
             
-        pen = QPen(QColor(255, 0, 0), 1)
-        brush = QBrush(QColor(255, 0, 0, 100))
-        
-        time_points = self.limit_arrays['time_points']
-        high_limits = self.limit_arrays['high_limits']
-        low_limits = self.limit_arrays['low_limits']
-        
-        for time_val, amp_val in zip(self.time_data, self.waveform_data):
-            high_limit = self.interpolate_limit(time_val, time_points, high_limits)
-            low_limit = self.interpolate_limit(time_val, time_points, low_limits)
-            
-            if high_limit is not None and low_limit is not None:
-                if amp_val > high_limit or amp_val < low_limit:
-                    point = self.data_to_scene(time_val, amp_val)
-                    circle = self.scene.addEllipse(
-                        point.x() - 2, point.y() - 2, 4, 4, 
-                        pen, brush
-                    )
+        violations = np.flatnonzero(self.violation_mask)
+        xs, ys = self.data_to_scene_arrays(self.waveform.time_data[violations],
+                                           self.waveform.waveform_data[violations])
+        self.violation_item.set_points(xs, ys)
                 
     def draw_crossing_points(self):
-        """Draw crossing points"""
-        if not self.crossing_points:
+        """Draw crossing points where the waveform meets the limit"""
+        crossing_points = self.crossing_points or None
+        if not inputs_changed(self.drawn_inputs, 'crossings', self.view_range, crossing_points):
+            return
+        if crossing_points is None:
+            self.crossing_item.set_points([], [])
             return
             
-        pen = QPen(QColor(0, 150, 0), 2)
-        brush = QBrush(QColor(0, 255, 0, 150))
-        
-        for cp in self.crossing_points:
-            point = self.data_to_scene(cp['time'], cp['value'])
-            circle = self.scene.addEllipse(
-                point.x() - 5, point.y() - 5, 10, 10, 
-                pen, brush
-            )
+        times = np.array([cp.get('crossing_time', cp['time']) for cp in crossing_points])
+        values = np.array([cp.get('crossing_value', cp['value']) for cp in crossing_points])
+        xs, ys = self.data_to_scene_arrays(times, values)
+        self.crossing_item.set_points(xs, ys)
             
-    def draw_labels(self):
-        """Draw axis labels and title"""
-        # Title
-        title = self.scene.addText("Waveform Limit Analysis", QFont("Arial", 14, QFont.Bold))
-        title_rect = title.boundingRect()
-        title.setPos(
-            (600 - title_rect.width()) / 2, 
-            10
-        )
-        
-        # X-axis label
-        x_label = self.scene.addText("Time", QFont("Arial", 12))
-        x_label_rect = x_label.boundingRect()
-        x_label.setPos(
-            (600 - x_label_rect.width()) / 2, 
-            self.plot_rect.bottom() + 30
-        )
-        
-        # Y-axis label (rotated) - positioned further left to avoid overlap
-        y_label = self.scene.addText("Amplitude", QFont("Arial", 12))
-        y_label.setRotation(-90)
-        y_label_rect = y_label.boundingRect()
-        y_label.setPos(
-            -10, 
-            (self.plot_rect.height() + y_label_rect.width()) / 2 + self.plot_rect.top()
-        )
-        
-        # Draw tick labels
-        self.draw_tick_labels()
-        
     def draw_tick_labels(self):
         """Draw tick labels on axes"""
-        if self.time_data is None or self.waveform_data is None:
+        if not inputs_changed(self.drawn_inputs, 'ticks', self.view_range):
             return
             
-        font = QFont("Arial", 9)
-        
         # X-axis ticks
-        for i in range(6):
+        for i, text in enumerate(self.x_tick_items):
             x_pos = self.plot_rect.left() + i * self.plot_rect.width() / 5
             time_val = self.time_min + i * (self.time_max - self.time_min) / 5
-            text = self.scene.addText(f"{time_val:.2f}", font)
+            text.setPlainText(f"{time_val:.2f}")
             text_rect = text.boundingRect()
             text.setPos(x_pos - text_rect.width() / 2, self.plot_rect.bottom() + 5)
             
         # Y-axis ticks - positioned with more spacing from y-axis
-        for i in range(6):
+        for i, text in enumerate(self.y_tick_items):
             y_pos = self.plot_rect.bottom() - i * self.plot_rect.height() / 5
             amp_val = self.amp_min + i * (self.amp_max - self.amp_min) / 5
-            text = self.scene.addText(f"{amp_val:.2f}", font)
+            text.setPlainText(f"{amp_val:.2f}")
             text_rect = text.boundingRect()
             text.setPos(self.plot_rect.left() - text_rect.width() - 15, y_pos - text_rect.height() / 2)
             
@@ -838,22 +1054,176 @@ class WaveformPlotWidget(QGraphicsView):
         factor = 1.15
         if event.angleDelta().y() < 0:
             factor = 1.0 / factor
+        self.zoom(factor)
+        
+    def zoom(self, factor):
+        """Scale the view and redraw the waveform at the new resolution"""
         self.scale(factor, factor)
+        self.refresh_waveform()
+        
+    def fit_to_view(self):
+        """Fit the whole plot into the view"""
+        self.fitInView(self.scene.itemsBoundingRect(), Qt.KeepAspectRatio)
+        self.refresh_waveform()
+        
+    def scrollContentsBy(self, dx, dy):
+        super().scrollContentsBy(dx, dy)
+        self.refresh_waveform()
+        
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.refresh_waveform()
+
+
+class JobCancelled(Exception):
+    """Raised inside a background job once it has been cancelled"""
+
+
+class JobSignals(QObject):
+    progress = Signal(object, float)  # job, fraction done
+    finished = Signal(object, object)  # job, result
+    failed = Signal(object, str)  # job, error message
+
+
+class BackgroundJob(QRunnable):
+    """Runs work(job, *args) on a thread pool with progress and cancellation
+
+    The work function reports progress through job.report_progress, which
+    raises JobCancelled once cancel() has been called, so long loops stop at
+    their next progress report.
+    """
+    
+    def __init__(self, kind, message, work, *args):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.kind = kind
+        self.message = message
+        self.work = work
+        self.args = args
+        self.signals = JobSignals()
+        self._cancelled = threading.Event()
+        
+    def cancel(self):
+        self._cancelled.set()
+        
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+        
+    def report_progress(self, fraction):
+        if self._cancelled.is_set():
+            raise JobCancelled()
+        self.signals.progress.emit(self, fraction)
+        
+    def run(self):
+        try:
+            result = self.work(self, *self.args)
+        except JobCancelled:
+            return
+        except Exception as e:
+            if not self.is_cancelled():
+                self.signals.failed.emit(self, str(e))
+            return
+            
+        if not self.is_cancelled():
+            self.signals.finished.emit(self, result)
+
+
+def scan_columns_task(job, source):
+    """Background work: infer the type and range of every column"""
+    stats = source.scan_columns(progress=job.report_progress)
+    job.report_progress(1.0)
+    return stats
+
+
+def read_columns_task(job, source, amp_column, time_column, amplitude_dtype='float64'):
+    """Background work: parse the selected columns into a Waveform with its plot pyramid"""
+    time_data, waveform_data = source.read_columns(amp_column, time_column, progress=job.report_progress)
+    job.report_progress(1.0)
+    # Sortedness and bounds come from the column statistics when scanned
+    waveform = Waveform(time_data, waveform_data, amplitude_dtype, source.time_sorted(time_column),
+                        source.column_bounds(amp_column, time_column))
+    waveform.pyramid  # Built here rather than on the first redraw
+    return waveform
+
+
+def limit_test_task(job, time_data, waveform_data, limit_mask, previous=None, previous_mask=None, align=None):
+    """Background work: run the limit test, incrementally if a previous result is given
+
+    With an alignment method the mask is moved by the capture's offset from
+    the line between the limits before testing.
+    """
+    time_shift = None
+    tested_mask = limit_mask
+    if align is not None:
+        time_shift = TimeAligner.from_mask(limit_mask, align).estimate(time_data, waveform_data)
+        tested_mask = limit_mask.shifted(time_shift)
+    if previous is not None and previous.time_shift == time_shift:
+        old_mask = previous_mask if time_shift is None else previous_mask.shifted(time_shift)
+        result = retest_limits(previous, time_data, waveform_data, old_mask, tested_mask,
+                               progress=job.report_progress)
+    else:
+        result = run_limit_test(time_data, waveform_data, tested_mask, progress=job.report_progress,
+                                workers=os.cpu_count() or 1)
+    result.time_shift = time_shift
+    return result, limit_mask
+
+
+def train_limits_task(job, file_paths, amp_column, time_column, method, points):
+    """Background work: stream golden captures into an envelope and simplify it to a mask"""
+    envelope = train_from_files(file_paths, amp_column, time_column, progress=job.report_progress)
+    low, high = envelope.value_range
+    margin = (high - low) * LimitDesignerDialog.ENVELOPE_MARGIN
+    return envelope.to_limit_mask(points, method, margin=margin), len(file_paths)
+
+
+def multi_channel_task(job, source, assignments, time_column):
+    """Background work: parse every assigned channel in one pass and test them all"""
+    channels = source.read_channels(list(assignments), time_column,
+                                    progress=lambda fraction: job.report_progress(fraction * 0.5))
+    return run_multi_channel_test(channels, assignments, workers=os.cpu_count() or 1,
+                                  progress=lambda fraction: job.report_progress(0.5 + fraction * 0.5))
 
 
 class WaveformLimitTester(QMainWindow):
+    job_done = Signal()  # The current background job finished, failed or was cancelled
+    
+    # Live acquisition redraws at most this many times a second
+    LIVE_FRAME_RATE = 20
+    LIVE_SOURCES = [("Tail file", 'tail'), ("TCP", 'tcp'), ("UDP", 'udp'), ("Stdin", 'stdin')]
+    ALIGN_CHOICES = [("No trigger alignment", None), ("Align on first edge", 'edge'),
+                     ("Align by cross-correlation", 'correlation')]
+    
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Waveform Limit Analysis")
         self.setGeometry(100, 100, 1400, 800)
         
         # Data storage
-        self.csv_data = []
+        self.data_source = None
         self.csv_headers = []
-        self.waveform_data = None
-        self.time_data = None
-        self.limit_arrays = None
+        self.waveform = None  # Waveform of the selected columns, shared with the plot and designer
+        self.limit_mask = None
         self.crossing_points = []
+        self.test_result = None
+        self.tested_mask = None  # The limit mask test_result was computed with
+        self.source_name = ""
+        
+        # Multi-channel testing: limit arrays loaded from files, by name
+        self.limit_library = {}
+        self.channel_results = {}
+        
+        # Named masks saved between sessions
+        self.mask_library = MaskLibrary()
+        self.library_product = ""
+        
+        # Loading and testing run here so the window stays responsive
+        self.thread_pool = QThreadPool.globalInstance()
+        self.current_job = None
+        
+        # Live acquisition, polled by a timer at the frame rate
+        self.live_monitor = None
+        self.live_timer = QTimer(self)
+        self.live_timer.timeout.connect(self.on_live_tick)
         
         self.setup_ui()
         
@@ -901,6 +1271,42 @@ class WaveformLimitTester(QMainWindow):
         
         control_layout.addWidget(file_group)
         
+        # Live acquisition section
+        live_group = QGroupBox("Live Acquisition")
+        live_layout = QGridLayout(live_group)
+        
+        self.live_source_combo = QComboBox()
+        for label, kind in self.LIVE_SOURCES:
+            self.live_source_combo.addItem(label, kind)
+        live_layout.addWidget(self.live_source_combo, 0, 0)
+        
+        self.live_target_edit = QLineEdit()
+        self.live_target_edit.setPlaceholderText("File path or host:port")
+        live_layout.addWidget(self.live_target_edit, 0, 1, 1, 3)
+        
+        live_layout.addWidget(QLabel("Value field:"), 1, 0)
+        self.live_value_spinbox = QSpinBox()
+        self.live_value_spinbox.setRange(0, 999)
+        self.live_value_spinbox.setValue(1)
+        live_layout.addWidget(self.live_value_spinbox, 1, 1)
+        
+        live_layout.addWidget(QLabel("Time field:"), 1, 2)
+        self.live_time_spinbox = QSpinBox()
+        self.live_time_spinbox.setRange(-1, 999)
+        self.live_time_spinbox.setSpecialValueText("none")  # Shown for -1: time is the sample index
+        self.live_time_spinbox.setValue(0)
+        live_layout.addWidget(self.live_time_spinbox, 1, 3)
+        
+        self.live_button = QPushButton("Start Live")
+        self.live_button.clicked.connect(self.toggle_live)
+        live_layout.addWidget(self.live_button, 2, 0, 1, 4)
+        
+        self.live_status_label = QLabel("Not running")
+        self.live_status_label.setWordWrap(True)
+        live_layout.addWidget(self.live_status_label, 3, 0, 1, 4)
+        
+        control_layout.addWidget(live_group)
+        
         # Column selection section
         column_group = QGroupBox("Column Selection")
         column_layout = QGridLayout(column_group)
@@ -919,6 +1325,11 @@ class WaveformLimitTester(QMainWindow):
         self.amplitude_column_combo.currentTextChanged.connect(self.update_plot_data)
         column_layout.addWidget(self.amplitude_column_combo, 1, 1)
         
+        self.float32_checkbox = QCheckBox("Store as float32")
+        self.float32_checkbox.setToolTip("Halve the memory of the amplitude column; keeps about 7 significant digits")
+        self.float32_checkbox.toggled.connect(self.update_plot_data)
+        column_layout.addWidget(self.float32_checkbox, 1, 2)
+        
         control_layout.addWidget(column_group)
         
         # Limit setting section
@@ -929,10 +1340,43 @@ class WaveformLimitTester(QMainWindow):
         self.design_limits_button.clicked.connect(self.open_limit_designer)
         limit_layout.addWidget(self.design_limits_button)
         
+        self.train_limits_button = QPushButton("Train from Golden Captures...")
+        self.train_limits_button.setToolTip("Build limits from the envelope of known-good capture files, "
+                                            "using the selected columns")
+        self.train_limits_button.clicked.connect(self.train_limits)
+        limit_layout.addWidget(self.train_limits_button)
+        
         self.limits_status_label = QLabel("No limits defined")
         self.limits_status_label.setWordWrap(True)
         limit_layout.addWidget(self.limits_status_label)
         
+        file_buttons = QHBoxLayout()
+        self.open_limits_button = QPushButton("Open Limits...")
+        self.open_limits_button.clicked.connect(self.open_limits)
+        file_buttons.addWidget(self.open_limits_button)
+        
+        self.save_limits_button = QPushButton("Save Limits...")
+        self.save_limits_button.clicked.connect(self.save_limits)
+        file_buttons.addWidget(self.save_limits_button)
+        limit_layout.addLayout(file_buttons)
+        
+        library_buttons = QHBoxLayout()
+        self.load_library_button = QPushButton("Load from Library...")
+        self.load_library_button.clicked.connect(self.load_from_library)
+        library_buttons.addWidget(self.load_library_button)
+        
+        self.save_library_button = QPushButton("Save to Library...")
+        self.save_library_button.clicked.connect(self.save_to_library)
+        library_buttons.addWidget(self.save_library_button)
+        limit_layout.addLayout(library_buttons)
+        
+        self.align_combo = QComboBox()
+        for label, method in self.ALIGN_CHOICES:
+            self.align_combo.addItem(label, method)
+        self.align_combo.setToolTip("Shift the limits by the capture's trigger offset from the line between "
+                                    "the limits before testing")
+        limit_layout.addWidget(self.align_combo)
+        
         self.apply_limits_button = QPushButton("Apply Limits & Test")
         self.apply_limits_button.clicked.connect(self.apply_limits)
         limit_layout.addWidget(self.apply_limits_button)
@@ -943,6 +1387,31 @@ class WaveformLimitTester(QMainWindow):
         
         control_layout.addWidget(limit_group)
         
+        # Multi-channel section
+        channel_group = QGroupBox("Multi-Channel Test")
+        channel_layout = QVBoxLayout(channel_group)
+        
+        self.channel_table = QTableWidget()
+        self.channel_table.setColumnCount(7)
+        self.channel_table.setHorizontalHeaderLabels(["Channel", "Limits", "Points", "Above", "Below", "Crossings", "Result"])
+        self.channel_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.channel_table.verticalHeader().setVisible(False)
+        self.channel_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.channel_table.cellDoubleClicked.connect(self.on_channel_double_clicked)
+        channel_layout.addWidget(self.channel_table)
+        
+        channel_buttons = QHBoxLayout()
+        self.load_channel_limits_button = QPushButton("Load Limit File...")
+        self.load_channel_limits_button.clicked.connect(self.load_channel_limits)
+        channel_buttons.addWidget(self.load_channel_limits_button)
+        
+        self.test_channels_button = QPushButton("Test All Channels")
+        self.test_channels_button.clicked.connect(self.test_all_channels)
+        channel_buttons.addWidget(self.test_channels_button)
+        channel_layout.addLayout(channel_buttons)
+        
+        control_layout.addWidget(channel_group)
+        
         # Results section
         results_group = QGroupBox("Test Results")
         results_layout = QVBoxLayout(results_group)
@@ -952,8 +1421,25 @@ class WaveformLimitTester(QMainWindow):
         self.results_text.setFont(QFont("Courier", 9))
         results_layout.addWidget(self.results_text)
         
+        self.export_events_button = QPushButton("Export Excursions...")
+        self.export_events_button.clicked.connect(self.export_events)
+        results_layout.addWidget(self.export_events_button)
+        
         control_layout.addWidget(results_group)
         
+        # Background job progress, hidden while idle
+        progress_layout = QHBoxLayout()
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        progress_layout.addWidget(self.progress_bar)
+        
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.clicked.connect(self.cancel_job)
+        progress_layout.addWidget(self.cancel_button)
+        
+        control_layout.addLayout(progress_layout)
+        self.set_progress_visible(False)
+        
         # Add stretch to push everything to top
         control_layout.addStretch()
         
@@ -971,16 +1457,15 @@ class WaveformLimitTester(QMainWindow):
         controls_layout = QHBoxLayout()
         
         zoom_in_btn = QPushButton("Zoom In")
-        zoom_in_btn.clicked.connect(lambda: self.plot_widget.scale(1.2, 1.2))
+        zoom_in_btn.clicked.connect(lambda: self.plot_widget.zoom(1.2))
         controls_layout.addWidget(zoom_in_btn)
         
         zoom_out_btn = QPushButton("Zoom Out")
-        zoom_out_btn.clicked.connect(lambda: self.plot_widget.scale(0.8, 0.8))
+        zoom_out_btn.clicked.connect(lambda: self.plot_widget.zoom(0.8))
         controls_layout.addWidget(zoom_out_btn)
         
         fit_btn = QPushButton("Fit to View")
-        fit_btn.clicked.connect(lambda: self.plot_widget.fitInView(
-            self.plot_widget.scene.itemsBoundingRect(), Qt.KeepAspectRatio))
+        fit_btn.clicked.connect(self.plot_widget.fit_to_view)
         controls_layout.addWidget(fit_btn)
         
         controls_layout.addStretch()
@@ -992,21 +1477,24 @@ class WaveformLimitTester(QMainWindow):
         """Load built-in sample data"""
         try:
             # Generate sample data
-            self.csv_data = []
-            self.csv_headers = ["Time", "Voltage", "Current"]
+            rows = []
+            headers = ["Time", "Voltage", "Current"]
             
             for i in range(100):
                 time = i * 0.1
                 voltage = 3.3 + math.sin(time * 2) * 1.2 + math.sin(time * 5) * 0.3 + random.uniform(-0.1, 0.1)
                 current = 1.5 + math.cos(time * 1.5) * 0.8 + random.uniform(-0.05, 0.05)
-                self.csv_data.append([f"{time:.2f}", f"{voltage:.3f}", f"{current:.3f}"])
+                rows.append([f"{time:.2f}", f"{voltage:.3f}", f"{current:.3f}"])
             
-            # Update column selection
-            self.update_column_combos()
+            self.data_source = RowWaveformSource(headers, rows)
+            self.csv_headers = headers
+            self.source_name = "Sample Data Loaded"
             
-            self.file_label.setText(f"Sample Data Loaded\n"
-                                  f"Rows: {len(self.csv_data)}\n"
-                                  f"Columns: {self.csv_headers}")
+            # List the columns now, so a cancelled or failed scan leaves them
+            # selectable; the scan adds their types and loads the defaults
+            self.update_column_combos(load=False)
+            self.scan_columns()
+            self.update_file_label()
             
             self.results_text.setText("Sample data loaded successfully. Select columns and design limits for testing.")
             
@@ -1020,41 +1508,59 @@ class WaveformLimitTester(QMainWindow):
         
         if file_path:
             try:
-                # Load CSV data
-                self.csv_data = []
-                self.csv_headers = []
+                # Only the header and delimiter are read here; columns are
+                # parsed on demand when they are selected
+                self.data_source = CsvWaveformSource(file_path)
+                self.csv_headers = self.data_source.headers
+                self.source_name = f"Loaded: {file_path.split('/')[-1]}"
                 
-                with open(file_path, 'r', newline='', encoding='utf-8') as csvfile:
-                    # Try to detect delimiter
-                    sample = csvfile.read(1024)
-                    csvfile.seek(0)
-                    sniffer = csv.Sniffer()
-                    delimiter = sniffer.sniff(sample).delimiter
-                    
-                    reader = csv.reader(csvfile, delimiter=delimiter)
-                    
-                    # Read headers
-                    self.csv_headers = next(reader)
-                    
-                    # Read data
-                    for row in reader:
-                        if row:  # Skip empty rows
-                            self.csv_data.append(row)
-                
-                # Update column selection dropdowns
-                self.update_column_combos()
-                
-                self.file_label.setText(f"Loaded: {file_path.split('/')[-1]}\n"
-                                      f"Rows: {len(self.csv_data)}\n"
-                                      f"Columns: {self.csv_headers}")
+                # List the columns now, so a cancelled or failed scan leaves them
+                # selectable; the scan adds their types and loads the defaults
+                self.update_column_combos(load=False)
+                self.scan_columns()
+                self.update_file_label()
                 
                 self.results_text.setText("File loaded successfully. Select columns and design limits for testing.")
                 
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to load CSV file:\n{str(e)}")
                 
-    def update_column_combos(self):
-        """Update the column selection combo boxes"""
+    def scan_columns(self):
+        """Infer the column types and ranges in one background pass"""
+        self.start_job('scan', "Scanning columns", scan_columns_task, self.on_columns_scanned,
+                       self.data_source)
+        
+    def on_columns_scanned(self, stats):
+        """Fill the column selection now that the column types are known"""
+        self.update_file_label()
+        self.update_column_combos()
+        
+    def update_file_label(self):
+        """Show the loaded source; the row count is known after the first parse"""
+        rows = self.data_source.row_count if self.data_source.row_count is not None else "loading..."
+        parser = getattr(self.data_source, 'backend', 'python')
+        if self.data_source.last_parse is not None:
+            parser = self.data_source.last_parse.describe()
+        text = (f"{self.source_name}\n"
+                f"Rows: {rows}\n"
+                f"Columns: {self.csv_headers}\n"
+                f"Parser: {parser}")
+        if self.waveform is not None and len(self.waveform):
+            text += (f"\nLoaded: {len(self.waveform)} samples, {self.waveform.nbytes / 2 ** 20:.1f} MiB "
+                     f"({self.waveform.nbytes / len(self.waveform):.0f} bytes/sample, {self.waveform.amplitude_dtype})")
+            if isinstance(self.waveform.time_data, UniformTime):
+                text += f"\nTime: uniform, every {self.waveform.time_data.interval:g} (not stored)"
+        self.file_label.setText(text)
+        
+    def update_column_combos(self, load=True):
+        """Update the column selection combo boxes
+
+        With load=False the default columns are selected but not loaded.
+        """
+        # Populate quietly so the selected columns are parsed only once
+        for widget in (self.time_column_combo, self.amplitude_column_combo, self.auto_time_checkbox):
+            widget.blockSignals(True)
+            
         self.time_column_combo.clear()
         self.amplitude_column_combo.clear()
         
@@ -1062,14 +1568,135 @@ class WaveformLimitTester(QMainWindow):
             self.time_column_combo.addItems(self.csv_headers)
             self.amplitude_column_combo.addItems(self.csv_headers)
             
-            # Set default selections
-            if len(self.csv_headers) >= 2:
-                self.time_column_combo.setCurrentIndex(0)
-                self.amplitude_column_combo.setCurrentIndex(1)
-            elif len(self.csv_headers) == 1:
-                self.amplitude_column_combo.setCurrentIndex(0)
+            # Grey out text columns and describe each column in its tooltip
+            stats = self.data_source.column_stats
+            numeric = list(range(len(self.csv_headers)))
+            if stats is not None:
+                numeric = [index for index, column in enumerate(stats) if column.numeric]
+                for combo in (self.time_column_combo, self.amplitude_column_combo):
+                    for index, column in enumerate(stats):
+                        combo.setItemData(index, column.describe(), Qt.ItemDataRole.ToolTipRole)
+                        if not column.numeric:
+                            combo.setItemData(index, QColor(150, 150, 150), Qt.ItemDataRole.ForegroundRole)
+            
+            # Set default selections from the numeric columns
+            if len(numeric) >= 2:
+                self.time_column_combo.setCurrentIndex(numeric[0])
+                self.amplitude_column_combo.setCurrentIndex(numeric[1])
+            elif len(numeric) == 1:
+                self.amplitude_column_combo.setCurrentIndex(numeric[0])
                 self.auto_time_checkbox.setChecked(True)
                 
+        for widget in (self.time_column_combo, self.amplitude_column_combo, self.auto_time_checkbox):
+            widget.blockSignals(False)
+            
+        self.time_column_combo.setEnabled(not self.auto_time_checkbox.isChecked())
+        self.populate_channel_table()
+        if load:
+            self.update_plot_data()
+        
+    def populate_channel_table(self):
+        """List every column with its limit assignment for multi-channel testing"""
+        self.channel_results = {}
+        self.channel_table.setRowCount(len(self.csv_headers))
+        time_column = None if self.auto_time_checkbox.isChecked() else self.time_column_combo.currentText()
+        
+        for row, column in enumerate(self.csv_headers):
+            self.channel_table.setItem(row, 0, QTableWidgetItem(column))
+            
+            combo = QComboBox()
+            combo.addItems(["None", "Designed limits"] + list(self.limit_library))
+            # The time column and text columns are not channels by default
+            stats = self.data_source.stats_for(column)
+            is_channel = column != time_column and (stats is None or stats.numeric)
+            combo.setCurrentIndex(1 if is_channel else 0)
+            self.channel_table.setCellWidget(row, 1, combo)
+            
+            for col in range(2, 7):
+                self.channel_table.setItem(row, col, QTableWidgetItem(""))
+                
+    def load_channel_limits(self):
+        """Load a limit array file that channels can be assigned to"""
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "Open Limit File", "", "Limit Files (*.json *.wfmask *.csv);;All Files (*)"
+        )
+        
+        if file_path:
+            try:
+                limit_mask = load_limit_mask(file_path)
+            except Exception as e:
+                QMessageBox.critical(self, "Error", f"Failed to load limit file:\n{str(e)}")
+                return
+                
+            name = os.path.basename(file_path)
+            if name not in self.limit_library:
+                for row in range(self.channel_table.rowCount()):
+                    self.channel_table.cellWidget(row, 1).addItem(name)
+            self.limit_library[name] = limit_mask
+            
+    def channel_assignments(self):
+        """Return {column: limit_mask} for every channel with limits assigned"""
+        assignments = {}
+        for row, column in enumerate(self.csv_headers):
+            choice = self.channel_table.cellWidget(row, 1).currentText()
+            if choice == "Designed limits":
+                limit_mask = self.limit_mask
+            else:
+                limit_mask = self.limit_library.get(choice)
+            if limit_mask is not None:
+                # Channels on the same limits share one mask, so its
+                # envelopes are interpolated once for all of them
+                assignments[column] = limit_mask
+        return assignments
+        
+    def test_all_channels(self):
+        """Test every assigned channel against its limits in one pass"""
+        if self.data_source is None:
+            QMessageBox.warning(self, "Warning", "Please load data first")
+            return
+            
+        assignments = self.channel_assignments()
+        if not assignments:
+            QMessageBox.warning(self, "Warning", "Please design limit arrays or assign a limit file to a channel")
+            return
+            
+        if self.auto_time_checkbox.isChecked():
+            time_column = None
+        else:
+            time_column = self.time_column_combo.currentText()
+            
+        self.start_job('channels', "Testing channels", multi_channel_task, self.on_channels_tested,
+                       self.data_source, assignments, time_column)
+        
+    def on_channels_tested(self, results):
+        """Fill the channel table with the per-channel summaries"""
+        self.channel_results = results
+        self.update_file_label()
+        
+        for row, column in enumerate(self.csv_headers):
+            result = results.get(column)
+            if result is None:
+                values = ["", "", "", "", ""]
+            else:
+                values = [str(result.total_points), str(result.high_violations), str(result.low_violations),
+                          str(len(result.crossing_points)),
+                          "PASS" if result.passed else f"FAIL ({result.violation_rate:.2f}%)"]
+            for col, value in enumerate(values, 2):
+                self.channel_table.item(row, col).setText(value)
+            if result is not None:
+                self.channel_table.item(row, 6).setForeground(QColor(0, 128, 0) if result.passed else QColor(200, 0, 0))
+                
+        passed = sum(1 for result in results.values() if result.passed)
+        self.results_text.setText(f"=== MULTI-CHANNEL TEST RESULTS ===\n\n"
+                                  f"Channels tested: {len(results)}\n"
+                                  f"Passed: {passed}\n"
+                                  f"Failed: {len(results) - passed}\n\n"
+                                  f"Double-click a channel to plot it.")
+        
+    def on_channel_double_clicked(self, row, col):
+        """Plot the double-clicked channel"""
+        self.amplitude_column_combo.setCurrentText(self.csv_headers[row])
+                
     def on_auto_time_changed(self):
         """Handle auto-generate time checkbox change"""
         self.time_column_combo.setEnabled(not self.auto_time_checkbox.isChecked())
@@ -1077,62 +1704,227 @@ class WaveformLimitTester(QMainWindow):
         
     def update_plot_data(self):
         """Update plot data based on selected columns"""
-        if not self.csv_data or not self.csv_headers:
+        if self.data_source is None or not self.csv_headers:
             return
             
-        try:
-            # Get amplitude data
-            amp_column = self.amplitude_column_combo.currentText()
-            if not amp_column:
+        # Get amplitude data
+        amp_column = self.amplitude_column_combo.currentText()
+        if not amp_column:
+            return
+            
+        # Get time data
+        if self.auto_time_checkbox.isChecked():
+            # Auto-generate time data
+            time_column = None
+        else:
+            time_column = self.time_column_combo.currentText()
+            if not time_column:
                 return
                 
-            amp_index = self.csv_headers.index(amp_column)
-            self.waveform_data = []
-            
-            for row in self.csv_data:
-                try:
-                    value = float(row[amp_index])
-                    self.waveform_data.append(value)
-                except (ValueError, IndexError):
-                    # Skip invalid data points
-                    continue
-                    
-            # Get time data
-            if self.auto_time_checkbox.isChecked():
-                # Auto-generate time data
-                self.time_data = list(range(len(self.waveform_data)))
-            else:
-                time_column = self.time_column_combo.currentText()
-                if not time_column:
-                    return
-                    
-                time_index = self.csv_headers.index(time_column)
-                self.time_data = []
+        # Text columns would plot as nothing but skipped rows
+        for column in (amp_column, time_column):
+            stats = self.data_source.stats_for(column) if column is not None else None
+            if stats is not None and not stats.numeric:
+                self.results_text.setText(f"Column '{column}' is not numeric ({stats.describe()}). "
+                                          f"Select a numeric column to plot.")
+                return
                 
-                for i, row in enumerate(self.csv_data):
-                    if i < len(self.waveform_data):  # Match length with amplitude data
-                        try:
-                            value = float(row[time_index])
-                            self.time_data.append(value)
-                        except (ValueError, IndexError):
-                            # Use index if conversion fails
-                            self.time_data.append(i)
-                            
-            # Ensure both lists have same length
-            min_length = min(len(self.time_data), len(self.waveform_data))
-            self.time_data = self.time_data[:min_length]
-            self.waveform_data = self.waveform_data[:min_length]
-            
-            # Update plot
-            self.plot_widget.set_data(self.time_data, self.waveform_data, self.limit_arrays)
+        # Parses only the selected columns, straight into float arrays
+        amplitude_dtype = 'float32' if self.float32_checkbox.isChecked() else 'float64'
+        self.start_job('load', "Loading columns", read_columns_task, self.on_columns_loaded,
+                       self.data_source, amp_column, time_column, amplitude_dtype)
+        
+    def on_columns_loaded(self, result):
+        """Plot the columns parsed by the background load"""
+        self.waveform = result
+        self.test_result = None
+        self.tested_mask = None
+        self.update_file_label()
+        
+        # Update plot
+        self.plot_widget.set_data(self.waveform, self.limit_mask)
+        
+    def start_job(self, kind, message, work, on_finished, *args):
+        """Run work(job, *args) in the background, replacing any running job"""
+        self.cancel_job()
+        
+        job = BackgroundJob(kind, message, work, *args)
+        job.on_finished = on_finished
+        job.signals.progress.connect(self.on_job_progress)
+        job.signals.finished.connect(self.on_job_finished)
+        job.signals.failed.connect(self.on_job_failed)
+        self.current_job = job
+        
+        self.progress_bar.setFormat(f"{message}... %p%")
+        self.progress_bar.setValue(0)
+        self.set_progress_visible(True)
+        self.thread_pool.start(job)
+        
+    def cancel_job(self):
+        """Cancel the running background job, if any"""
+        if self.current_job is not None:
+            self.current_job.cancel()
+            self.current_job = None
+            self.job_done.emit()
+        self.set_progress_visible(False)
+        
+    def wait_for_job(self):
+        """Process events until the running background job has finished
+
+        Also waits for the jobs a finished job starts, such as the column
+        load that follows the column scan.
+        """
+        if self.current_job is None:
+            return
+        loop = QEventLoop()
+        self.job_done.connect(loop.quit)
+        while self.current_job is not None:
+            loop.exec()
+        self.job_done.disconnect(loop.quit)
+            
+    def set_progress_visible(self, visible):
+        self.progress_bar.setVisible(visible)
+        self.cancel_button.setVisible(visible)
+        
+    def on_job_progress(self, job, fraction):
+        # Results of replaced jobs are ignored
+        if job is self.current_job:
+            self.progress_bar.setValue(int(fraction * 100))
+            
+    def on_job_finished(self, job, result):
+        if job is not self.current_job:
+            return
+        self.current_job = None
+        self.set_progress_visible(False)
+        job.on_finished(result)
+        self.job_done.emit()
+        
+    def on_job_failed(self, job, error):
+        if job is not self.current_job:
+            return
+        self.current_job = None
+        self.set_progress_visible(False)
+        self.job_done.emit()
+        if job.kind == 'scan':
+            QMessageBox.warning(self, "Warning", f"Error scanning columns: {error}")
+        elif job.kind == 'load':
+            QMessageBox.warning(self, "Warning", f"Error processing column data: {error}")
+        elif job.kind == 'channels':
+            QMessageBox.warning(self, "Warning", f"Multi-channel test failed: {error}")
+        elif job.kind == 'train':
+            QMessageBox.warning(self, "Warning", f"Training limits failed: {error}")
+        else:
+            QMessageBox.warning(self, "Warning", f"Limit test failed: {error}")
+            
+    def closeEvent(self, event):
+        if self.live_monitor is not None:
+            self.live_timer.stop()
+            self.live_monitor.close()
+        self.cancel_job()
+        self.thread_pool.waitForDone()
+        super().closeEvent(event)
+            
+    def toggle_live(self):
+        """Start or stop live acquisition"""
+        if self.live_monitor is None:
+            self.start_live()
+        else:
+            self.stop_live()
+            
+    def start_live(self):
+        """Open the chosen live source and start testing what it sends"""
+        kind = self.live_source_combo.currentData()
+        target = self.live_target_edit.text().strip()
+        if kind == 'tail' and not target:
+            target, _ = QFileDialog.getOpenFileName(self, "Tail File", "", "CSV Files (*.csv);;All Files (*)")
+            if not target:
+                return
+            self.live_target_edit.setText(target)
             
-        except Exception as e:
-            QMessageBox.warning(self, "Warning", f"Error processing column data: {str(e)}")
+        time_column = self.live_time_spinbox.value()
+        try:
+            source = open_source(kind, target, value_column=self.live_value_spinbox.value(),
+                                 time_column=None if time_column < 0 else time_column)
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, "Error", f"Failed to open live source:\n{str(e)}")
+            return
+            
+        self.live_monitor = LiveMonitor(source, self.limit_mask)
+        self.live_button.setText("Stop Live")
+        self.live_status_label.setText("Waiting for samples...")
+        self.live_timer.start(1000 // self.LIVE_FRAME_RATE)
+        
+    def stop_live(self):
+        """Stop live acquisition, keeping the buffered samples as the current waveform"""
+        self.live_timer.stop()
+        monitor, self.live_monitor = self.live_monitor, None
+        monitor.close()
+        self.live_button.setText("Start Live")
+        
+        # The buffered window can be designed against and fully tested
+        self.waveform = Waveform(*monitor.buffer.snapshot())
+        self.test_result = None
+        self.tested_mask = None
+        self.crossing_points = []
+        self.file_label.setText(f"Live capture\nLast {len(monitor.buffer)} of {monitor.buffer.total} samples")
+        self.plot_widget.set_data(self.waveform, self.limit_mask)
+        
+        result = monitor.result()
+        if result is not None:
+            report = result.format_report(len(monitor.limit_mask))
+            summary = monitor.summary()
+            if summary['crossing_count'] > len(result.crossing_points):
+                report += (f"\n\nOnly the last {len(result.crossing_points)} of {summary['crossing_count']} "
+                           f"crossings and {len(result.events)} of {summary['excursion_count']} excursions are kept")
+            self.results_text.setText(report)
+        self.live_status_label.setText(f"Stopped after {monitor.buffer.total} samples")
+        
+    def on_live_tick(self):
+        """Read, test and show the samples that arrived since the last frame"""
+        monitor = self.live_monitor
+        limits_changed = monitor.limit_mask is not self.limit_mask
+        if limits_changed:
+            # Test from here on against the new limits
+            monitor.set_limit_mask(self.limit_mask)
+        try:
+            new_samples = monitor.poll()
+        except OSError as e:
+            self.stop_live()
+            QMessageBox.warning(self, "Warning", f"Live source failed:\n{str(e)}")
+            return
             
+        if new_samples or limits_changed:
+            self.show_live_frame()
+        if monitor.source.closed:
+            self.stop_live()
+            
+    def show_live_frame(self):
+        """Plot the buffered window and the running test totals"""
+        monitor = self.live_monitor
+        # Only the buffer's min/max summary is drawn, never the raw history
+        times, values = monitor.buffer.envelope(max(self.plot_widget.viewport().width(), 1))
+        violation_mask = None
+        if self.limit_mask is not None and len(values):
+            high_mask, low_mask = compute_violation_masks(times, values, self.limit_mask)
+            violation_mask = high_mask | low_mask
+        self.plot_widget.set_data(Waveform(times, values), self.limit_mask, monitor.window_crossings(),
+                                  violation_mask=violation_mask)
+        
+        summary = monitor.summary()
+        status = f"{summary['received']} samples received ({summary['samples_per_second']:.3g}/s)"
+        if monitor.test is None:
+            status += "\nNo limits: samples are shown but not tested"
+        elif summary['passed']:
+            status += f"\nPASS - {summary['total_points']} samples tested"
+        else:
+            status += (f"\nFAIL - {summary['high_violations']} above, {summary['low_violations']} below, "
+                       f"{summary['crossing_count']} crossings ({summary['violation_rate']:.2f}%)")
+        self.live_status_label.setText(status)
+        
     def open_limit_designer(self):
         """Open the limit designer dialog"""
         # Check if data is loaded
-        if self.time_data is None or self.waveform_data is None:
+        if self.waveform is None:
             reply = QMessageBox.question(self, "No Data Loaded", 
                                        "No waveform data is currently loaded. Would you like to:\n\n"
                                        "• Load sample data first, or\n"
@@ -1141,140 +1933,250 @@ class WaveformLimitTester(QMainWindow):
                                        QMessageBox.Yes)
             if reply == QMessageBox.Yes:
                 self.load_sample_data()
+                self.wait_for_job()
+                if self.waveform is None:
+                    return
             else:
                 return
         
         # Pass the actual waveform data and existing limits to the designer
-        dialog = LimitDesignerDialog(self, self.time_data, self.waveform_data, self.limit_arrays)
+        previous = self.test_result if self.limit_mask is not None and self.tested_mask is self.limit_mask else None
+        if previous is not None and previous.time_shift is not None:
+            # The designer tests the limits where they are drawn
+            previous = None
+        dialog = LimitDesignerDialog(self, self.waveform, self.limit_mask, previous)
         if dialog.exec() == QDialog.Accepted:
-            self.limit_arrays = dialog.get_limit_arrays()
+            self.limit_mask = dialog.get_limit_mask()
+            
+            # Keep the designer's live test so applying the limits is instant
+            result, tested_mask = dialog.get_test_result()
+            if result is not None and tested_mask == self.limit_mask:
+                self.test_result = result
+                self.tested_mask = self.limit_mask
+            
+            self.show_limit_mask("Limit arrays defined")
+            
+    def train_limits(self):
+        """Build limits from the envelope of golden capture files"""
+        amp_column = self.amplitude_column_combo.currentText()
+        if not amp_column:
+            QMessageBox.warning(self, "Warning", "Please load a capture and select the columns to train on first")
+            return
+        time_column = None if self.auto_time_checkbox.isChecked() else self.time_column_combo.currentText()
+        
+        file_paths, _ = QFileDialog.getOpenFileNames(
+            self, "Golden Captures", "", "CSV Files (*.csv);;All Files (*)"
+        )
+        if not file_paths:
+            return
+        choices = [(label, method) for label, method in LimitDesignerDialog.ENVELOPE_CHOICES if method is not None]
+        label, ok = QInputDialog.getItem(self, "Train Limits", "Envelope:", [label for label, _ in choices], 0, False)
+        if not ok:
+            return
+        points, ok = QInputDialog.getInt(self, "Train Limits", "Number of points:", DEFAULT_POINTS, 2, 1000)
+        if not ok:
+            return
+        
+        self.start_job('train', "Training limits", train_limits_task, self.on_limits_trained,
+                       file_paths, amp_column, time_column, dict(choices)[label], points)
+        
+    def on_limits_trained(self, result):
+        limit_mask, file_count = result
+        self.set_limit_mask(limit_mask, f"Trained on {file_count} golden capture{'s' if file_count != 1 else ''}")
+        
+    def set_limit_mask(self, limit_mask, description):
+        """Replace the current limits with a mask from a file or the library"""
+        if self.current_job is not None and self.current_job.kind == 'test':
+            self.cancel_job()
+        self.limit_mask = limit_mask
+        self.crossing_points = []
+        self.results_text.clear()
+        self.show_limit_mask(description)
+        
+    def show_limit_mask(self, description):
+        """Update the limits status and plot after the limits changed"""
+        self.limits_status_label.setText(f"{description} with {len(self.limit_mask)} points\n"
+                                        f"Time range: {self.limit_mask.time_min:.2f} to {self.limit_mask.time_max:.2f}")
+        
+        if self.waveform is not None:
+            self.plot_test_result()
+            
+    def open_limits(self):
+        """Load the limits from a mask file"""
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "Open Limits", "", "Limit Files (*.json *.wfmask *.csv);;All Files (*)"
+        )
+        
+        if file_path:
+            try:
+                limit_mask = load_limit_mask(file_path)
+            except Exception as e:
+                QMessageBox.critical(self, "Error", f"Failed to load limit file:\n{str(e)}")
+                return
+            self.set_limit_mask(limit_mask, f"Loaded {os.path.basename(file_path)}")
+            
+    def save_limits(self):
+        """Save the limits as a JSON or compact binary mask file"""
+        if self.limit_mask is None:
+            QMessageBox.warning(self, "Warning", "Please design limit arrays first")
+            return
+            
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Save Limits", "", "JSON Mask (*.json);;Binary Mask (*.wfmask)"
+        )
+        
+        if file_path:
+            if not file_path.lower().endswith(('.json', '.wfmask')):
+                file_path += '.json'
+            name = os.path.splitext(os.path.basename(file_path))[0]
+            try:
+                save_mask_file(file_path, self.limit_mask, name, self.library_product)
+            except OSError as e:
+                QMessageBox.critical(self, "Error", f"Failed to save limit file:\n{str(e)}")
+                
+    def save_to_library(self):
+        """Store the limits in the mask library under a name and product"""
+        if self.limit_mask is None:
+            QMessageBox.warning(self, "Warning", "Please design limit arrays first")
+            return
             
-            # Update status
-            num_points = len(self.limit_arrays['time_points'])
-            self.limits_status_label.setText(f"Limit arrays defined with {num_points} points\n"
-                                            f"Time range: {min(self.limit_arrays['time_points']):.2f} to {max(self.limit_arrays['time_points']):.2f}")
+        name, ok = QInputDialog.getText(self, "Save to Library", "Mask name:")
+        if not ok or not name.strip():
+            return
+        product, ok = QInputDialog.getText(self, "Save to Library", "Product:", text=self.library_product)
+        if not ok:
+            return
+        name, product = name.strip(), product.strip()
+        
+        if self.mask_library.key(name, product) in self.mask_library.index['masks']:
+            reply = QMessageBox.question(self, "Replace Mask",
+                                         f"A mask named '{name}' already exists for this product. Replace it?",
+                                         QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if reply != QMessageBox.Yes:
+                return
+        try:
+            self.mask_library.save(self.limit_mask, name, product)
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, "Error", f"Failed to save to the library:\n{str(e)}")
+            return
+        self.library_product = product
+        
+    def load_from_library(self):
+        """Pick a mask from the library by product and name"""
+        entries = self.mask_library.entries()
+        if not entries:
+            QMessageBox.information(self, "Mask Library", f"The mask library is empty.\n\n{self.mask_library.directory}")
+            return
             
-            # Update plot
-            if self.time_data and self.waveform_data:
-                self.plot_widget.set_data(self.time_data, self.waveform_data, self.limit_arrays)
+        labels = [f"{entry['product'] or '(no product)'} / {entry['name']} ({entry['points']} points)"
+                  for entry in entries]
+        current = next((i for i, entry in enumerate(entries) if entry['product'] == self.library_product), 0)
+        label, ok = QInputDialog.getItem(self, "Load from Library", "Mask:", labels, current, False)
+        if not ok:
+            return
+        entry = entries[labels.index(label)]
+        
+        try:
+            limit_mask = self.mask_library.load(entry['name'], entry['product'])
+        except (OSError, KeyError, ValueError) as e:
+            QMessageBox.critical(self, "Error", f"Failed to load from the library:\n{str(e)}")
+            return
+        self.library_product = entry['product']
+        self.set_limit_mask(limit_mask, f"Library mask '{entry['name']}'")
                 
     def clear_limits(self):
         """Clear all limit arrays"""
-        self.limit_arrays = None
+        if self.current_job is not None and self.current_job.kind == 'test':
+            self.cancel_job()
+            
+        self.limit_mask = None
         self.crossing_points = []
+        self.test_result = None
+        self.tested_mask = None
         self.limits_status_label.setText("No limits defined")
         
-        if self.time_data and self.waveform_data:
-            self.plot_widget.set_data(self.time_data, self.waveform_data)
+        if self.waveform is not None:
+            self.plot_widget.set_data(self.waveform)
             
         self.results_text.clear()
                 
     def apply_limits(self):
-        if self.waveform_data is None or len(self.waveform_data) == 0:
+        if self.waveform is None or len(self.waveform) == 0:
             QMessageBox.warning(self, "Warning", "Please load data and select columns first")
             return
             
-        if not self.limit_arrays:
+        if self.limit_mask is None:
             QMessageBox.warning(self, "Warning", "Please design limit arrays first")
             return
                 
         # Perform limit testing
         self.perform_limit_test()
-        
-        # Update plot
-        self.plot_widget.set_data(
-            self.time_data, 
-            self.waveform_data, 
-            self.limit_arrays,
-            self.crossing_points
-        )
             
     def perform_limit_test(self):
-        """Detect crossing points where waveform exceeds interpolated limits"""
+        """Start detecting crossing points in the background"""
+        # A previous result for the same samples only needs the samples
+        # around the edited limit points tested again
+        previous = self.test_result
+        previous_mask = self.tested_mask
         self.crossing_points = []
+        self.test_result = None
+        self.tested_mask = None
         
-        if len(self.waveform_data) < 2 or not self.limit_arrays:
+        if len(self.waveform) < 2 or self.limit_mask is None:
+            self.plot_widget.set_data(self.waveform, self.limit_mask)
             return
         
-        time_points = self.limit_arrays['time_points']
-        high_limits = self.limit_arrays['high_limits']
-        low_limits = self.limit_arrays['low_limits']
+        # Evaluate every sample against the interpolated limits in bulk
+        self.start_job('test', "Testing limits", limit_test_task, self.on_limit_test_finished,
+                       self.waveform.time_data, self.waveform.waveform_data, self.limit_mask, previous,
+                       previous_mask, self.align_combo.currentData())
         
-        # Check each data point against interpolated limits
-        violations = []
-        for i, (time_val, amp_val) in enumerate(zip(self.time_data, self.waveform_data)):
-            high_limit = self.plot_widget.interpolate_limit(time_val, time_points, high_limits)
-            low_limit = self.plot_widget.interpolate_limit(time_val, time_points, low_limits)
-            
-            if high_limit is not None and low_limit is not None:
-                high_violation = amp_val > high_limit
-                low_violation = amp_val < low_limit
-                violations.append((high_violation, low_violation))
-            else:
-                violations.append((False, False))
-        
-        # Detect crossing points (transitions)
-        for i in range(1, len(violations)):
-            prev_high, prev_low = violations[i-1]
-            curr_high, curr_low = violations[i]
-            
-            # High limit crossings
-            if prev_high != curr_high:
-                self.crossing_points.append({
-                    'index': i,
-                    'time': self.time_data[i],
-                    'value': self.waveform_data[i],
-                    'type': 'high',
-                    'direction': 'up' if curr_high else 'down'
-                })
-                
-            # Low limit crossings
-            if prev_low != curr_low:
-                self.crossing_points.append({
-                    'index': i,
-                    'time': self.time_data[i],
-                    'value': self.waveform_data[i],
-                    'type': 'low',
-                    'direction': 'down' if curr_low else 'up'
-                })
-        
-        # Sort by time
-        self.crossing_points.sort(key=lambda x: x['time'])
+    def on_limit_test_finished(self, result):
+        """Show the results of a background limit test"""
+        result, self.tested_mask = result
+        self.test_result = result
+        self.crossing_points = result.crossing_points
         
         # Generate results summary
-        self.update_results_display(violations)
+        self.update_results_display(result)
         
-    def update_results_display(self, violations):
-        """Update the results text area with crossing point information"""
-        results = []
-        results.append("=== LIMIT ARRAY TEST RESULTS ===\n")
-        results.append(f"Limit Points: {len(self.limit_arrays['time_points'])}")
-        results.append(f"Total Data Points: {len(self.waveform_data)}")
-        results.append(f"Crossing Points Found: {len(self.crossing_points)}\n")
-        
-        if self.crossing_points:
-            results.append("CROSSING POINTS:")
-            results.append("-" * 50)
-            results.append(f"{'Index':<8} {'Time':<12} {'Value':<12} {'Limit':<6} {'Dir':<6}")
-            results.append("-" * 50)
-            
-            for cp in self.crossing_points:
-                results.append(f"{cp['index']:<8} {cp['time']:<12.4f} {cp['value']:<12.4f} "
-                             f"{cp['type']:<6} {cp['direction']:<6}")
-        else:
-            results.append("No limit violations detected!")
+        # Update plot
+        self.plot_test_result()
+        
+    def plot_test_result(self):
+        """Plot the data with the limits and, if still current, their test result"""
+        result = self.test_result if self.tested_mask is self.limit_mask else None
+        if result is None or result.high_mask is None:
+            self.plot_widget.set_data(self.waveform, self.limit_mask)
+            return
             
-        # Count violations
-        high_violations = sum(1 for h, l in violations if h)
-        low_violations = sum(1 for h, l in violations if l)
+        # Aligned limits are drawn where they were tested
+        limit_mask = self.limit_mask if result.time_shift is None else self.limit_mask.shifted(result.time_shift)
+        self.plot_widget.set_data(self.waveform, limit_mask, result.crossing_points,
+                                  violation_mask=result.high_mask | result.low_mask)
+        
+    def update_results_display(self, result):
+        """Update the results text area with crossing point information"""
+        self.results_text.setText(result.format_report(len(self.limit_mask)))
         
-        results.append(f"\nVIOLATION SUMMARY:")
-        results.append(f"Points above high limits: {high_violations}")
-        results.append(f"Points below low limits: {low_violations}")
-        results.append(f"Total violations: {high_violations + low_violations}")
-        results.append(f"Violation rate: {((high_violations + low_violations) / len(self.waveform_data) * 100):.2f}%")
+    def export_events(self):
+        """Save the excursion table of the last limit test"""
+        if self.test_result is None or self.test_result.events is None:
+            QMessageBox.warning(self, "Warning", "Please run a limit test first")
+            return
+            
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Export Excursions", "", "CSV Files (*.csv);;JSON Files (*.json)"
+        )
         
-        self.results_text.setText("\n".join(results))
+        if file_path:
+            try:
+                if file_path.lower().endswith('.json'):
+                    self.test_result.events.write_json(file_path)
+                else:
+                    self.test_result.events.write_csv(file_path)
+            except OSError as e:
+                QMessageBox.critical(self, "Error", f"Failed to export excursions:\n{str(e)}")
 
 
 def main():